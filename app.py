@@ -6,7 +6,19 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     
+    # Pool sizing, statement caches and SQLite PRAGMAs (WAL, synchronous, busy timeout, mmap)
+    from services import engine_config
+    engine_config.configure(app)
     db.init_app(app)
+    engine_config.init_app(app)
+    
+    # orjson-backed jsonify / get_json (stdlib fallback)
+    from services import json_provider
+    json_provider.init_app(app)
+    
+    # gzip / Brotli for large responses; registered first so it runs after every other after_request hook
+    from services import compression
+    compression.init_app(app)
     
     # Register blueprints
     from routes.dashboard import dashboard_bp
@@ -16,6 +28,7 @@ def create_app():
     from routes.shipping import shipping_bp
     from routes.reports import reports_bp
     from routes.forecast import forecast_bp
+    from routes.batch import batch_bp
     
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(inventory_bp)
@@ -24,10 +37,63 @@ def create_app():
     app.register_blueprint(shipping_bp)
     app.register_blueprint(reports_bp)
     app.register_blueprint(forecast_bp)
+    app.register_blueprint(batch_bp)
     
     with app.app_context():
         db.create_all()
     
+    # Run-once schema changes (indexes, partitioning) for existing databases
+    from services import migrations
+    migrations.init_app(app)
+    
+    # Data version counters (ETag / cache invalidation)
+    from services import data_version
+    data_version.init_app(app)
+    
+    # In-process event bus feeding the dashboard SSE stream
+    from services import event_bus
+    event_bus.init_app(app)
+    
+    # Indexed product search (FTS5 / pg_trgm / in-memory trigram)
+    from services import search_service
+    search_service.init_app(app)
+    
+    # Denormalized category product counts
+    from services import counters
+    counters.init_app(app)
+    
+    # Maintained location occupancy (units, product count, weight)
+    from services import occupancy
+    occupancy.init_app(app)
+    
+    # In-memory free-capacity index for putaway suggestions
+    from services import putaway
+    putaway.init_app(app)
+    
+    # Block-allocated SKU / PO / SO numbers
+    from services import numbering
+    numbering.init_app(app)
+    
+    # Atomic stock mutations (409 on compare-and-set conflicts)
+    from services import stock_service
+    stock_service.init_app(app)
+    
+    # Forecast-driven draft purchase orders (`flask replenish`)
+    from services import replenishment_service
+    replenishment_service.init_app(app)
+    
+    # Buffered handheld scans, group-committed into purchase order receipts
+    from services import scan_receiving
+    scan_receiving.init_app(app)
+    
+    # Replica routing for read-only blueprints (`flask replica-sync` for a local SQLite copy)
+    from services import read_routing
+    read_routing.init_app(app)
+    
+    # Idempotency-Key replay for bulk write endpoints (`flask purge-idempotency-keys`)
+    from services import idempotency
+    idempotency.init_app(app)
+    
     return app
 
 def seed_sample_data():
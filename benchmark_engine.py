@@ -0,0 +1,143 @@
+"""
+Database Engine Benchmark
+Runs concurrent readers and writers against a scratch database, first with
+the stock engine (SQLite: rollback journal, default synchronous) and then
+with the settings from services/engine_config.py, and reports throughput.
+
+Usage:
+    python benchmark_engine.py --database-url sqlite:////tmp/engine-bench.db
+    python benchmark_engine.py --database-url postgresql://.../scratch --readers 6 --writers 2
+
+The readers run the inventory list and low-stock queries; the writers
+adjust stock and append ledger rows, one transaction per adjustment, the
+way the receiving and shipping endpoints do. Never point this at a
+database whose data you care about.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(db, Product, products):
+    existing = db.session.query(Product.id).count()
+    if existing < products:
+        now = datetime.utcnow()
+        db.session.execute(Product.__table__.insert(), [
+            {'sku': f'ENGINE-{i:07d}', 'name': f'Engine benchmark item {i}', 'quantity': 100,
+             'min_stock': 10, 'created_at': now, 'updated_at': now}
+            for i in range(existing, products)
+        ])
+        db.session.commit()
+    return [pid for (pid,) in db.session.query(Product.id)]
+
+
+def run_load(engine, Product, Transaction, product_ids, readers, writers, seconds):
+    """Run the threads for `seconds`; returns (reads, writes, errors) completed."""
+    from sqlalchemy import func, select, update
+    from sqlalchemy.exc import OperationalError
+
+    product = Product.__table__
+    ledger = Transaction.__table__
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def read(rng):
+        with engine.connect() as conn:
+            conn.execute(select(product).order_by(product.c.name)
+                         .limit(50).offset(rng.randrange(max(1, len(product_ids) - 50)))).all()
+            conn.execute(select(func.count()).select_from(product)
+                         .where(product.c.quantity <= product.c.min_stock)).scalar()
+        return 'reads'
+
+    def write(rng):
+        pid = rng.choice(product_ids)
+        delta = rng.choice((-1, 1))
+        with engine.begin() as conn:
+            after = conn.execute(update(product).where(product.c.id == pid)
+                                 .values(quantity=product.c.quantity + delta)
+                                 .returning(product.c.quantity)).scalar()
+            conn.execute(ledger.insert().values(
+                product_id=pid, transaction_type='IN' if delta > 0 else 'OUT', quantity=delta,
+                quantity_before=after - delta, quantity_after=after, reference_type='benchmark',
+                created_by='Benchmark', created_at=datetime.utcnow()))
+        return 'writes'
+
+    def worker(task, seed_value):
+        rng = random.Random(seed_value)
+        done = {'reads': 0, 'writes': 0, 'errors': 0}
+        while time.perf_counter() < deadline:
+            try:
+                done[task(rng)] += 1
+            except OperationalError:
+                # "database is locked" once the busy timeout runs out
+                done['errors'] += 1
+        with lock:
+            for key, value in done.items():
+                counts[key] += value
+
+    threads = [threading.Thread(target=worker, args=(read, i)) for i in range(readers)]
+    threads += [threading.Thread(target=worker, args=(write, 1000 + i)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts['reads'], counts['writes'], counts['errors']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True, help='Scratch database to benchmark against')
+    parser.add_argument('--products', type=int, default=5000, help='Products to read and adjust')
+    parser.add_argument('--readers', type=int, default=6, help='Reader threads')
+    parser.add_argument('--writers', type=int, default=2, help='Writer threads')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration of each run')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url
+    from sqlalchemy import create_engine
+    from app import app
+    from models import db
+    from models.product import Product
+    from models.transaction import Transaction
+    from services import engine_config
+
+    with app.app_context():
+        print(f'Seeding {args.products:,} products...')
+        product_ids = seed(db, Product, args.products)
+        url = db.engine.url
+        db.session.remove()
+        db.engine.dispose()
+
+    setups = {
+        # The stock engine; journal_mode is stored in the file, so switch it back explicitly
+        'default': ({}, ['PRAGMA journal_mode = DELETE']),
+        'tuned': (engine_config.engine_options(app.config, url), engine_config.sqlite_pragmas(app.config, url)),
+    }
+    results = {}
+    for label, (options, pragmas) in setups.items():
+        engine = create_engine(url, **options)
+        if engine.dialect.name == 'sqlite':
+            engine_config.apply_sqlite_pragmas(engine, pragmas)
+        with engine.connect() as conn:
+            conn.exec_driver_sql('SELECT 1')
+        print(f'Running {args.readers} readers / {args.writers} writers for {args.seconds:g}s ({label})...')
+        results[label] = run_load(engine, Product, Transaction, product_ids,
+                                  args.readers, args.writers, args.seconds)
+        engine.dispose()
+
+    print(f'\n{engine.dialect.name}, {args.readers} readers, {args.writers} writers, per second\n')
+    print(f'{"":<24}{"before":>12}{"after":>12}')
+    for index, name in enumerate(('reads', 'writes', 'lock errors')):
+        before, after = results['default'][index], results['tuned'][index]
+        print(f'{name:<24}{before / args.seconds:>12.1f}{after / args.seconds:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+JSON Response Benchmark
+Times the largest API responses with Flask's stdlib JSON provider and with
+services/json_provider.py, and reports their size with and without
+compression.
+
+Usage:
+    python benchmark_json.py --database-url sqlite:////tmp/json-bench.db --products 20000
+    python benchmark_json.py --database-url sqlite:////tmp/json-bench.db --skip-seed
+
+The forecast report reads the last 90 days of ledger rows; --transactions
+controls how many are generated. Never point this at a database whose data
+you care about.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = ('/inventory/api/products', '/forecast/api/report')
+
+
+def seed(db, Product, Transaction, products, transactions):
+    existing = db.session.query(Product.id).count()
+    now = datetime.utcnow()
+    if existing < products:
+        db.session.execute(Product.__table__.insert(), [
+            {'sku': f'JSON-{i:07d}', 'name': f'JSON benchmark item {i}', 'description': 'Benchmark product',
+             'quantity': random.randint(0, 500), 'min_stock': 10, 'max_stock': 500,
+             'unit_price': round(random.uniform(1, 200), 2), 'cost_price': round(random.uniform(1, 100), 2),
+             'created_at': now, 'updated_at': now}
+            for i in range(existing, products)
+        ])
+        db.session.commit()
+    product_ids = [pid for (pid,) in db.session.query(Product.id)]
+    db.session.execute(Transaction.__table__.insert(), [
+        {'product_id': random.choice(product_ids), 'transaction_type': 'OUT', 'quantity': -1,
+         'quantity_before': 100, 'quantity_after': 99, 'reference_type': 'benchmark', 'created_by': 'Benchmark',
+         'created_at': now - timedelta(seconds=random.randint(0, 90 * 86400))}
+        for _ in range(transactions)
+    ])
+    db.session.commit()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True, help='Scratch database to benchmark against')
+    parser.add_argument('--products', type=int, default=20000, help='Products to create')
+    parser.add_argument('--transactions', type=int, default=50000, help='Ledger rows to create')
+    parser.add_argument('--skip-seed', action='store_true', help='Reuse rows from a previous run')
+    parser.add_argument('--repeat', type=int, default=5, help='Requests per measurement; the median is reported')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url
+    from flask.json.provider import DefaultJSONProvider
+    from app import app
+    from models import db
+    from models.product import Product
+    from models.transaction import Transaction
+    from services import compression, json_provider
+
+    if not args.skip_seed:
+        with app.app_context():
+            print(f'Seeding {args.products:,} products and {args.transactions:,} transactions...')
+            seed(db, Product, Transaction, args.products, args.transactions)
+
+    client = app.test_client()
+    fast = app.json
+    payloads = {}
+    results = {}
+    for path in ENDPOINTS:
+        payloads[path] = client.get(path).get_json()
+
+        app.json = DefaultJSONProvider(app)
+        stdlib_request = timed(lambda: client.get(path), args.repeat)
+        stdlib_dump = timed(lambda: app.json.response(payloads[path]), args.repeat)
+        app.json = fast
+        fast_request = timed(lambda: client.get(path), args.repeat)
+        fast_dump = timed(lambda: app.json.response(payloads[path]), args.repeat)
+        results[path] = (stdlib_request, fast_request, stdlib_dump, fast_dump)
+
+    print(f'\nJSON: {"orjson" if json_provider.orjson else "stdlib fallback"}, '
+          f'median of {args.repeat} requests (ms)\n')
+    print(f'{"endpoint":<28}{"request":>12}{"request":>12}{"serialize":>12}{"serialize":>12}')
+    print(f'{"":<28}{"stdlib":>12}{"fast":>12}{"stdlib":>12}{"fast":>12}')
+    for path, row in results.items():
+        print(f'{path:<28}' + ''.join(f'{value:>12.1f}' for value in row))
+
+    print('\nResponse size (KiB)\n')
+    encodings = compression.available_encodings()
+    print(f'{"endpoint":<28}{"identity":>12}' + ''.join(f'{e:>12}' for e in encodings))
+    for path in ENDPOINTS:
+        body = fast.response(payloads[path]).get_data()
+        sizes = [len(body)] + [len(compression.compress(body, e, app.config['COMPRESS_GZIP_LEVEL'],
+                                                        app.config['COMPRESS_BR_QUALITY'])) for e in encodings]
+        print(f'{path:<28}' + ''.join(f'{size / 1024:>12.1f}' for size in sizes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Transaction Ledger Benchmark
+Fills a scratch database with synthetic ledger rows and times the forecast,
+report and dashboard queries with and without the ledger indexes.
+
+Usage:
+    python benchmark_ledger.py --database-url postgresql://.../scratch --rows 10000000
+    python benchmark_ledger.py --database-url sqlite:////tmp/bench.db --rows 1000000
+
+Never point this at a database whose data you care about: it inserts
+`--rows` transactions and drops/recreates the ledger indexes.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+LEDGER_INDEX_NAMES = ('ix_transactions_product_type_created', 'ix_transactions_created_id')
+
+
+def seed(db, Product, Transaction, rows, products, batch_size=50000):
+    """Bulk-insert synthetic products and `rows` ledger entries spread over the last year."""
+    existing = db.session.query(Product.id).count()
+    if existing < products:
+        db.session.execute(Product.__table__.insert(), [
+            {'sku': f'BENCH-{i:07d}', 'name': f'Benchmark item {i}', 'quantity': 100,
+             'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow()}
+            for i in range(existing, products)
+        ])
+        db.session.commit()
+    product_ids = [pid for (pid,) in db.session.query(Product.id)]
+
+    now = datetime.utcnow()
+    inserted = 0
+    started = time.perf_counter()
+    while inserted < rows:
+        batch = []
+        for _ in range(min(batch_size, rows - inserted)):
+            out = random.random() < 0.8
+            qty = random.randint(1, 20)
+            batch.append({
+                'product_id': random.choice(product_ids),
+                'transaction_type': 'OUT' if out else 'IN',
+                'quantity': -qty if out else qty,
+                'quantity_before': 100,
+                'quantity_after': 100 - qty if out else 100 + qty,
+                'reference_type': 'benchmark',
+                'created_by': 'Benchmark',
+                'created_at': now - timedelta(seconds=random.randint(0, 365 * 86400)),
+            })
+        db.session.execute(Transaction.__table__.insert(), batch)
+        db.session.commit()
+        inserted += len(batch)
+        print(f'  {inserted:,} rows ({time.perf_counter() - started:.0f}s)', end='\r')
+    print()
+    return product_ids
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run_queries(db, Transaction, ForecastService, product_ids, repeat):
+    sample = random.Random(1).sample(product_ids, min(20, len(product_ids)))
+    service = ForecastService(db.session)
+    return {
+        'forecast: 90-day demand, 20 products': timed(
+            lambda: [service.get_historical_demand(pid, 90) for pid in sample], repeat),
+        'forecast: 90-day demand, all products': timed(
+            lambda: service.get_historical_demand(None, 90), repeat),
+        'reports: latest 500 transactions': timed(
+            lambda: Transaction.query.order_by(Transaction.created_at.desc()).limit(500).all(), repeat),
+        'transactions API: product + type, latest 100': timed(
+            lambda: [Transaction.query.filter_by(product_id=pid, transaction_type='OUT')
+                     .order_by(Transaction.created_at.desc()).limit(100).all() for pid in sample], repeat),
+        'dashboard: recent activity': timed(
+            lambda: Transaction.query.order_by(Transaction.created_at.desc()).limit(10).all(), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True, help='Scratch database to benchmark against')
+    parser.add_argument('--rows', type=int, default=10000000, help='Ledger rows to insert (default 10M)')
+    parser.add_argument('--products', type=int, default=5000, help='Products to spread rows over')
+    parser.add_argument('--skip-seed', action='store_true', help='Reuse rows from a previous run')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query; the median is reported')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url
+    from app import app
+    from models import db
+    from models.product import Product
+    from models.transaction import Transaction
+    from services.forecast_service import ForecastService
+
+    with app.app_context():
+        if args.skip_seed:
+            product_ids = [pid for (pid,) in db.session.query(Product.id)]
+        else:
+            print(f'Seeding {args.rows:,} transactions...')
+            product_ids = seed(db, Product, Transaction, args.rows, args.products)
+        indexes = [i for i in Transaction.__table__.indexes if i.name in LEDGER_INDEX_NAMES]
+
+        results = {}
+        for label, create in (('without indexes', False), ('with indexes', True)):
+            db.session.commit()
+            for index in indexes:
+                if create:
+                    index.create(db.engine, checkfirst=True)
+                else:
+                    index.drop(db.engine, checkfirst=True)
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ANALYZE')
+            print(f'Timing queries {label}...')
+            results[label] = run_queries(db, Transaction, ForecastService, product_ids, args.repeat)
+
+        total = db.session.query(Transaction.id).count()
+        print(f'\n{total:,} ledger rows, {db.engine.dialect.name}, median of {args.repeat} runs (ms)\n')
+        print(f'{"query":<48}{"before":>12}{"after":>12}')
+        for name in results['with indexes']:
+            print(f'{name:<48}{results["without indexes"][name]:>12.1f}{results["with indexes"][name]:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -11,3 +11,106 @@ class Config:
         SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace('postgres://', 'postgresql://', 1)
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Optional read-only replica for reporting traffic ('' = everything on the primary)
+    DATABASE_READ_URL = os.environ.get('DATABASE_READ_URL', '')
+    if DATABASE_READ_URL.startswith('postgres://'):
+        DATABASE_READ_URL = DATABASE_READ_URL.replace('postgres://', 'postgresql://', 1)
+    SQLALCHEMY_BINDS = {'read_replica': DATABASE_READ_URL} if DATABASE_READ_URL else {}
+    # Blueprints whose GET endpoints read from the replica
+    READ_REPLICA_BLUEPRINTS = os.environ.get('READ_REPLICA_BLUEPRINTS', 'reports,dashboard,forecast')
+    # Seconds a client keeps reading from the primary after a successful write (read-your-writes)
+    READ_REPLICA_STICKY_SECONDS = int(os.environ.get('READ_REPLICA_STICKY_SECONDS', 5))
+    
+    # Connection pool (Postgres and file SQLite); sized for 8 gunicorn threads plus background work
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+    # Seconds before a pooled connection is replaced (below server/proxy idle timeouts)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    # Test each connection on checkout so a restarted database does not surface as a 500
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    # Compiled SQL statements cached per engine by SQLAlchemy
+    DB_QUERY_CACHE_SIZE = int(os.environ.get('DB_QUERY_CACHE_SIZE', 1200))
+    
+    # SQLite connection PRAGMAs: WAL lets readers run while one thread writes
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    # NORMAL is durable against application crashes in WAL mode; FULL also against power loss
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    # Milliseconds a connection waits for a lock before "database is locked"
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    # Bytes of the database file memory-mapped for reads (0 disables)
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    # Page cache per connection in KiB (0 = SQLite default)
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 0))
+    # Prepared statements kept per sqlite3 connection
+    SQLITE_CACHED_STATEMENTS = int(os.environ.get('SQLITE_CACHED_STATEMENTS', 256))
+    
+    # Compress responses of at least this many bytes when the client accepts gzip or br (-1 disables)
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    # Brotli quality 0-11; 4 compresses better than gzip -6 at a similar speed
+    COMPRESS_BR_QUALITY = int(os.environ.get('COMPRESS_BR_QUALITY', 4))
+    
+    # Seconds the dashboard stats stay cached in-process (0 disables).
+    # Entries are also dropped as soon as the underlying data version changes.
+    DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', 30))
+    
+    # Live dashboard stream (Server-Sent Events)
+    SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+    SSE_CLIENT_BUFFER = int(os.environ.get('SSE_CLIENT_BUFFER', 100))
+    # Each open stream holds one gunicorn thread for as long as the page is open. Keep this
+    # below the thread count (16 in the Dockerfile / render.yaml) so API requests always get one.
+    SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS', 8))
+    # Refresh interval clients fall back to when the stream is full (503)
+    SSE_POLL_SECONDS = int(os.environ.get('SSE_POLL_SECONDS', 30))
+    
+    # Batched GET endpoint (/api/batch)
+    BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+    BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 4))
+    
+    # Product search backend: auto, fts5 (SQLite), pg_trgm (Postgres), memory, like
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+    
+    # Products returned by an unpaged /inventory/api/products call (deprecated); more is a 400
+    PRODUCTS_UNPAGED_MAX = int(os.environ.get('PRODUCTS_UNPAGED_MAX', 1000))
+    
+    # Rows validated and inserted per batch by the bulk product import
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+    
+    # Entries accepted by one bulk stock adjustment request
+    BULK_ADJUST_MAX_ITEMS = int(os.environ.get('BULK_ADJUST_MAX_ITEMS', 10000))
+    
+    # SKU / PO / SO numbers reserved per worker at a time (gaps are skipped on restart)
+    NUMBER_BLOCK_SIZE = int(os.environ.get('NUMBER_BLOCK_SIZE', 20))
+    
+    # Transaction ledger partitioning (Postgres only): '' (off) or 'monthly'.
+    # Enabling it rebuilds the ledger once at startup; see services/migrations.py.
+    LEDGER_PARTITIONING = os.environ.get('LEDGER_PARTITIONING', '')
+    LEDGER_PARTITION_MONTHS_AHEAD = int(os.environ.get('LEDGER_PARTITION_MONTHS_AHEAD', 3))
+    
+    # Forecast-driven replenishment: products per chunk and seconds a run may take (0 = no limit)
+    REPLENISHMENT_CHUNK_SIZE = int(os.environ.get('REPLENISHMENT_CHUNK_SIZE', 2000))
+    REPLENISHMENT_TIME_BUDGET = float(os.environ.get('REPLENISHMENT_TIME_BUDGET', 0))
+    
+    # Scan receiving group commit: flush after this many buffered scans or this many seconds
+    SCAN_FLUSH_BATCH_SIZE = int(os.environ.get('SCAN_FLUSH_BATCH_SIZE', 500))
+    SCAN_FLUSH_INTERVAL = float(os.environ.get('SCAN_FLUSH_INTERVAL', 2.0))
+    SCAN_MAX_PER_REQUEST = int(os.environ.get('SCAN_MAX_PER_REQUEST', 1000))
+    
+    # Products accepted by one available-to-promise request
+    ATP_MAX_ITEMS = int(os.environ.get('ATP_MAX_ITEMS', 10000))
+    
+    # Orders accepted by one bulk pick confirmation / bulk status request
+    BULK_ORDER_MAX_ITEMS = int(os.environ.get('BULK_ORDER_MAX_ITEMS', 5000))
+    
+    # Bulk location generation: locations per request and rows per insert batch
+    LOCATION_BULK_MAX_ITEMS = int(os.environ.get('LOCATION_BULK_MAX_ITEMS', 100000))
+    LOCATION_BULK_BATCH_SIZE = int(os.environ.get('LOCATION_BULK_BATCH_SIZE', 5000))
+    
+    # Putaway suggestions: default zone type searched and lines accepted per request
+    PUTAWAY_ZONE_TYPE = os.environ.get('PUTAWAY_ZONE_TYPE', 'storage')
+    PUTAWAY_MAX_LINES = int(os.environ.get('PUTAWAY_MAX_LINES', 1000))
+    
+    # Hours a stored Idempotency-Key response is replayed before `flask purge-idempotency-keys` drops it
+    IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
@@ -1,9 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from services.read_routing import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 from models.category import Category
 from models.product import Product
 from models.location import Location
 from models.transaction import Transaction
 from models.order import PurchaseOrder, PurchaseOrderItem, ShipmentOrder, ShipmentOrderItem
+from models.data_version import DataVersion
+from models.document_counter import DocumentCounter
+from models.schema_migration import SchemaMigration
+from models.wave import PickWave
+from models.idempotency_key import IdempotencyKey
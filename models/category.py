@@ -9,6 +9,8 @@ class Category(db.Model):
     description = db.Column(db.Text)
     color = db.Column(db.String(20), default='#6366f1')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Maintained by services.counters; `flask repair-counters` fixes drift
+    product_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     products = db.relationship('Product', backref='category', lazy='dynamic')
     
@@ -19,5 +21,5 @@ class Category(db.Model):
             'description': self.description,
             'color': self.color,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'product_count': self.products.count()
+            'product_count': self.product_count
         }
@@ -0,0 +1,16 @@
+from models import db
+from datetime import datetime
+
+class DataVersion(db.Model):
+    __tablename__ = 'data_versions'
+    
+    domain = db.Column(db.String(30), primary_key=True)  # products, categories, transactions, orders, locations
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'domain': self.domain,
+            'version': self.version,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
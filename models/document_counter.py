@@ -0,0 +1,16 @@
+from models import db
+from datetime import datetime
+
+class DocumentCounter(db.Model):
+    __tablename__ = 'document_counters'
+    
+    name = db.Column(db.String(50), primary_key=True)  # sku, po:YYYYMMDD, so:YYYYMMDD, wv:YYYYMMDD
+    value = db.Column(db.Integer, nullable=False, default=0)  # highest number handed out
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'value': self.value,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
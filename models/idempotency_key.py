@@ -0,0 +1,18 @@
+from models import db
+from datetime import datetime
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    
+    key = db.Column(db.String(100), primary_key=True)  # client-supplied Idempotency-Key header
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256 of method, path and body
+    status_code = db.Column(db.Integer)  # NULL until the response is stored
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def to_dict(self):
+        return {
+            'key': self.key,
+            'status_code': self.status_code,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -3,15 +3,22 @@ from datetime import datetime
 
 class Location(db.Model):
     __tablename__ = 'locations'
+    __table_args__ = (
+        # one row per bin; the bulk generator relies on it to skip or reject duplicates
+        db.Index('uq_locations_code', 'zone', 'aisle', 'rack', 'shelf', 'bin', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     zone = db.Column(db.String(10), nullable=False)
     aisle = db.Column(db.String(10), nullable=False)
     rack = db.Column(db.String(10), nullable=False)
     shelf = db.Column(db.String(10), nullable=False)
-    bin = db.Column(db.String(10), default='01')
+    bin = db.Column(db.String(10), nullable=False, default='01')
     max_capacity = db.Column(db.Integer, default=100)
+    # Occupancy (units, products, weight) maintained by services.occupancy
     current_capacity = db.Column(db.Integer, default=0)
+    product_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    current_weight = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
     is_active = db.Column(db.Boolean, default=True)
     zone_type = db.Column(db.String(20), default='storage')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -26,9 +33,9 @@ class Location(db.Model):
     
     @property
     def utilization(self):
-        if self.max_capacity == 0:
+        if not self.max_capacity:
             return 0
-        return round((self.current_capacity / self.max_capacity) * 100, 1)
+        return round(((self.current_capacity or 0) / self.max_capacity) * 100, 1)
     
     def to_dict(self):
         return {
@@ -42,8 +49,9 @@ class Location(db.Model):
             'short_code': self.short_code,
             'max_capacity': self.max_capacity,
             'current_capacity': self.current_capacity,
+            'current_weight': round(self.current_weight or 0, 3),
             'utilization': self.utilization,
             'is_active': self.is_active,
             'zone_type': self.zone_type,
-            'product_count': len(self.products) if self.products else 0
+            'product_count': self.product_count or 0
         }
@@ -27,8 +27,19 @@ class PurchaseOrder(db.Model):
     def total_value(self):
         return sum(item.line_total for item in self.items)
     
-    def to_dict(self):
-        return {
+    def to_dict(self, items=None, totals=None, include_items=True):
+        """
+        Callers that already hold the order's items and/or its
+        (total_items, total_received, total_value) pass them in to skip the
+        per-order queries; include_items=False gives the summary form.
+        """
+        if items is None and (include_items or totals is None):
+            items = self.items.all()
+        if totals is None:
+            totals = (sum(item.quantity for item in items),
+                      sum(item.received_quantity for item in items),
+                      sum(item.line_total for item in items))
+        data = {
             'id': self.id,
             'po_number': self.po_number,
             'supplier': self.supplier,
@@ -36,12 +47,14 @@ class PurchaseOrder(db.Model):
             'expected_date': self.expected_date.isoformat() if self.expected_date else None,
             'received_date': self.received_date.isoformat() if self.received_date else None,
             'notes': self.notes,
-            'total_items': self.total_items,
-            'total_received': self.total_received,
-            'total_value': self.total_value,
-            'items': [item.to_dict() for item in self.items],
+            'total_items': totals[0],
+            'total_received': totals[1],
+            'total_value': totals[2],
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+        if include_items:
+            data['items'] = [item.to_dict() for item in items]
+        return data
 
 class PurchaseOrderItem(db.Model):
     __tablename__ = 'purchase_order_items'
@@ -83,6 +96,7 @@ class ShipmentOrder(db.Model):
     delivery_date = db.Column(db.Date)
     shipping_address = db.Column(db.Text)
     notes = db.Column(db.Text)
+    wave_id = db.Column(db.Integer, db.ForeignKey('pick_waves.id'), index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     items = db.relationship('ShipmentOrderItem', backref='order', lazy='dynamic', cascade='all, delete-orphan')
@@ -99,8 +113,15 @@ class ShipmentOrder(db.Model):
     def total_value(self):
         return sum(item.line_total for item in self.items)
     
-    def to_dict(self):
-        return {
+    def to_dict(self, items=None, totals=None, include_items=True):
+        """See PurchaseOrder.to_dict; totals is (total_items, total_picked, total_value)."""
+        if items is None and (include_items or totals is None):
+            items = self.items.all()
+        if totals is None:
+            totals = (sum(item.quantity for item in items),
+                      sum(item.picked_quantity for item in items),
+                      sum(item.line_total for item in items))
+        data = {
             'id': self.id,
             'so_number': self.so_number,
             'customer': self.customer,
@@ -109,21 +130,26 @@ class ShipmentOrder(db.Model):
             'delivery_date': self.delivery_date.isoformat() if self.delivery_date else None,
             'shipping_address': self.shipping_address,
             'notes': self.notes,
-            'total_items': self.total_items,
-            'total_picked': self.total_picked,
-            'total_value': self.total_value,
-            'items': [item.to_dict() for item in self.items],
+            'wave_id': self.wave_id,
+            'total_items': totals[0],
+            'total_picked': totals[1],
+            'total_value': totals[2],
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+        if include_items:
+            data['items'] = [item.to_dict() for item in items]
+        return data
 
 class ShipmentOrderItem(db.Model):
     __tablename__ = 'shipment_order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('shipment_orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('shipment_orders.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, default=0)
     picked_quantity = db.Column(db.Integer, default=0)
+    # Share of products.reserved_quantity held by this line
+    reserved_quantity = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     unit_price = db.Column(db.Float, default=0)
     
     product = db.relationship('Product')
@@ -140,6 +166,7 @@ class ShipmentOrderItem(db.Model):
             'product_sku': self.product.sku if self.product else None,
             'quantity': self.quantity,
             'picked_quantity': self.picked_quantity,
+            'reserved_quantity': self.reserved_quantity,
             'unit_price': self.unit_price,
             'line_total': self.line_total
         }
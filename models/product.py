@@ -3,6 +3,9 @@ from datetime import datetime
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('ix_products_name_id', 'name', 'id'),  # keyset pagination on the default sort
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     sku = db.Column(db.String(50), unique=True, nullable=False)
@@ -10,11 +13,13 @@ class Product(db.Model):
     description = db.Column(db.Text)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
     quantity = db.Column(db.Integer, default=0)
+    # Units promised to shipment orders being picked; maintained by services.allocation
+    reserved_quantity = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     min_stock = db.Column(db.Integer, default=10)
     max_stock = db.Column(db.Integer, default=1000)
     unit_price = db.Column(db.Float, default=0.0)
     cost_price = db.Column(db.Float, default=0.0)
-    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'))
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), index=True)
     unit = db.Column(db.String(20), default='pcs')
     weight = db.Column(db.Float, default=0.0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -33,6 +38,10 @@ class Product(db.Model):
             return 'overstock'
         return 'normal'
     
+    @property
+    def available_quantity(self):
+        return max(0, (self.quantity or 0) - (self.reserved_quantity or 0))
+    
     @property
     def stock_value(self):
         return self.quantity * self.unit_price
@@ -46,6 +55,8 @@ class Product(db.Model):
             'category_id': self.category_id,
             'category_name': self.category.name if self.category else None,
             'quantity': self.quantity,
+            'reserved_quantity': self.reserved_quantity,
+            'available_quantity': self.available_quantity,
             'min_stock': self.min_stock,
             'max_stock': self.max_stock,
             'unit_price': self.unit_price,
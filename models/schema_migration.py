@@ -0,0 +1,14 @@
+from models import db
+from datetime import datetime
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    
+    id = db.Column(db.String(100), primary_key=True)  # e.g. 0002_transaction_indexes
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'applied_at': self.applied_at.isoformat() if self.applied_at else None
+        }
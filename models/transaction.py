@@ -3,6 +3,12 @@ from datetime import datetime
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        # forecast demand: product + type over a date range
+        db.Index('ix_transactions_product_type_created', 'product_id', 'transaction_type', 'created_at'),
+        # ledger listings: newest first
+        db.Index('ix_transactions_created_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
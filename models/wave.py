@@ -0,0 +1,25 @@
+from models import db
+from datetime import datetime
+
+class PickWave(db.Model):
+    __tablename__ = 'pick_waves'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    wave_number = db.Column(db.String(50), unique=True, nullable=False)
+    status = db.Column(db.String(20), default='open')  # open, completed, cancelled
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+    
+    orders = db.relationship('ShipmentOrder', backref='wave', lazy='dynamic')
+    
+    def to_dict(self, order_count=None):
+        return {
+            'id': self.id,
+            'wave_number': self.wave_number,
+            'status': self.status,
+            'notes': self.notes,
+            'order_count': self.orders.count() if order_count is None else order_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
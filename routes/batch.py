@@ -0,0 +1,106 @@
+"""
+Batch Routes
+Executes several internal GET requests in one HTTP round trip
+"""
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.exceptions import HTTPException
+
+from models import db
+
+batch_bp = Blueprint('batch', __name__)
+
+# Endpoints that cannot be answered inside a batch envelope
+EXCLUDED_ENDPOINTS = {'batch.batch', 'dashboard.stream', 'static'}
+
+
+def _dispatch(app, sub, index):
+    """
+    Run a single sub-request against the app's view functions and return its
+    envelope entry. Only the view runs: before/after_request hooks such as
+    response compression and the read-your-writes cookie are skipped, and
+    apply once to the batch response instead.
+    """
+    if not isinstance(sub, dict):
+        return {'id': index, 'path': None, 'status': 400, 'body': {'error': 'Request must be an object'}}
+    path = sub.get('path') or ''
+    if not isinstance(path, str) or not isinstance(sub.get('headers') or {}, dict):
+        return {'id': sub.get('id', index), 'path': None, 'status': 400,
+                'body': {'error': 'path must be a string and headers an object'}}
+    parts = urlsplit(path)
+    result = {'id': sub.get('id', path), 'path': path}
+
+    adapter = app.url_map.bind('localhost')
+    try:
+        endpoint, view_args = adapter.match(parts.path, method='GET')
+    except HTTPException as e:
+        result.update(status=e.code, body={'error': e.description})
+        return result
+
+    if endpoint in EXCLUDED_ENDPOINTS:
+        result.update(status=400, body={'error': 'Endpoint not allowed in a batch'})
+        return result
+
+    with app.test_request_context(parts.path, query_string=parts.query, headers=sub.get('headers') or {}):
+        try:
+            response = app.make_response(app.view_functions[endpoint](**view_args))
+        except HTTPException as e:
+            result.update(status=e.code, body={'error': e.description})
+            return result
+        except Exception:
+            current_app.logger.exception('Batch sub-request failed: %s', path)
+            db.session.rollback()
+            result.update(status=500, body={'error': 'Internal error'})
+            return result
+
+        result['status'] = response.status_code
+        if response.headers.get('ETag'):
+            result['etag'] = response.headers['ETag']
+        if response.status_code == 304:
+            result['body'] = None
+        elif response.is_json:
+            result['body'] = response.get_json()
+        else:
+            result['body'] = response.get_data(as_text=True)
+    return result
+
+
+def _dispatch_isolated(app, sub, index):
+    # Worker threads get their own app context and therefore their own session
+    with app.app_context():
+        try:
+            return _dispatch(app, sub, index)
+        finally:
+            db.session.remove()
+
+
+@batch_bp.route('/api/batch', methods=['POST'])
+def batch():
+    """
+    Body: {"requests": [{"id": "stats", "path": "/api/dashboard/stats", "headers": {...}}, ...],
+           "parallel": false}
+    Sub-requests run in order in this request's app context and DB session.
+    With parallel=true they run concurrently, each in its own session.
+    A malformed entry gets a 400 of its own; the rest of the batch still runs.
+    """
+    data = request.get_json(silent=True) or {}
+    subs = data.get('requests') if isinstance(data, dict) else None
+    max_requests = current_app.config.get('BATCH_MAX_REQUESTS', 20)
+
+    if not isinstance(subs, list) or not subs:
+        return jsonify({'error': 'No requests given'}), 400
+    if len(subs) > max_requests:
+        return jsonify({'error': f'At most {max_requests} requests per batch'}), 400
+
+    app = current_app._get_current_object()
+    if data.get('parallel') and len(subs) > 1:
+        workers = min(len(subs), current_app.config.get('BATCH_MAX_WORKERS', 4))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda sub, index: _dispatch_isolated(app, sub, index),
+                                    subs, range(len(subs))))
+    else:
+        results = [_dispatch(app, sub, index) for index, sub in enumerate(subs)]
+
+    return jsonify({'responses': results})
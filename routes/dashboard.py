@@ -1,10 +1,14 @@
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, render_template, jsonify, current_app, Response
 from models import db
 from models.product import Product
 from models.category import Category
 from models.location import Location
 from models.transaction import Transaction
 from models.order import PurchaseOrder, ShipmentOrder
+from services.data_version import conditional, version_token
+from services.cache import cache
+from services.event_bus import bus
+import json
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -12,39 +16,63 @@ dashboard_bp = Blueprint('dashboard', __name__)
 def index():
     return render_template('dashboard.html')
 
+STATS_DOMAINS = ('products', 'orders', 'locations', 'categories')
+
+def compute_stats():
+    """All dashboard KPIs in a single round trip via scalar subqueries."""
+    def scalar(stmt):
+        return stmt.scalar_subquery()
+    
+    row = db.session.execute(db.select(
+        scalar(db.select(db.func.count(Product.id))).label('total_products'),
+        scalar(db.select(db.func.coalesce(db.func.sum(Product.quantity), 0))).label('total_quantity'),
+        scalar(db.select(db.func.coalesce(db.func.sum(Product.quantity * Product.unit_price), 0))).label('total_value'),
+        scalar(db.select(db.func.count(Product.id)).where(
+            Product.quantity <= Product.min_stock, Product.quantity > 0)).label('low_stock_count'),
+        scalar(db.select(db.func.count(PurchaseOrder.id)).where(
+            PurchaseOrder.status.in_(['draft', 'pending']))).label('pending_po'),
+        scalar(db.select(db.func.count(ShipmentOrder.id)).where(
+            ShipmentOrder.status.in_(['draft', 'picking', 'packed']))).label('pending_so'),
+        scalar(db.select(db.func.count(Location.id)).where(Location.is_active == True)).label('total_locations'),
+        scalar(db.select(db.func.count(Category.id))).label('total_categories'),
+    )).one()
+    
+    return {
+        'total_products': row.total_products,
+        'total_quantity': row.total_quantity,
+        'total_value': round(float(row.total_value), 2),
+        'low_stock_count': row.low_stock_count,
+        'pending_purchase_orders': row.pending_po,
+        'pending_shipment_orders': row.pending_so,
+        'total_locations': row.total_locations,
+        'total_categories': row.total_categories
+    }
+
 @dashboard_bp.route('/api/dashboard/stats')
+@conditional(*STATS_DOMAINS)
 def get_stats():
-    total_products = Product.query.count()
-    total_quantity = db.session.query(db.func.sum(Product.quantity)).scalar() or 0
-    total_value = db.session.query(db.func.sum(Product.quantity * Product.unit_price)).scalar() or 0
-    low_stock_count = Product.query.filter(Product.quantity <= Product.min_stock, Product.quantity > 0).count()
-    pending_po = PurchaseOrder.query.filter(PurchaseOrder.status.in_(['draft', 'pending'])).count()
-    pending_so = ShipmentOrder.query.filter(ShipmentOrder.status.in_(['draft', 'picking', 'packed'])).count()
-    total_locations = Location.query.filter_by(is_active=True).count()
-    total_categories = Category.query.count()
-    
-    return jsonify({
-        'total_products': total_products,
-        'total_quantity': total_quantity,
-        'total_value': round(float(total_value), 2),
-        'low_stock_count': low_stock_count,
-        'pending_purchase_orders': pending_po,
-        'pending_shipment_orders': pending_so,
-        'total_locations': total_locations,
-        'total_categories': total_categories
-    })
+    stats = cache.get_or_compute(
+        'dashboard:stats',
+        version_token(*STATS_DOMAINS),
+        compute_stats,
+        ttl=current_app.config.get('DASHBOARD_CACHE_TTL', 30)
+    )
+    return jsonify(stats)
 
 @dashboard_bp.route('/api/dashboard/recent-activity')
+@conditional('transactions', 'products')
 def get_recent_activity():
     transactions = Transaction.query.order_by(Transaction.created_at.desc()).limit(10).all()
     return jsonify([t.to_dict() for t in transactions])
 
 @dashboard_bp.route('/api/dashboard/low-stock')
+@conditional('products', 'categories', 'locations')
 def get_low_stock():
     products = Product.query.filter(Product.quantity <= Product.min_stock).order_by(Product.quantity).limit(10).all()
     return jsonify([p.to_dict() for p in products])
 
 @dashboard_bp.route('/api/dashboard/category-distribution')
+@conditional('categories', 'products')
 def get_category_distribution():
     categories = Category.query.all()
     result = []
@@ -52,6 +80,45 @@ def get_category_distribution():
         result.append({
             'name': cat.name,
             'color': cat.color,
-            'count': cat.products.count()
+            'count': cat.product_count
         })
     return jsonify(result)
+
+@dashboard_bp.route('/api/dashboard/stream')
+def stream():
+    """
+    Server-Sent Events feed of committed stock, low-stock and order status changes.
+    Every open stream holds a server thread, so at most SSE_MAX_CLIENTS are
+    served; beyond that the client gets 503 and should poll instead.
+    """
+    heartbeat = current_app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+    poll_seconds = current_app.config.get('SSE_POLL_SECONDS', 30)
+    sub = bus.subscribe(maxsize=current_app.config.get('SSE_CLIENT_BUFFER', 100),
+                        limit=current_app.config.get('SSE_MAX_CLIENTS', 8))
+    if sub is None:
+        response = jsonify({'error': 'Too many live dashboard connections; poll instead',
+                            'poll': '/api/dashboard/stats', 'poll_seconds': poll_seconds})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(poll_seconds)
+        return response
+    
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                item = sub.get(timeout=heartbeat)
+                if item is None:
+                    yield ': heartbeat\n\n'
+                    continue
+                event_id, event_type, data = item
+                message = f'event: {event_type}\ndata: {json.dumps(data)}\n\n'
+                if event_id is not None:
+                    message = f'id: {event_id}\n' + message
+                yield message
+        finally:
+            bus.unsubscribe(sub)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
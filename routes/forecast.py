@@ -2,11 +2,13 @@
 Forecast Routes
 API endpoints for demand forecasting and report generation
 """
-from flask import Blueprint, render_template, request, jsonify, Response
+from flask import Blueprint, render_template, request, jsonify, Response, current_app
 from models import db
 from models.product import Product
 from models.category import Category
 from services.forecast_service import ForecastService
+from services.replenishment_service import ReplenishmentService
+from services.data_version import conditional
 from datetime import datetime
 import csv
 import io
@@ -21,6 +23,7 @@ def index():
 
 
 @forecast_bp.route('/api/products')
+@conditional('products', 'categories', 'transactions', per_day=True)
 def get_all_forecasts():
     """Get forecasts for all products."""
     history_days = request.args.get('history_days', 90, type=int)
@@ -46,6 +49,7 @@ def get_all_forecasts():
 
 
 @forecast_bp.route('/api/products/<int:product_id>')
+@conditional('products', 'categories', 'transactions', per_day=True)
 def get_product_forecast(product_id):
     """Get detailed forecast for a specific product."""
     history_days = request.args.get('history_days', 90, type=int)
@@ -67,6 +71,7 @@ def get_product_forecast(product_id):
 
 
 @forecast_bp.route('/api/categories')
+@conditional('products', 'categories', 'transactions', per_day=True)
 def get_category_forecasts():
     """Get aggregated forecasts by category."""
     history_days = request.args.get('history_days', 90, type=int)
@@ -84,7 +89,34 @@ def get_category_forecasts():
     })
 
 
+@forecast_bp.route('/api/replenishment', methods=['POST'])
+def run_replenishment():
+    """
+    Draft purchase orders from the forecast, one per supplier.
+    Defaults to a dry run; send {"dry_run": false} to create the orders.
+    """
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        options = {
+            'history_days': int(data.get('history_days', 90)),
+            'forecast_days': int(data.get('forecast_days', 30)),
+            'algorithm': data.get('algorithm', 'exponential'),
+            'after_id': int(data.get('after_id', 0)),
+            'time_budget': float(data.get('time_budget', current_app.config.get('REPLENISHMENT_TIME_BUDGET', 0))) or None,
+        }
+    except (TypeError, ValueError):
+        return jsonify({'error': 'history_days, forecast_days, after_id and time_budget must be numbers'}), 400
+    
+    service = ReplenishmentService(db.session, current_app.config.get('REPLENISHMENT_CHUNK_SIZE', 2000))
+    result = service.run(dry_run=bool(data.get('dry_run', True)), **options)
+    
+    created = not result['dry_run'] and result['suppliers']
+    return jsonify(result), 201 if created else 200
+
+
 @forecast_bp.route('/api/report')
+@conditional('products', 'categories', 'transactions', per_day=True)
 def get_full_report():
     """Get comprehensive forecast report data."""
     history_days = request.args.get('history_days', 90, type=int)
@@ -102,6 +134,7 @@ def get_full_report():
 
 
 @forecast_bp.route('/api/export/csv')
+@conditional('products', 'categories', 'transactions', per_day=True)
 def export_csv():
     """Export forecast data as CSV."""
     history_days = request.args.get('history_days', 90, type=int)
@@ -159,6 +192,7 @@ def export_csv():
 
 
 @forecast_bp.route('/api/export/pdf')
+@conditional('products', 'categories', 'transactions', per_day=True)
 def export_pdf():
     """Export forecast report as a professional PDF."""
     try:
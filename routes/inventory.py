@@ -1,9 +1,16 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, current_app
 from models import db
 from models.product import Product
 from models.category import Category
 from models.transaction import Transaction
 from datetime import datetime
+from services.data_version import conditional
+from services.pagination import keyset_page, offset_page, encode_cursor, parse_limit, count_rows
+from services.search_service import apply_search, typeahead
+from services.import_service import ProductImportService, iter_csv, iter_json_lines
+from services.stock_service import StockService
+from services.allocation import AllocationService
+from services.numbering import next_sku
 
 inventory_bp = Blueprint('inventory', __name__, url_prefix='/inventory')
 
@@ -13,21 +20,63 @@ def index():
 
 # ============ PRODUCT CRUD ============
 
+# Sortable columns for keyset pagination; nullable ones are coalesced so the
+# (value, id) ordering is total.
+SORT_COLUMNS = {
+    'name': Product.name,
+    'sku': Product.sku,
+    'id': Product.id,
+    'quantity': db.func.coalesce(Product.quantity, 0),
+    'unit_price': db.func.coalesce(Product.unit_price, 0.0),
+    'cost_price': db.func.coalesce(Product.cost_price, 0.0),
+    'min_stock': db.func.coalesce(Product.min_stock, 0),
+    'max_stock': db.func.coalesce(Product.max_stock, 0),
+    'created_at': db.func.coalesce(Product.created_at, datetime(1970, 1, 1)),
+    'updated_at': db.func.coalesce(Product.updated_at, datetime(1970, 1, 1)),
+}
+
+SORT_DEFAULTS = {
+    'quantity': 0, 'unit_price': 0.0, 'cost_price': 0.0, 'min_stock': 0, 'max_stock': 0,
+    'created_at': datetime(1970, 1, 1), 'updated_at': datetime(1970, 1, 1),
+}
+
+def _unpaged_products(rows):
+    """
+    The deprecated whole-list response. It is refused with 400 once more than
+    PRODUCTS_UNPAGED_MAX products match, so its cost stays bounded as the
+    catalog grows; pickers use /api/products/search, listings limit/cursor.
+    """
+    cap = current_app.config.get('PRODUCTS_UNPAGED_MAX', 1000)
+    products = rows.limit(cap + 1).all()
+    if len(products) > cap:
+        return jsonify({'error': f'More than {cap} products match; page with limit and cursor'}), 400
+    response = jsonify([p.to_dict() for p in products])
+    response.headers['Deprecation'] = 'true'
+    return response
+
 @inventory_bp.route('/api/products')
+@conditional('products', 'categories', 'locations')
 def get_products():
+    """
+    Filtered product listing.
+    Without `limit`/`cursor` the whole list is returned, up to PRODUCTS_UNPAGED_MAX
+    products (deprecated; see _unpaged_products).
+    With them, returns one keyset page: {items, next_cursor, has_more[, total, total_is_estimate]}.
+    `include_total` may be `estimate` or `exact`.
+    A `search` term goes through the indexed search backend; unless another
+    `sort_by` is given, results are ordered by relevance.
+    """
     search = request.args.get('search', '')
     category_id = request.args.get('category_id', type=int)
     status = request.args.get('status', '')
-    sort_by = request.args.get('sort_by', 'name')
+    sort_by = request.args.get('sort_by', 'relevance' if search else 'name')
     sort_order = request.args.get('sort_order', 'asc')
     
     query = Product.query
+    rank = None
     
     if search:
-        query = query.filter(db.or_(
-            Product.name.ilike(f'%{search}%'),
-            Product.sku.ilike(f'%{search}%')
-        ))
+        query, rank = apply_search(query, search)
     
     if category_id:
         query = query.filter_by(category_id=category_id)
@@ -39,17 +88,82 @@ def get_products():
     elif status == 'overstock':
         query = query.filter(Product.quantity >= Product.max_stock)
     
-    # Sorting
-    sort_col = getattr(Product, sort_by, Product.name)
-    if sort_order == 'desc':
-        query = query.order_by(sort_col.desc())
-    else:
-        query = query.order_by(sort_col.asc())
+    relevance = sort_by == 'relevance' and rank is not None
+    if sort_by not in SORT_COLUMNS:
+        sort_by = 'name'
+    sort_col = SORT_COLUMNS[sort_by]
+    descending = sort_order == 'desc'
+    
+    # Product.to_dict reads category and location; load them in the same query
+    rows = query.options(
+        db.joinedload(Product.category),
+        db.joinedload(Product.location)
+    )
+    paged = 'limit' in request.args or 'cursor' in request.args
+    
+    if relevance:
+        rows = rows.order_by(rank, Product.id)
+        if not paged:
+            return _unpaged_products(rows)
+        try:
+            products, has_more, next_cursor = offset_page(
+                rows, cursor=request.args.get('cursor'), limit=parse_limit(request.args.get('limit')))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit or cursor'}), 400
+        result = {
+            'items': [p.to_dict() for p in products],
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }
+        include_total = request.args.get('include_total', '')
+        if include_total in ('estimate', 'exact'):
+            result['total'], result['total_is_estimate'] = count_rows(query, estimate=include_total == 'estimate')
+        return jsonify(result)
+    
+    if not paged:
+        if descending:
+            rows = rows.order_by(sort_col.desc(), Product.id.desc())
+        else:
+            rows = rows.order_by(sort_col.asc(), Product.id.asc())
+        return _unpaged_products(rows)
+    
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        products, has_more = keyset_page(rows, sort_col, Product.id, descending,
+                                         cursor=request.args.get('cursor'), limit=limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or cursor'}), 400
     
-    products = query.all()
-    return jsonify([p.to_dict() for p in products])
+    next_cursor = None
+    if has_more and products:
+        last = products[-1]
+        value = getattr(last, sort_by)
+        if value is None:
+            value = SORT_DEFAULTS.get(sort_by)
+        next_cursor = encode_cursor(value, last.id)
+    
+    result = {
+        'items': [p.to_dict() for p in products],
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
+    
+    include_total = request.args.get('include_total', '')
+    if include_total in ('estimate', 'exact'):
+        result['total'], result['total_is_estimate'] = count_rows(query, estimate=include_total == 'estimate')
+    
+    return jsonify(result)
+
+@inventory_bp.route('/api/products/search')
+@conditional('products')
+def search_products():
+    """Type-ahead suggestions: [{id, sku, name, quantity}] ranked, SKU prefixes first."""
+    term = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify(typeahead(term, limit=limit))
 
 @inventory_bp.route('/api/products/<int:product_id>')
+@conditional('products', 'categories', 'locations')
 def get_product(product_id):
     product = Product.query.get_or_404(product_id)
     return jsonify(product.to_dict())
@@ -58,7 +172,7 @@ def get_product(product_id):
 def create_product():
     data = request.get_json()
     
-    sku = data.get('sku') or f'SKU-{Product.query.count() + 1:06d}'
+    sku = data.get('sku') or next_sku()
     if Product.query.filter_by(sku=sku).first():
         return jsonify({'error': 'SKU already exists'}), 400
     
@@ -93,6 +207,39 @@ def create_product():
     
     return jsonify(product.to_dict()), 201
 
+@inventory_bp.route('/api/products/import', methods=['POST'])
+def import_products():
+    """
+    Bulk-create products from CSV or JSON lines.
+    Accepts a multipart `file` upload or a raw request body; the format comes
+    from `?format=csv|jsonl`, the file extension or the Content-Type.
+    `?atomic=true` makes the whole import succeed or fail as one transaction.
+    """
+    upload = request.files.get('file')
+    if upload:
+        stream, filename, mimetype = upload.stream, upload.filename or '', upload.mimetype
+    else:
+        stream, filename, mimetype = request.stream, '', request.mimetype
+    
+    fmt = request.args.get('format', '').lower()
+    if not fmt:
+        if filename.endswith(('.jsonl', '.ndjson')) or mimetype in ('application/x-ndjson', 'application/jsonl'):
+            fmt = 'jsonl'
+        else:
+            fmt = 'csv'
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': 'Unsupported format'}), 400
+    
+    rows = iter_csv(stream) if fmt == 'csv' else iter_json_lines(stream)
+    service = ProductImportService(
+        db.session,
+        batch_size=current_app.config.get('IMPORT_BATCH_SIZE', 1000)
+    )
+    summary = service.import_rows(rows, atomic=request.args.get('atomic', '').lower() == 'true')
+    if summary.get('rolled_back'):
+        return jsonify(summary), 409
+    return jsonify(summary), 201 if summary['created'] else 200
+
 @inventory_bp.route('/api/products/<int:product_id>', methods=['PUT'])
 def update_product(product_id):
     product = Product.query.get_or_404(product_id)
@@ -112,16 +259,10 @@ def update_product(product_id):
     
     new_qty = data.get('quantity')
     if new_qty is not None and new_qty != old_qty:
-        product.quantity = new_qty
-        trans = Transaction(
-            product_id=product.id,
-            transaction_type='ADJUST',
-            quantity=new_qty - old_qty,
-            quantity_before=old_qty,
-            quantity_after=new_qty,
+        StockService(db.session).set_quantity(
+            product.id, new_qty, expected=old_qty,
             reason=data.get('adjustment_reason', 'Manual adjustment')
         )
-        db.session.add(trans)
     
     db.session.commit()
     return jsonify(product.to_dict())
@@ -140,34 +281,85 @@ def adjust_stock(product_id):
     data = request.get_json()
     adj_type = data.get('type', 'add')
     quantity = data.get('quantity', 0)
-    old_qty = product.quantity
     
-    if adj_type == 'add':
-        product.quantity += quantity
-        trans_type = 'IN'
-    else:
-        product.quantity = max(0, product.quantity - quantity)
-        quantity = -quantity
-        trans_type = 'OUT'
-    
-    trans = Transaction(
-        product_id=product.id,
-        transaction_type=trans_type,
-        quantity=quantity,
-        quantity_before=old_qty,
-        quantity_after=product.quantity,
+    StockService(db.session).apply_delta(
+        product.id,
+        quantity if adj_type == 'add' else -quantity,
+        transaction_type='IN' if adj_type == 'add' else 'OUT',
         reference_type='adjustment',
         reason=data.get('reason', 'Manual adjustment'),
         notes=data.get('notes', '')
     )
-    db.session.add(trans)
     db.session.commit()
     
     return jsonify(product.to_dict())
 
+@inventory_bp.route('/api/products/bulk-adjust', methods=['POST'])
+def bulk_adjust_stock():
+    """
+    Body: {"items": [{"sku": "SKU-000001", "counted": 42}, {"product_id": 7, "delta": -3, "reason": "Damaged"}],
+           "reason": "Cycle count"}
+    All adjustments are committed together, or none are when any entry is invalid.
+    """
+    data = request.get_json() or {}
+    items = data.get('items')
+    max_items = current_app.config.get('BULK_ADJUST_MAX_ITEMS', 10000)
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'No items given'}), 400
+    if len(items) > max_items:
+        return jsonify({'error': f'At most {max_items} items per request'}), 400
+    
+    summary, errors = StockService(db.session).bulk_adjust(
+        items,
+        reason=data.get('reason') or 'Bulk adjustment',
+        notes=data.get('notes', '')
+    )
+    if errors:
+        return jsonify({'error': 'Invalid adjustments', 'errors': errors}), 400
+    return jsonify(summary)
+
+@inventory_bp.route('/api/atp', methods=['GET', 'POST'])
+def available_to_promise():
+    """
+    Available-to-promise (on hand minus reserved) for many products at once.
+    GET ?ids=1,2&skus=SKU-000001&incoming=true, or POST
+    {"product_ids": [...], "skus": [...], "include_incoming": true} for long lists.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        product_ids = data.get('product_ids') or []
+        skus = data.get('skus') or []
+        include_incoming = bool(data.get('include_incoming'))
+    else:
+        product_ids = [v for v in request.args.get('ids', '').split(',') if v]
+        skus = [v for v in request.args.get('skus', '').split(',') if v]
+        include_incoming = request.args.get('incoming', '').lower() == 'true'
+    
+    try:
+        product_ids = [int(v) for v in product_ids]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'product_ids must be integers'}), 400
+    if not isinstance(skus, list) or not (product_ids or skus):
+        return jsonify({'error': 'Give product_ids and/or skus'}), 400
+    
+    max_items = current_app.config.get('ATP_MAX_ITEMS', 10000)
+    if len(product_ids) + len(skus) > max_items:
+        return jsonify({'error': f'At most {max_items} products per request'}), 400
+    
+    result = AllocationService(db.session).available_to_promise(
+        product_ids, [str(s) for s in skus], include_incoming=include_incoming)
+    found_skus = {entry['sku'] for entry in result.values()}
+    return jsonify({
+        'items': list(result.values()),
+        'missing_ids': [pid for pid in product_ids if pid not in result],
+        'missing_skus': [sku for sku in skus if str(sku) not in found_skus]
+    })
+
 # ============ CATEGORIES ============
 
 @inventory_bp.route('/api/categories')
+@conditional('categories', 'products')
 def get_categories():
     categories = Category.query.order_by(Category.name).all()
     return jsonify([c.to_dict() for c in categories])
@@ -208,6 +400,7 @@ def delete_category(category_id):
 # ============ TRANSACTIONS ============
 
 @inventory_bp.route('/api/transactions')
+@conditional('transactions', 'products')
 def get_transactions():
     product_id = request.args.get('product_id', type=int)
     trans_type = request.args.get('type', '')
@@ -1,6 +1,9 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, current_app
+from sqlalchemy.exc import IntegrityError
 from models import db
 from models.location import Location
+from services.data_version import conditional
+from services.location_generator import LocationGenerator, LocationConflictError, number_range
 
 locations_bp = Blueprint('locations', __name__, url_prefix='/locations')
 
@@ -9,6 +12,7 @@ def index():
     return render_template('locations.html')
 
 @locations_bp.route('/api/locations')
+@conditional('locations', 'products')
 def get_locations():
     zone = request.args.get('zone', '')
     zone_type = request.args.get('zone_type', '')
@@ -26,6 +30,7 @@ def get_locations():
     return jsonify([l.to_dict() for l in locations])
 
 @locations_bp.route('/api/locations/<int:location_id>')
+@conditional('locations', 'products')
 def get_location(location_id):
     location = Location.query.get_or_404(location_id)
     return jsonify(location.to_dict())
@@ -44,7 +49,11 @@ def create_location():
         is_active=data.get('is_active', True)
     )
     db.session.add(location)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': f'Location {location.full_code} already exists'}), 409
     return jsonify(location.to_dict()), 201
 
 @locations_bp.route('/api/locations/<int:location_id>', methods=['PUT'])
@@ -59,7 +68,11 @@ def update_location(location_id):
     location.max_capacity = data.get('max_capacity', location.max_capacity)
     location.zone_type = data.get('zone_type', location.zone_type)
     location.is_active = data.get('is_active', location.is_active)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Another location already has this code'}), 409
     return jsonify(location.to_dict())
 
 @locations_bp.route('/api/locations/<int:location_id>', methods=['DELETE'])
@@ -71,6 +84,7 @@ def delete_location(location_id):
     return jsonify({'message': 'Deleted'})
 
 @locations_bp.route('/api/locations/zones')
+@conditional('locations')
 def get_zones():
     zones = db.session.query(Location.zone).distinct().order_by(Location.zone).all()
     return jsonify([z[0] for z in zones])
@@ -81,31 +95,48 @@ def get_zone_types():
 
 @locations_bp.route('/api/locations/bulk', methods=['POST'])
 def create_bulk_locations():
-    data = request.get_json()
-    zone = data['zone']
-    zone_type = data.get('zone_type', 'storage')
-    aisle_start = int(data.get('aisle_start', 1))
-    aisle_end = int(data.get('aisle_end', 1))
-    rack_start = int(data.get('rack_start', 1))
-    rack_end = int(data.get('rack_end', 1))
+    """
+    Generate a grid of locations: aisle_start..aisle_end x rack_start..rack_end
+    x shelves x bin_start..bin_end. Existing codes are skipped, or with
+    {"on_conflict": "fail"} the request is refused with 409 and nothing is created.
+    """
+    data = request.get_json(silent=True) or {}
+    if not data.get('zone'):
+        return jsonify({'error': 'zone is required'}), 400
     shelves = data.get('shelves', ['A', 'B', 'C'])
-    max_capacity = data.get('max_capacity', 100)
+    if not isinstance(shelves, list) or not shelves:
+        return jsonify({'error': 'shelves must be a non-empty list'}), 400
+    try:
+        aisles = number_range(data.get('aisle_start', 1), data.get('aisle_end', 1))
+        racks = number_range(data.get('rack_start', 1), data.get('rack_end', 1))
+        bins = number_range(data.get('bin_start', 1), data.get('bin_end', 1))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Ranges must be non-negative integers with start <= end ({e})'}), 400
     
-    created = 0
-    for aisle in range(aisle_start, aisle_end + 1):
-        for rack in range(rack_start, rack_end + 1):
-            for shelf in shelves:
-                loc = Location(
-                    zone=zone,
-                    aisle=f'{aisle:02d}',
-                    rack=f'{rack:02d}',
-                    shelf=shelf,
-                    bin='01',
-                    max_capacity=max_capacity,
-                    zone_type=zone_type
-                )
-                db.session.add(loc)
-                created += 1
+    requested = len(aisles) * len(racks) * len(shelves) * len(bins)
+    limit = current_app.config['LOCATION_BULK_MAX_ITEMS']
+    if requested > limit:
+        return jsonify({'error': f'{requested} locations requested; at most {limit} per request'}), 400
+    
+    generator = LocationGenerator(db.session, current_app.config['LOCATION_BULK_BATCH_SIZE'])
+    try:
+        result = generator.generate(
+            data['zone'], aisles, racks, [str(s) for s in shelves], bins,
+            on_conflict=data.get('on_conflict', 'skip'),
+            max_capacity=data.get('max_capacity', 100),
+            zone_type=data.get('zone_type', 'storage')
+        )
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except LocationConflictError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'conflicts': e.conflicts, 'sample': e.sample}), 409
+    except IntegrityError:
+        # Another request created some of these codes after they were checked
+        db.session.rollback()
+        return jsonify({'error': 'Locations were created concurrently; retry the request'}), 409
     
-    db.session.commit()
-    return jsonify({'message': f'Created {created} locations'}), 201
+    result['message'] = f"Created {result['created']} locations"
+    return jsonify(result), 201 if result['created'] else 200
@@ -1,9 +1,15 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, current_app
 from models import db
 from models.product import Product
-from models.transaction import Transaction
 from models.order import PurchaseOrder, PurchaseOrderItem
 from datetime import datetime, date
+import time
+from services.data_version import conditional
+from services.stock_service import StockService
+from services.order_listing import list_orders
+from services.numbering import next_po_number
+from services import scan_receiving
+from services.putaway import suggest_putaway
 
 receiving_bp = Blueprint('receiving', __name__, url_prefix='/receiving')
 
@@ -12,15 +18,20 @@ def index():
     return render_template('receiving.html')
 
 @receiving_bp.route('/api/orders')
+@conditional('orders', 'products')
 def get_orders():
-    status = request.args.get('status', '')
-    query = PurchaseOrder.query.order_by(PurchaseOrder.created_at.desc())
-    if status:
-        query = query.filter_by(status=status)
-    orders = query.all()
-    return jsonify([o.to_dict() for o in orders])
+    """
+    Orders newest first with totals from one grouped query.
+    Optional: status (comma-separated), created_from / created_to (YYYY-MM-DD),
+    summary=true (no line items), limit / cursor for keyset pagination.
+    """
+    try:
+        return jsonify(list_orders(PurchaseOrder, PurchaseOrderItem, PurchaseOrderItem.received_quantity, request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
 @receiving_bp.route('/api/orders/<int:order_id>')
+@conditional('orders', 'products')
 def get_order(order_id):
     order = PurchaseOrder.query.get_or_404(order_id)
     return jsonify(order.to_dict())
@@ -29,12 +40,8 @@ def get_order(order_id):
 def create_order():
     data = request.get_json()
     
-    today = date.today()
-    count = PurchaseOrder.query.filter(db.func.date(PurchaseOrder.created_at) == today).count()
-    po_number = f"PO-{today.strftime('%Y%m%d')}-{count + 1:03d}"
-    
     order = PurchaseOrder(
-        po_number=po_number,
+        po_number=next_po_number(),
         supplier=data.get('supplier', ''),
         status='draft',
         expected_date=datetime.strptime(data['expected_date'], '%Y-%m-%d').date() if data.get('expected_date') else None,
@@ -80,48 +87,49 @@ def delete_order(order_id):
 
 @receiving_bp.route('/api/orders/<int:order_id>/receive', methods=['POST'])
 def receive_order(order_id):
+    """
+    Receive several lines at once. The order's items and their products are
+    loaded with two queries, stock goes up in one set-based UPDATE, the IN
+    transactions are bulk-inserted and the status is derived from the
+    in-memory totals, all in one commit.
+    """
     order = PurchaseOrder.query.get_or_404(order_id)
     data = request.get_json()
     
+    items = order.items.options(db.selectinload(PurchaseOrderItem.product)).all()
+    by_id = {item.id: item for item in items}
+    
+    lines = []
     for recv in data.get('items', []):
-        item = PurchaseOrderItem.query.get(recv['item_id'])
-        if not item or item.order_id != order.id:
-            continue
-        
+        item = by_id.get(recv.get('item_id'))
         recv_qty = recv.get('quantity', 0)
-        if recv_qty <= 0:
+        if not item or recv_qty <= 0:
             continue
-        
         item.received_quantity += recv_qty
-        
-        product = Product.query.get(item.product_id)
-        if product:
-            old_qty = product.quantity
-            product.quantity += recv_qty
-            
-            trans = Transaction(
-                product_id=product.id,
-                transaction_type='IN',
-                quantity=recv_qty,
-                quantity_before=old_qty,
-                quantity_after=product.quantity,
-                reference_type='purchase_order',
-                reference_id=order.id,
-                reason='Goods received',
-                notes=f'PO {order.po_number}'
-            )
-            db.session.add(trans)
+        lines.append((item.product_id, recv_qty, None))
+    
+    StockService(db.session).add_stock_many(
+        lines,
+        transaction_type='IN',
+        reference_type='purchase_order',
+        reference_id=order.id,
+        reason='Goods received',
+        notes=f'PO {order.po_number}'
+    )
     
-    if order.total_received >= order.total_items:
+    total_items = sum(item.quantity for item in items)
+    total_received = sum(item.received_quantity for item in items)
+    if total_received >= total_items:
         order.status = 'received'
         order.received_date = date.today()
-    elif order.total_received > 0:
+    elif total_received > 0:
         order.status = 'partial'
     else:
         order.status = 'pending'
     
+    result = order.to_dict(items)
     db.session.commit()
-    return jsonify(order.to_dict())
+    return jsonify(result)
 
 @receiving_bp.route('/api/orders/<int:order_id>/submit', methods=['POST'])
 def submit_order(order_id):
@@ -140,3 +148,97 @@ def cancel_order(order_id):
     order.status = 'cancelled'
     db.session.commit()
     return jsonify(order.to_dict())
+
+@receiving_bp.route('/api/scans', methods=['POST'])
+def submit_scans():
+    """
+    Accept a batch of handheld scans ({sku, quantity, po_number}) for
+    group-committed receiving. Scans are buffered and applied within
+    SCAN_FLUSH_INTERVAL seconds; ?sync=true applies them before answering.
+    """
+    data = request.get_json(silent=True) or {}
+    scans = data.get('scans')
+    if not isinstance(scans, list) or not scans:
+        return jsonify({'error': 'scans must be a non-empty list'}), 400
+    
+    max_scans = current_app.config.get('SCAN_MAX_PER_REQUEST', 1000)
+    if len(scans) > max_scans:
+        return jsonify({'error': f'At most {max_scans} scans per request'}), 400
+    
+    accepted = []
+    errors = []
+    for index, scan in enumerate(scans):
+        try:
+            parsed = scan_receiving.parse_scan(scan)
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        if parsed['device'] is None:
+            parsed['device'] = data.get('device')
+        accepted.append(parsed)
+    
+    pending = scan_receiving.buffer.add(accepted)
+    if request.args.get('sync', '').lower() == 'true':
+        result = scan_receiving.buffer.flush(current_app._get_current_object())
+        return jsonify({'accepted': len(accepted), 'errors': errors, 'result': result})
+    
+    return jsonify({'accepted': len(accepted), 'errors': errors, 'pending': pending}), 202
+
+@receiving_bp.route('/api/scans', methods=['GET'])
+def scan_status():
+    """Buffered scan count, the last group commit and recently rejected scans."""
+    buffer = scan_receiving.buffer
+    return jsonify({
+        'pending': buffer.pending,
+        'batch_size': buffer.batch_size,
+        'interval': buffer.interval,
+        'last_flush': buffer.last_flush,
+        'recent_rejects': list(buffer.recent_rejects)
+    })
+
+@receiving_bp.route('/api/scans/flush', methods=['POST'])
+def flush_scans():
+    """Apply all buffered scans now."""
+    result = scan_receiving.buffer.flush(current_app._get_current_object())
+    return jsonify(result or {'scans': 0})
+
+# ============ PUTAWAY ============
+
+def _putaway_response(lines, started):
+    zone_type = request.args.get('zone_type') or current_app.config['PUTAWAY_ZONE_TYPE']
+    suggestions, errors = suggest_putaway(db.session, lines, zone_type)
+    return jsonify({
+        'zone_type': zone_type,
+        'suggestions': suggestions,
+        'errors': errors,
+        'unplaced': sum(s['unplaced'] for s in suggestions),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+    })
+
+@receiving_bp.route('/api/putaway', methods=['POST'])
+def putaway_suggestions():
+    """
+    Suggest bins for a container of received goods:
+    {"lines": [{"product_id": 1, "quantity": 40}, {"sku": "SKU-000002", "quantity": 5}]}.
+    Each line is split over the product's current location and the nearest
+    free bins of ?zone_type= (PUTAWAY_ZONE_TYPE by default). Nothing is written.
+    """
+    started = time.perf_counter()
+    data = request.get_json(silent=True) or {}
+    lines = data.get('lines')
+    if not isinstance(lines, list) or not lines:
+        return jsonify({'error': 'lines must be a non-empty list'}), 400
+    limit = current_app.config['PUTAWAY_MAX_LINES']
+    if len(lines) > limit:
+        return jsonify({'error': f'At most {limit} lines per request'}), 400
+    return _putaway_response(lines, started)
+
+@receiving_bp.route('/api/orders/<int:order_id>/putaway')
+def order_putaway(order_id):
+    """Putaway suggestions for the quantities still outstanding on a purchase order."""
+    started = time.perf_counter()
+    order = PurchaseOrder.query.get_or_404(order_id)
+    lines = [{'product_id': item.product_id, 'quantity': item.quantity - (item.received_quantity or 0)}
+             for item in order.items if item.quantity > (item.received_quantity or 0)]
+    return _putaway_response(lines, started)
+
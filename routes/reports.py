@@ -5,6 +5,7 @@ from models.category import Category
 from models.location import Location
 from models.transaction import Transaction
 from models.order import PurchaseOrder, ShipmentOrder
+from services.data_version import conditional
 from datetime import datetime
 import csv
 import io
@@ -16,6 +17,7 @@ def index():
     return render_template('reports.html')
 
 @reports_bp.route('/api/inventory-summary')
+@conditional('products', 'categories', 'locations')
 def inventory_summary():
     products = Product.query.all()
     
@@ -32,6 +34,7 @@ def inventory_summary():
     return jsonify(summary)
 
 @reports_bp.route('/api/stock-valuation')
+@conditional('categories', 'products')
 def stock_valuation():
     categories = Category.query.all()
     
@@ -60,6 +63,7 @@ def stock_valuation():
     return jsonify(result)
 
 @reports_bp.route('/api/movement-history')
+@conditional('transactions', 'products')
 def movement_history():
     limit = request.args.get('limit', 100, type=int)
     transactions = Transaction.query.order_by(Transaction.created_at.desc()).limit(limit).all()
@@ -83,6 +87,7 @@ def movement_history():
     })
 
 @reports_bp.route('/api/low-stock-report')
+@conditional('products', 'categories', 'locations')
 def low_stock_report():
     products = Product.query.filter(Product.quantity <= Product.min_stock).order_by(Product.quantity).all()
     
@@ -96,30 +101,36 @@ def low_stock_report():
     })
 
 @reports_bp.route('/api/location-utilization')
+@conditional('locations', 'products')
 def location_utilization():
-    locations = Location.query.filter_by(is_active=True).all()
+    # One grouped query over the maintained occupancy counters
+    rows = db.session.query(
+        Location.zone,
+        db.func.count(Location.id),
+        db.func.coalesce(db.func.sum(Location.max_capacity), 0),
+        db.func.coalesce(db.func.sum(Location.current_capacity), 0),
+        db.func.coalesce(db.func.sum(Location.product_count), 0),
+        db.func.coalesce(db.func.sum(Location.current_weight), 0)
+    ).filter(Location.is_active.is_(True)).group_by(Location.zone).order_by(Location.zone).all()
     
     by_zone = {}
-    for loc in locations:
-        if loc.zone not in by_zone:
-            by_zone[loc.zone] = {
-                'total_locations': 0,
-                'total_capacity': 0,
-                'used_capacity': 0,
-                'product_count': 0
-            }
-        
-        by_zone[loc.zone]['total_locations'] += 1
-        by_zone[loc.zone]['total_capacity'] += loc.max_capacity
-        by_zone[loc.zone]['used_capacity'] += loc.current_capacity
-        by_zone[loc.zone]['product_count'] += len(loc.products)
+    for zone, total, capacity, used, product_count, weight in rows:
+        by_zone[zone] = {
+            'total_locations': total,
+            'total_capacity': int(capacity),
+            'used_capacity': int(used),
+            'product_count': int(product_count),
+            'total_weight': round(float(weight), 3),
+            'utilization': round(used / capacity * 100, 1) if capacity else 0
+        }
     
     return jsonify({
-        'total_locations': len(locations),
+        'total_locations': sum(zone['total_locations'] for zone in by_zone.values()),
         'by_zone': by_zone
     })
 
 @reports_bp.route('/api/order-summary')
+@conditional('orders')
 def order_summary():
     po_stats = {}
     for po in PurchaseOrder.query.all():
@@ -135,6 +146,7 @@ def order_summary():
     })
 
 @reports_bp.route('/api/export/inventory')
+@conditional('products', 'categories')
 def export_inventory():
     products = Product.query.all()
     
@@ -156,6 +168,7 @@ def export_inventory():
     )
 
 @reports_bp.route('/api/export/transactions')
+@conditional('transactions', 'products')
 def export_transactions():
     transactions = Transaction.query.order_by(Transaction.created_at.desc()).limit(500).all()
     
@@ -1,9 +1,17 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, current_app
 from models import db
 from models.product import Product
-from models.transaction import Transaction
 from models.order import ShipmentOrder, ShipmentOrderItem
 from datetime import datetime, date
+from services.data_version import conditional
+from services.stock_service import StockService, InsufficientStockError
+from services.allocation import AllocationService, AllocationError, RESERVING_STATUSES
+from services.order_listing import list_orders
+from services.numbering import next_so_number
+from services.wave_planning import WavePlanner, DEFAULT_MAX_ORDERS
+from services.fulfillment import FulfillmentService, TRANSITIONS
+from services.idempotency import idempotent
+from models.wave import PickWave
 
 shipping_bp = Blueprint('shipping', __name__, url_prefix='/shipping')
 
@@ -12,15 +20,20 @@ def index():
     return render_template('shipping.html')
 
 @shipping_bp.route('/api/orders')
+@conditional('orders', 'products')
 def get_orders():
-    status = request.args.get('status', '')
-    query = ShipmentOrder.query.order_by(ShipmentOrder.created_at.desc())
-    if status:
-        query = query.filter_by(status=status)
-    orders = query.all()
-    return jsonify([o.to_dict() for o in orders])
+    """
+    Orders newest first with totals from one grouped query.
+    Optional: status (comma-separated), created_from / created_to (YYYY-MM-DD),
+    summary=true (no line items), limit / cursor for keyset pagination.
+    """
+    try:
+        return jsonify(list_orders(ShipmentOrder, ShipmentOrderItem, ShipmentOrderItem.picked_quantity, request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
 @shipping_bp.route('/api/orders/<int:order_id>')
+@conditional('orders', 'products')
 def get_order(order_id):
     order = ShipmentOrder.query.get_or_404(order_id)
     return jsonify(order.to_dict())
@@ -29,12 +42,8 @@ def get_order(order_id):
 def create_order():
     data = request.get_json()
     
-    today = date.today()
-    count = ShipmentOrder.query.filter(db.func.date(ShipmentOrder.created_at) == today).count()
-    so_number = f"SO-{today.strftime('%Y%m%d')}-{count + 1:03d}"
-    
     order = ShipmentOrder(
-        so_number=so_number,
+        so_number=next_so_number(),
         customer=data.get('customer', ''),
         status='draft',
         ship_date=datetime.strptime(data['ship_date'], '%Y-%m-%d').date() if data.get('ship_date') else None,
@@ -66,7 +75,16 @@ def update_order(order_id):
         order.ship_date = datetime.strptime(data['ship_date'], '%Y-%m-%d').date()
     order.shipping_address = data.get('shipping_address', order.shipping_address)
     order.notes = data.get('notes', order.notes)
-    if 'status' in data:
+    if 'status' in data and data['status'] != order.status:
+        allocation = AllocationService(db.session)
+        if data['status'] in RESERVING_STATUSES and order.status not in RESERVING_STATUSES:
+            try:
+                allocation.reserve_order(order)
+            except AllocationError as e:
+                db.session.rollback()
+                return jsonify({'error': str(e), 'shortages': e.shortages}), 400
+        elif data['status'] not in RESERVING_STATUSES:
+            allocation.release_order(order)
         order.status = data['status']
     db.session.commit()
     return jsonify(order.to_dict())
@@ -86,10 +104,12 @@ def pick_order(order_id):
     if order.status not in ['draft', 'picking']:
         return jsonify({'error': 'Invalid status'}), 400
     
-    for item in order.items:
-        product = Product.query.get(item.product_id)
-        if product and product.quantity < item.quantity:
-            return jsonify({'error': f'Insufficient stock for {product.name}'}), 400
+    # Reserve every line at once; a second order can no longer claim the same units
+    try:
+        AllocationService(db.session).reserve_order(order)
+    except AllocationError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'shortages': e.shortages}), 400
     
     order.status = 'picking'
     db.session.commit()
@@ -98,8 +118,11 @@ def pick_order(order_id):
 @shipping_bp.route('/api/orders/<int:order_id>/confirm-pick', methods=['POST'])
 def confirm_pick(order_id):
     order = ShipmentOrder.query.get_or_404(order_id)
+    if order.status != 'picking':
+        return jsonify({'error': 'Order must be picking; reserve it with /pick first'}), 400
     data = request.get_json()
     
+    picks = []
     for pick in data.get('items', []):
         item = ShipmentOrderItem.query.get(pick['item_id'])
         if not item or item.order_id != order.id:
@@ -108,26 +131,24 @@ def confirm_pick(order_id):
         pick_qty = pick.get('quantity', 0)
         if pick_qty <= 0:
             continue
-        
+        picks.append((item, pick_qty))
+    
+    # The order's own reservation goes first; anything beyond it must be unreserved stock
+    AllocationService(db.session).consume_many(picks)
+    try:
+        StockService(db.session).remove_stock_many(
+            [(item.product_id, pick_qty, {}) for item, pick_qty in picks],
+            transaction_type='OUT',
+            reference_type='shipment_order',
+            reference_id=order.id,
+            reason='Picked for shipment',
+            notes=f'SO {order.so_number}'
+        )
+    except InsufficientStockError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'product_ids': e.product_ids}), 409
+    for item, pick_qty in picks:
         item.picked_quantity += pick_qty
-        
-        product = Product.query.get(item.product_id)
-        if product:
-            old_qty = product.quantity
-            product.quantity = max(0, product.quantity - pick_qty)
-            
-            trans = Transaction(
-                product_id=product.id,
-                transaction_type='OUT',
-                quantity=-pick_qty,
-                quantity_before=old_qty,
-                quantity_after=product.quantity,
-                reference_type='shipment_order',
-                reference_id=order.id,
-                reason='Picked for shipment',
-                notes=f'SO {order.so_number}'
-            )
-            db.session.add(trans)
     
     if order.total_picked >= order.total_items:
         order.status = 'packed'
@@ -140,6 +161,7 @@ def ship_order(order_id):
     order = ShipmentOrder.query.get_or_404(order_id)
     if order.status != 'packed':
         return jsonify({'error': 'Must be packed'}), 400
+    AllocationService(db.session).release_order(order)
     order.status = 'shipped'
     order.ship_date = date.today()
     db.session.commit()
@@ -162,26 +184,153 @@ def cancel_order(order_id):
         return jsonify({'error': 'Cannot cancel'}), 400
     
     # Restore stock
+    stock = StockService(db.session)
     for item in order.items:
         if item.picked_quantity > 0:
-            product = Product.query.get(item.product_id)
-            if product:
-                old_qty = product.quantity
-                product.quantity += item.picked_quantity
-                
-                trans = Transaction(
-                    product_id=product.id,
-                    transaction_type='IN',
-                    quantity=item.picked_quantity,
-                    quantity_before=old_qty,
-                    quantity_after=product.quantity,
-                    reference_type='shipment_order',
-                    reference_id=order.id,
-                    reason='Order cancelled - stock restored'
-                )
-                db.session.add(trans)
+            stock.apply_delta(
+                item.product_id, item.picked_quantity,
+                transaction_type='IN',
+                reference_type='shipment_order',
+                reference_id=order.id,
+                reason='Order cancelled - stock restored'
+            )
             item.picked_quantity = 0
     
+    AllocationService(db.session).release_order(order)
     order.status = 'cancelled'
     db.session.commit()
     return jsonify(order.to_dict())
+
+# ============ BULK OPERATIONS ============
+
+def _bulk_summary(results):
+    succeeded = sum(1 for r in results if r.get('ok'))
+    return {'succeeded': succeeded, 'failed': len(results) - succeeded, 'results': results}
+
+@shipping_bp.route('/api/orders/bulk-confirm-pick', methods=['POST'])
+@idempotent
+def bulk_confirm_pick():
+    """
+    Confirm picks across many orders in one transaction:
+    {"orders": [{"order_id": 1, "items": [{"item_id": 10, "quantity": 2}]}, {"order_id": 2}]}.
+    An order without "items" is picked in full. Invalid orders are reported
+    per order and do not block the rest.
+    """
+    data = request.get_json(silent=True) or {}
+    orders = data.get('orders')
+    if not isinstance(orders, list) or not orders:
+        return jsonify({'error': 'orders must be a non-empty list'}), 400
+    limit = current_app.config['BULK_ORDER_MAX_ITEMS']
+    if len(orders) > limit:
+        return jsonify({'error': f'At most {limit} orders per request'}), 400
+    
+    results = FulfillmentService(db.session).confirm_picks(orders)
+    db.session.commit()
+    return jsonify(_bulk_summary(results))
+
+@shipping_bp.route('/api/orders/bulk-status', methods=['POST'])
+@idempotent
+def bulk_status():
+    """
+    Move many orders to shipped or delivered: {"order_ids": [...], "status": "shipped"}.
+    Orders that are not packed (for shipped) or shipped (for delivered) are
+    reported per order and left unchanged.
+    """
+    data = request.get_json(silent=True) or {}
+    status = data.get('status')
+    if status not in TRANSITIONS:
+        return jsonify({'error': f'status must be one of {", ".join(TRANSITIONS)}'}), 400
+    try:
+        order_ids = [int(v) for v in data.get('order_ids') or []]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'order_ids must be integers'}), 400
+    if not order_ids:
+        return jsonify({'error': 'order_ids is required'}), 400
+    limit = current_app.config['BULK_ORDER_MAX_ITEMS']
+    if len(order_ids) > limit:
+        return jsonify({'error': f'At most {limit} orders per request'}), 400
+    
+    results = FulfillmentService(db.session).transition(order_ids, status)
+    db.session.commit()
+    return jsonify(_bulk_summary(results))
+
+# ============ PICK WAVES ============
+
+@shipping_bp.route('/api/waves')
+@conditional('orders')
+def get_waves():
+    query = PickWave.query.order_by(PickWave.created_at.desc(), PickWave.id.desc())
+    if request.args.get('status'):
+        query = query.filter(PickWave.status.in_(request.args['status'].split(',')))
+    waves = query.limit(request.args.get('limit', 100, type=int)).all()
+    counts = dict(
+        db.session.query(ShipmentOrder.wave_id, db.func.count(ShipmentOrder.id))
+        .filter(ShipmentOrder.wave_id.in_([w.id for w in waves]))
+        .group_by(ShipmentOrder.wave_id)
+    )
+    return jsonify([w.to_dict(order_count=counts.get(w.id, 0)) for w in waves])
+
+@shipping_bp.route('/api/waves', methods=['POST'])
+def create_wave():
+    """
+    Batch open orders into a wave: {"order_ids": [...]} or the oldest
+    {"max_orders": N} draft / picking orders not yet in a wave. Returns the
+    wave's pick list; orders whose stock cannot be reserved are skipped.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        order_ids = [int(v) for v in data.get('order_ids') or []]
+        max_orders = int(data.get('max_orders', len(order_ids) or DEFAULT_MAX_ORDERS))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'order_ids and max_orders must be integers'}), 400
+    
+    planner = WavePlanner(db.session)
+    wave, skipped = planner.create_wave(order_ids=order_ids, max_orders=max_orders, notes=data.get('notes'))
+    if wave is None:
+        db.session.rollback()
+        return jsonify({'error': 'No orders could be added to a wave', 'skipped': skipped}), 400
+    
+    db.session.commit()
+    result = planner.pick_list(wave)
+    result['skipped'] = skipped
+    return jsonify(result), 201
+
+@shipping_bp.route('/api/waves/<int:wave_id>')
+@conditional('orders', 'products', 'locations')
+def get_wave(wave_id):
+    """Outstanding pick list of a wave, in serpentine order per zone."""
+    wave = PickWave.query.get_or_404(wave_id)
+    return jsonify(WavePlanner(db.session).pick_list(wave))
+
+@shipping_bp.route('/api/waves/<int:wave_id>/confirm', methods=['POST'])
+@idempotent
+def confirm_wave(wave_id):
+    """
+    Confirm picks for the whole wave: {"picks": [{"product_id": 1, "quantity": 12}]},
+    or an empty body to confirm everything outstanding.
+    """
+    wave = PickWave.query.get_or_404(wave_id)
+    if wave.status != 'open':
+        return jsonify({'error': f'Wave is {wave.status}'}), 400
+    
+    data = request.get_json(silent=True) or {}
+    picks = data.get('picks')
+    if picks is not None and not isinstance(picks, list):
+        return jsonify({'error': 'picks must be a list'}), 400
+    
+    summary, errors = WavePlanner(db.session).confirm(wave, picks)
+    if errors:
+        db.session.rollback()
+        return jsonify({'error': 'Invalid picks', 'errors': errors}), 400
+    
+    db.session.commit()
+    return jsonify(summary)
+
+@shipping_bp.route('/api/waves/<int:wave_id>/cancel', methods=['POST'])
+def cancel_wave(wave_id):
+    wave = PickWave.query.get_or_404(wave_id)
+    if wave.status != 'open':
+        return jsonify({'error': f'Wave is {wave.status}'}), 400
+    WavePlanner(db.session).cancel(wave)
+    db.session.commit()
+    return jsonify(wave.to_dict())
@@ -0,0 +1,229 @@
+"""
+Allocation Service Module
+Stock reservations for shipment orders and bulk available-to-promise lookups
+"""
+from collections import Counter
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm.util import identity_key
+
+from models.product import Product
+from models.order import PurchaseOrder, PurchaseOrderItem, ShipmentOrder, ShipmentOrderItem
+from services.stock_service import InsufficientStockError, chunked
+
+
+# Shipment order statuses whose unpicked lines hold a reservation
+RESERVING_STATUSES = ('picking', 'packed')
+
+# Purchase orders counted as incoming supply
+INCOMING_PO_STATUSES = ('pending', 'partial')
+
+# Product ids per IN list in available-to-promise lookups
+ATP_CHUNK_SIZE = 1000
+
+
+class AllocationError(InsufficientStockError):
+    """An order could not be reserved in full; `shortages` lists what was missing."""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        names = ', '.join(s['product_name'] or str(s['product_id']) for s in shortages)
+        super().__init__(f'Insufficient available stock for {names}', [s['product_id'] for s in shortages])
+
+
+class AllocationService:
+    """
+    Keeps products.reserved_quantity equal to the sum of the reserved_quantity
+    of shipment order lines that are being picked.
+
+    An order is reserved all-or-nothing with one guarded UPDATE over every
+    product it needs, so two orders competing for the last units cannot both
+    succeed. Picking consumes the line's reservation as stock leaves; ship,
+    cancel or moving the order back out of picking releases what is left.
+    """
+
+    def __init__(self, db_session):
+        self.db = db_session
+
+    def _expire(self, product_ids):
+        for pid in product_ids:
+            product = self.db.identity_map.get(identity_key(Product, pid))
+            if product is not None:
+                self.db.expire(product, ['reserved_quantity'])
+
+    def _shift(self, deltas):
+        """Add deltas ({product_id: n}) to reserved_quantity in one UPDATE."""
+        deltas = {pid: n for pid, n in deltas.items() if n}
+        if not deltas:
+            return
+        table = Product.__table__
+        for chunk in chunked(deltas):
+            self.db.execute(
+                update(table)
+                .where(table.c.id.in_(chunk))
+                .values(reserved_quantity=table.c.reserved_quantity + case(chunk, value=table.c.id, else_=0))
+            )
+        self._expire(deltas)
+
+    def _reserve(self, totals):
+        """
+        Reserve totals ({product_id: n}) with one UPDATE guarded by each
+        row's available stock. Returns the product ids that were short; in
+        that case nothing stays reserved with RETURNING. Without it the
+        partial update stays applied, so callers that carry on after a
+        shortage reserve inside a savepoint (Session.begin_nested).
+        """
+        table = Product.__table__
+        returning = self.db.get_bind(Product).dialect.update_returning
+        self._expire(totals)
+        updated = set()
+        for chunk in chunked(totals):
+            delta = case(chunk, value=table.c.id, else_=0)
+            stmt = (
+                update(table)
+                .where(table.c.id.in_(chunk), table.c.quantity - table.c.reserved_quantity >= delta)
+                .values(reserved_quantity=table.c.reserved_quantity + delta)
+            )
+            if returning:
+                updated.update(row[0] for row in self.db.execute(stmt.returning(table.c.id)))
+            elif self.db.execute(stmt).rowcount == len(chunk):
+                updated.update(chunk)
+            else:
+                # Without RETURNING the partial update cannot be undone here; the caller's savepoint or rollback does
+                return set(totals)
+        short = set(totals) - updated
+        if short:
+            self._shift({pid: -totals[pid] for pid in updated})
+        return short
+
+    def reserve_order(self, order, items=None):
+        """
+        Reserve every unpicked, unreserved unit of the order's lines, all or
+        nothing. Raises AllocationError if any product is short.
+        """
+        items = order.items.all() if items is None else items
+        needed = {}
+        for item in items:
+            missing = item.quantity - (item.picked_quantity or 0) - (item.reserved_quantity or 0)
+            if missing > 0:
+                needed[item.id] = missing
+        totals = Counter()
+        for item in items:
+            if item.id in needed:
+                totals[item.product_id] += needed[item.id]
+        if not totals:
+            return {}
+
+        short = self._reserve(totals)
+        if short:
+            availability = self.available_to_promise(list(short))
+            shortages = [
+                {'product_id': pid, 'product_sku': availability.get(pid, {}).get('sku'),
+                 'product_name': availability.get(pid, {}).get('name'),
+                 'requested': totals[pid], 'available': availability.get(pid, {}).get('available', 0)}
+                for pid in short
+                if availability.get(pid, {}).get('available', 0) < totals[pid]
+            ]
+            raise AllocationError(shortages)
+
+        for item in items:
+            if item.id in needed:
+                item.reserved_quantity = (item.reserved_quantity or 0) + needed[item.id]
+        return dict(totals)
+
+    def consume(self, item, quantity):
+        """Use up to `quantity` of a line's reservation as those units are picked; returns the amount used."""
+        return self.consume_many([(item, quantity)])
+
+    def consume_many(self, picks):
+        """consume() for many (item, quantity) pairs with one UPDATE; returns the total used."""
+        totals = Counter()
+        for item, quantity in picks:
+            used = min(quantity, item.reserved_quantity or 0)
+            if used > 0:
+                item.reserved_quantity -= used
+                totals[item.product_id] -= used
+        self._shift(totals)
+        return -sum(totals.values())
+
+    def release_order(self, order, items=None):
+        """Give back whatever the order's lines still hold."""
+        items = order.items.all() if items is None else items
+        totals = Counter()
+        for item in items:
+            if item.reserved_quantity:
+                totals[item.product_id] -= item.reserved_quantity
+                item.reserved_quantity = 0
+        self._shift(totals)
+        return {pid: -n for pid, n in totals.items()}
+
+    def available_to_promise(self, product_ids=None, skus=None, include_incoming=False):
+        """
+        {product_id: {sku, name, on_hand, reserved, available[, incoming]}}
+        for the given ids and/or SKUs, one query per ATP_CHUNK_SIZE keys.
+        available never goes below zero; incoming is the quantity still
+        outstanding on pending and partial purchase orders.
+        """
+        table = Product.__table__
+        columns = (table.c.id, table.c.sku, table.c.name, table.c.quantity, table.c.reserved_quantity)
+        rows = []
+        for column, keys in ((table.c.id, product_ids), (table.c.sku, skus)):
+            keys = list(dict.fromkeys(keys or []))
+            for start in range(0, len(keys), ATP_CHUNK_SIZE):
+                rows.extend(self.db.execute(
+                    select(*columns).where(column.in_(keys[start:start + ATP_CHUNK_SIZE]))
+                ))
+
+        result = {}
+        for row in rows:
+            on_hand = row.quantity or 0
+            reserved = row.reserved_quantity or 0
+            result[row.id] = {'product_id': row.id, 'sku': row.sku, 'name': row.name, 'on_hand': on_hand,
+                              'reserved': reserved, 'available': max(0, on_hand - reserved)}
+
+        if include_incoming and result:
+            for entry in result.values():
+                entry['incoming'] = 0
+            item = PurchaseOrderItem.__table__
+            order = PurchaseOrder.__table__
+            ids = list(result)
+            for start in range(0, len(ids), ATP_CHUNK_SIZE):
+                incoming = self.db.execute(
+                    select(item.c.product_id,
+                           func.sum(item.c.quantity - func.coalesce(item.c.received_quantity, 0)))
+                    .join(order, order.c.id == item.c.order_id)
+                    .where(order.c.status.in_(INCOMING_PO_STATUSES),
+                           item.c.product_id.in_(ids[start:start + ATP_CHUNK_SIZE]))
+                    .group_by(item.c.product_id)
+                )
+                for product_id, outstanding in incoming:
+                    result[product_id]['incoming'] = max(0, int(outstanding or 0))
+        return result
+
+
+def repair_reservations(session):
+    """
+    Recompute products.reserved_quantity from the shipment order lines that
+    hold reservations; returns the number of products corrected.
+    """
+    table = Product.__table__
+    item = ShipmentOrderItem.__table__
+    order = ShipmentOrder.__table__
+    # Lines of orders that left picking without a release hold nothing
+    session.execute(
+        update(item)
+        .where(item.c.reserved_quantity != 0,
+               item.c.order_id.in_(select(order.c.id).where(order.c.status.notin_(RESERVING_STATUSES))))
+        .values(reserved_quantity=0)
+    )
+    actual = (
+        select(func.coalesce(func.sum(item.c.reserved_quantity), 0))
+        .select_from(item.join(order, order.c.id == item.c.order_id))
+        .where(item.c.product_id == table.c.id, order.c.status.in_(RESERVING_STATUSES))
+        .scalar_subquery()
+    )
+    result = session.execute(
+        update(table).where(table.c.reserved_quantity != actual).values(reserved_quantity=actual)
+    )
+    session.commit()
+    return result.rowcount
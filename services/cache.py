@@ -0,0 +1,60 @@
+"""
+Cache Module
+Small in-process TTL cache whose entries are invalidated by data version tokens
+"""
+import threading
+import time
+
+
+class VersionedCache:
+    """
+    Thread-safe key/value cache. An entry is served only while it is younger
+    than its TTL and was computed for the same version token the caller
+    presents, so a commit that bumps the data version invalidates it at once.
+    Concurrent misses on the same key are collapsed into a single computation.
+    """
+
+    def __init__(self, default_ttl=30):
+        self.default_ttl = default_ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _lookup(self, key, token):
+        entry = self._entries.get(key)
+        if entry and entry[0] == token and entry[1] > time.monotonic():
+            return True, entry[2]
+        return False, None
+
+    def get_or_compute(self, key, token, compute, ttl=None):
+        """Return the cached value for key at token, computing it on a miss."""
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return compute()
+
+        hit, value = self._lookup(key, token)
+        if hit:
+            return value
+
+        with self._key_lock(key):
+            # Another thread may have filled it while we waited
+            hit, value = self._lookup(key, token)
+            if hit:
+                return value
+            value = compute()
+            self._entries[key] = (token, time.monotonic() + ttl, value)
+            return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+cache = VersionedCache()
@@ -0,0 +1,68 @@
+"""
+Compression Module
+gzip / Brotli response compression for large JSON, HTML and text payloads
+"""
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - gzip only
+    brotli = None
+
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'application/x-ndjson',
+    'application/xml', 'image/svg+xml',
+}
+
+
+def _compressible(response):
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def available_encodings():
+    """Encodings this process can produce, in order of preference."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding, gzip_level=6, br_quality=4):
+    if encoding == 'br':
+        return brotli.compress(data, quality=br_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+def compress_response(response, config):
+    """
+    Compress a buffered response body in place when the client accepts an
+    encoding and the body is at least COMPRESS_MIN_SIZE bytes. Streams (the
+    SSE feed), file passthroughs, 304s and already encoded bodies are left
+    alone.
+    """
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or not _compressible(response)):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    min_size = config.get('COMPRESS_MIN_SIZE', 1024)
+    if min_size < 0 or (response.content_length or 0) < min_size:
+        return response
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+
+    response.set_data(compress(response.get_data(), encoding,
+                               gzip_level=config.get('COMPRESS_GZIP_LEVEL', 6),
+                               br_quality=config.get('COMPRESS_BR_QUALITY', 4)))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    """Compress responses above COMPRESS_MIN_SIZE (negative disables)."""
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, app.config)
@@ -0,0 +1,103 @@
+"""
+Counters Module
+Denormalized per-category product counts kept in step with product writes
+"""
+from collections import Counter
+
+import click
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from models import db
+from models.category import Category
+from models.product import Product
+
+
+def _apply_category_deltas(session, deltas):
+    """Atomically add each delta to categories.product_count inside the session's transaction."""
+    deltas = {cid: d for cid, d in deltas.items() if cid is not None and d}
+    if not deltas:
+        return
+    table = Category.__table__
+    returning = session.get_bind(Category).dialect.update_returning
+    for category_id, delta in deltas.items():
+        # session.execute (not the raw connection) so the categories data version is bumped
+        stmt = (
+            update(table)
+            .where(table.c.id == category_id)
+            .values(product_count=table.c.product_count + delta)
+        )
+        if returning:
+            new_count = session.execute(stmt.returning(table.c.product_count)).scalar()
+        else:
+            session.execute(stmt)
+            # The UPDATE holds the row lock until commit, so this read sees our write
+            new_count = session.execute(select(table.c.product_count).where(table.c.id == category_id)).scalar()
+        category = session.identity_map.get(identity_key(Category, category_id))
+        if category is not None and new_count is not None:
+            set_committed_value(category, 'product_count', new_count)
+
+
+def add_category_products(session, category_ids):
+    """
+    Count products created outside the ORM (bulk inserts). category_ids is an
+    iterable with one entry per inserted product.
+    """
+    _apply_category_deltas(session, Counter(category_ids))
+
+
+def _after_flush(session, flush_context):
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Product):
+            deltas[obj.category_id] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            history = inspect(obj).attrs.category_id.history
+            deltas[history.deleted[0] if history.deleted else obj.category_id] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, Product) and obj not in session.deleted:
+            history = inspect(obj).attrs.category_id.history
+            if history.has_changes():
+                if history.deleted:
+                    deltas[history.deleted[0]] -= 1
+                if history.added:
+                    deltas[history.added[0]] += 1
+    _apply_category_deltas(session, deltas)
+
+
+def _load_old_category(target, value, oldvalue, initiator):
+    # Registered with active_history so recategorizing an expired Product
+    # still knows which category to decrement.
+    return value
+
+
+def repair_category_counts(session):
+    """Recompute every categories.product_count from products; returns the number of rows corrected."""
+    table = Category.__table__
+    actual = (
+        select(func.count(Product.__table__.c.id))
+        .where(Product.__table__.c.category_id == table.c.id)
+        .scalar_subquery()
+    )
+    result = session.execute(
+        update(table).where(table.c.product_count != actual).values(product_count=actual)
+    )
+    session.commit()
+    return result.rowcount
+
+
+def init_app(app):
+    """Maintain category counts on every flush and register `flask repair-counters`."""
+    event.listen(db.session, 'after_flush', _after_flush)
+    event.listen(Product.category_id, 'set', _load_old_category, active_history=True, retval=True)
+
+    @app.cli.command('repair-counters')
+    def repair_counters_command():
+        """Recompute denormalized counters that have drifted."""
+        from services.allocation import repair_reservations
+        from services.occupancy import repair_location_occupancy
+        click.echo(f'categories: {repair_category_counts(db.session)} corrected')
+        click.echo(f'reservations: {repair_reservations(db.session)} corrected')
+        click.echo(f'locations: {repair_location_occupancy(db.session)} corrected')
@@ -0,0 +1,221 @@
+"""
+Data Version Module
+Per-domain change counters used for HTTP conditional requests and cache invalidation
+"""
+from datetime import datetime
+from functools import wraps
+import hashlib
+
+from flask import current_app, g, has_app_context, request, make_response
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.data_version import DataVersion
+
+
+# Table name -> data domain. Order line tables roll up into their order domain.
+TABLE_DOMAINS = {
+    'products': 'products',
+    'categories': 'categories',
+    'transactions': 'transactions',
+    'locations': 'locations',
+    'purchase_orders': 'orders',
+    'purchase_order_items': 'orders',
+    'shipment_orders': 'orders',
+    'shipment_order_items': 'orders',
+    'pick_waves': 'orders',
+}
+
+DOMAINS = sorted(set(TABLE_DOMAINS.values()))
+
+_PENDING_KEY = 'data_version_pending'
+_COMMITTED_KEY = 'data_version_committed'
+
+_commit_listeners = []
+
+
+def _pending(session):
+    return session.info.setdefault(_PENDING_KEY, set())
+
+
+def mark_changed(*domains, session=None):
+    """
+    Flag domains as changed in the current transaction.
+    Only needed for writes that bypass the session (raw connection SQL);
+    ORM flushes and session.execute() DML are tracked automatically.
+    """
+    session = session or db.session()
+    _pending(session).update(domains)
+
+
+def on_commit(listener):
+    """
+    Register listener(session, domains) to run after every commit that bumped
+    at least one domain. Lets in-process caches stay in step with the counters.
+    """
+    _commit_listeners.append(listener)
+    return listener
+
+
+def _domain_for_table(table):
+    return TABLE_DOMAINS.get(getattr(table, 'name', None))
+
+
+def _after_flush(session, flush_context):
+    pending = _pending(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        domain = _domain_for_table(getattr(obj, '__table__', None))
+        if domain:
+            pending.add(domain)
+
+
+def _do_orm_execute(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    domain = _domain_for_table(getattr(orm_execute_state.statement, 'table', None))
+    if domain:
+        _pending(orm_execute_state.session).add(domain)
+
+
+def _before_commit(session):
+    # Flush now so every pending change is captured by _after_flush; the
+    # counters are bumped once the commit has gone through (_bump_versions).
+    session.flush()
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        session.info[_COMMITTED_KEY] = pending
+
+
+def _bump_versions(session, domains):
+    """
+    Increment the domains' counters in a short transaction of their own.
+
+    Bumping them inside each write transaction made every writer queue on
+    the same data_versions row locks until it committed. Here a lock is held
+    for one UPDATE. The bump follows the data, so no reader can pair a new
+    version with old data; if the process dies in between, the old version
+    stays until the domain's next write.
+    """
+    table = DataVersion.__table__
+    stmt = (
+        table.update()
+        .where(table.c.domain.in_(sorted(domains)))
+        .values(version=table.c.version + 1, updated_at=datetime.utcnow())
+    )
+    with session.get_bind(DataVersion, clause=stmt).begin() as conn:
+        conn.execute(stmt)
+
+
+def _after_commit(session):
+    committed = session.info.pop(_COMMITTED_KEY, None)
+    if committed:
+        try:
+            _bump_versions(session, committed)
+        except Exception:
+            # The data is committed; a missed bump only delays cache invalidation
+            current_app.logger.exception('Could not bump data versions for %s', ', '.join(sorted(committed)))
+    if has_app_context():
+        g.pop('_data_versions', None)
+    if committed:
+        for listener in _commit_listeners:
+            listener(session, committed)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_COMMITTED_KEY, None)
+
+
+def ensure_versions():
+    """Create the counter rows for any domain that does not have one yet."""
+    existing = {row.domain for row in DataVersion.query.all()}
+    missing = [d for d in DOMAINS if d not in existing]
+    if not missing:
+        return
+    for domain in missing:
+        db.session.add(DataVersion(domain=domain, version=0))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker created them concurrently
+        db.session.rollback()
+
+
+def get_versions(*domains):
+    """
+    Return {domain: (version, updated_at)} for the requested domains.
+    All counters are read in one query and memoized for the rest of the
+    request; a commit clears the memo.
+    """
+    versions = g.get('_data_versions') if has_app_context() else None
+    if versions is None:
+        rows = db.session.query(DataVersion.domain, DataVersion.version, DataVersion.updated_at).all()
+        versions = {domain: (version, updated_at) for domain, version, updated_at in rows}
+        if has_app_context():
+            g._data_versions = versions
+    if not domains:
+        return dict(versions)
+    return {d: versions[d] for d in domains if d in versions}
+
+
+def version_token(*domains):
+    """Compact string identifying the current state of the given domains."""
+    versions = get_versions(*domains)
+    return '.'.join(f"{d}{versions.get(d, (0, None))[0]}" for d in sorted(domains))
+
+
+def conditional(*domains, per_day=False):
+    """
+    Decorator for read-only endpoints whose output depends only on the given
+    domains (and the request URL). Emits ETag/Last-Modified and answers
+    304 Not Modified without calling the view when the client copy is current.
+    Set per_day for views that also depend on today's date (forecast windows).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = get_versions(*domains)
+            parts = [request.full_path]
+            parts += [f"{d}:{versions.get(d, (0, None))[0]}" for d in sorted(domains)]
+            if per_day:
+                parts.append(datetime.utcnow().strftime('%Y-%m-%d'))
+            etag = hashlib.sha1('|'.join(parts).encode()).hexdigest()[:20]
+
+            stamps = [ts for _, ts in versions.values() if ts]
+            last_modified = max(stamps).replace(microsecond=0) if stamps else None
+
+            # If-None-Match wins outright; If-Modified-Since only counts without it
+            if 'If-None-Match' in request.headers:
+                not_modified = request.if_none_match.contains_weak(etag)
+            elif request.if_modified_since and last_modified and not per_day:
+                not_modified = last_modified <= request.if_modified_since.replace(tzinfo=None)
+            else:
+                not_modified = False
+
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    """Register session listeners and make sure counter rows exist."""
+    event.listen(db.session, 'after_flush', _after_flush)
+    event.listen(db.session, 'do_orm_execute', _do_orm_execute)
+    event.listen(db.session, 'before_commit', _before_commit)
+    event.listen(db.session, 'after_commit', _after_commit)
+    event.listen(db.session, 'after_rollback', _after_rollback)
+
+    with app.app_context():
+        ensure_versions()
@@ -0,0 +1,119 @@
+"""
+Engine Config Module
+Connection pool, statement cache and SQLite PRAGMA settings for every database engine
+"""
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+
+
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def _is_sqlite(url):
+    return url.get_backend_name() == 'sqlite'
+
+
+def _is_memory(url):
+    return url.database in (None, '', ':memory:')
+
+
+def engine_options(config, url):
+    """
+    create_engine() keyword arguments for one database URL.
+
+    Every backend gets SQLAlchemy's compiled statement cache size; SQLite
+    also gets the sqlite3 per-connection prepared statement cache. Pooled
+    backends (Postgres, file SQLite) get the pool size, overflow, recycle,
+    timeout and pre-ping settings. In-memory SQLite keeps Flask-SQLAlchemy's
+    single static connection.
+    """
+    url = make_url(url)
+    options = {'query_cache_size': config.get('DB_QUERY_CACHE_SIZE', 500)}
+    if _is_sqlite(url):
+        options['connect_args'] = {'cached_statements': config.get('SQLITE_CACHED_STATEMENTS', 128)}
+        if _is_memory(url):
+            return options
+    options.update(
+        pool_size=config.get('DB_POOL_SIZE', 5),
+        max_overflow=config.get('DB_MAX_OVERFLOW', 10),
+        pool_recycle=config.get('DB_POOL_RECYCLE', -1),
+        pool_timeout=config.get('DB_POOL_TIMEOUT', 30),
+        pool_pre_ping=config.get('DB_POOL_PRE_PING', False),
+    )
+    return options
+
+
+def sqlite_pragmas(config, url):
+    """PRAGMA statements run on every new SQLite connection to url, in order."""
+    url = make_url(url)
+    pragmas = [f'PRAGMA busy_timeout = {int(config.get("SQLITE_BUSY_TIMEOUT_MS", 5000))}']
+    journal_mode = config.get('SQLITE_JOURNAL_MODE', '')
+    if journal_mode and not _is_memory(url):
+        pragmas.append(f'PRAGMA journal_mode = {journal_mode.upper()}')
+    synchronous = config.get('SQLITE_SYNCHRONOUS', '').upper()
+    if synchronous:
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f'SQLITE_SYNCHRONOUS must be one of {", ".join(SYNCHRONOUS_MODES)}')
+        pragmas.append(f'PRAGMA synchronous = {synchronous}')
+    if config.get('SQLITE_MMAP_SIZE'):
+        pragmas.append(f'PRAGMA mmap_size = {int(config["SQLITE_MMAP_SIZE"])}')
+    if config.get('SQLITE_CACHE_SIZE_KB'):
+        # Negative cache_size is in KiB rather than pages
+        pragmas.append(f'PRAGMA cache_size = -{int(config["SQLITE_CACHE_SIZE_KB"])}')
+    return pragmas
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run pragmas on each connection the engine opens."""
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def _begin_before_savepoint(conn, name):
+    # pysqlite only opens a transaction before DML, so a SAVEPOINT issued
+    # first would start (and its RELEASE would commit) the outer transaction
+    dbapi_connection = conn.connection.dbapi_connection
+    if not dbapi_connection.in_transaction:
+        dbapi_connection.execute('BEGIN')
+
+
+def configure(app):
+    """
+    Fill SQLALCHEMY_ENGINE_OPTIONS and per-bind options from the DB_* and
+    SQLITE_* settings. Must run before db.init_app(); explicitly configured
+    options win.
+    """
+    config = app.config
+    if config.get('SQLALCHEMY_DATABASE_URI'):
+        options = engine_options(config, config['SQLALCHEMY_DATABASE_URI'])
+        options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    binds = {}
+    for key, value in config.get('SQLALCHEMY_BINDS', {}).items():
+        if not isinstance(value, dict):
+            value = {'url': value}
+        # Bind options replace the default bind's wholesale, so set them per URL
+        binds[key] = dict(engine_options(config, value['url']), **value)
+    config['SQLALCHEMY_BINDS'] = binds
+
+
+def init_app(app):
+    """
+    Install the SQLite PRAGMAs on every SQLite engine and make SAVEPOINTs
+    (Session.begin_nested) nest inside a real transaction (call after
+    db.init_app()).
+    """
+    from models import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if _is_sqlite(engine.url):
+                apply_sqlite_pragmas(engine, sqlite_pragmas(app.config, engine.url))
+                event.listen(engine, 'savepoint', _begin_before_savepoint)
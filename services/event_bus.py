@@ -0,0 +1,187 @@
+"""
+Event Bus Module
+In-process publish/subscribe of committed stock movements and order status
+changes, consumed by the dashboard Server-Sent Events stream
+"""
+from collections import deque
+from datetime import datetime
+import itertools
+import threading
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm.util import identity_key
+
+from models import db
+from models.product import Product
+from models.transaction import Transaction
+from models.order import PurchaseOrder, ShipmentOrder
+
+
+_QUEUED_KEY = 'event_bus_queued'
+
+
+class Subscription:
+    """
+    Bounded per-client buffer. A client that falls more than maxsize events
+    behind has its backlog dropped and receives a single 'resync' event
+    telling it to reload its state, so a slow tab can never grow memory.
+    """
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._events = deque()
+        self._overflowed = False
+        self._cond = threading.Condition()
+
+    def push(self, item):
+        with self._cond:
+            if len(self._events) >= self.maxsize:
+                self._events.clear()
+                self._overflowed = True
+            else:
+                self._events.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Next (id, type, data) tuple, or None if nothing arrived within timeout."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._events or self._overflowed, timeout)
+            if self._overflowed:
+                self._overflowed = False
+                return (None, 'resync', {})
+            if self._events:
+                return self._events.popleft()
+            return None
+
+
+class EventBus:
+    """Fan-out of events to every active subscription."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, maxsize=100, limit=None):
+        """New subscription, or None when `limit` subscriptions are already open."""
+        sub = Subscription(maxsize)
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event_type, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        item = (next(self._ids), event_type, data)
+        for sub in subscribers:
+            sub.push(item)
+
+
+bus = EventBus()
+
+
+def queue_event(session, event_type, data):
+    """
+    Queue an event to be published once the session's transaction commits.
+    Set-based writes that bypass ORM objects use this to announce their changes.
+    """
+    session.info.setdefault(_QUEUED_KEY, []).append((event_type, data))
+
+
+def stock_events(product_id, sku, name, min_stock, transaction_type, quantity, quantity_before, quantity_after,
+                 reference_type=None, reference_id=None):
+    """Build the stock movement event plus a low-stock crossing event when the threshold is crossed."""
+    events = [('stock', {
+        'product_id': product_id,
+        'product_sku': sku,
+        'product_name': name,
+        'transaction_type': transaction_type,
+        'quantity': quantity,
+        'quantity_before': quantity_before,
+        'quantity_after': quantity_after,
+        'reference_type': reference_type,
+        'reference_id': reference_id,
+        'created_at': datetime.utcnow().isoformat()
+    })]
+    if min_stock is not None and quantity_before is not None and quantity_after is not None:
+        crossing = {'product_id': product_id, 'product_sku': sku, 'product_name': name,
+                    'quantity': quantity_after, 'min_stock': min_stock}
+        if quantity_before > min_stock >= quantity_after:
+            events.append(('low_stock', crossing))
+        elif quantity_before <= min_stock < quantity_after:
+            events.append(('stock_recovered', crossing))
+    return events
+
+
+def _after_flush(session, flush_context):
+    if not bus.subscriber_count:
+        return
+    queued = session.info.setdefault(_QUEUED_KEY, [])
+
+    transactions = [obj for obj in session.new if isinstance(obj, Transaction)]
+    products = {}
+    for obj in transactions:
+        product = session.identity_map.get(identity_key(Product, obj.product_id))
+        if product is not None:
+            products[obj.product_id] = (product.sku, product.name, product.min_stock)
+    # Stock mutations no longer load the Product; fetch what the events need in one query
+    missing = {obj.product_id for obj in transactions} - products.keys()
+    if missing:
+        table = Product.__table__
+        rows = session.connection().execute(
+            select(table.c.id, table.c.sku, table.c.name, table.c.min_stock).where(table.c.id.in_(missing))
+        )
+        products.update((pid, (sku, name, min_stock)) for pid, sku, name, min_stock in rows)
+
+    for obj in transactions:
+        sku, name, min_stock = products.get(obj.product_id, (None, None, None))
+        queued.extend(stock_events(
+            obj.product_id, sku, name, min_stock,
+            obj.transaction_type, obj.quantity, obj.quantity_before, obj.quantity_after,
+            obj.reference_type, obj.reference_id
+        ))
+
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, (PurchaseOrder, ShipmentOrder)):
+            continue
+        history = inspect(obj).attrs.status.history
+        if obj in session.dirty and not history.has_changes():
+            continue
+        old = history.deleted[0] if history.deleted else None
+        is_po = isinstance(obj, PurchaseOrder)
+        queued.append(('order_status', {
+            'order_type': 'purchase_order' if is_po else 'shipment_order',
+            'order_id': obj.id,
+            'order_number': obj.po_number if is_po else obj.so_number,
+            'old_status': old,
+            'new_status': obj.status
+        }))
+
+
+def _after_commit(session):
+    queued = session.info.pop(_QUEUED_KEY, None)
+    for event_type, data in queued or ():
+        bus.publish(event_type, data)
+
+
+def _after_rollback(session):
+    session.info.pop(_QUEUED_KEY, None)
+
+
+def init_app(app):
+    """Publish committed changes from the app's session to the bus."""
+    event.listen(db.session, 'after_flush', _after_flush)
+    event.listen(db.session, 'after_commit', _after_commit)
+    event.listen(db.session, 'after_rollback', _after_rollback)
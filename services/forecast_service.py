@@ -6,6 +6,27 @@ from datetime import datetime, timedelta
 from collections import defaultdict
 import math
 
+from models import db
+
+
+# Products whose demand history is loaded by one grouped query
+DEMAND_CHUNK_SIZE = 1000
+
+
+def restock_quantities(product, daily, safety_stock, on_order=0, forecast_days=30):
+    """
+    Restock recommendation for a product (ORM object or row with quantity,
+    min_stock and max_stock) given its daily forecast. Units already on
+    order count as stock. Returns (projected_stock, restock_needed,
+    optimal_restock): the stock left after forecast_days, the units needed
+    to get back above min_stock plus safety stock, and the units that
+    would fill it to max_stock.
+    """
+    projected = (product.quantity or 0) - daily * forecast_days
+    restock_needed = max(0, (product.min_stock or 0) + safety_stock - projected - on_order)
+    optimal_restock = max(0, (product.max_stock or 0) - projected - on_order)
+    return projected, restock_needed, optimal_restock
+
 
 class ForecastService:
     """
@@ -24,11 +45,14 @@ class ForecastService:
         from models.transaction import Transaction
         from models.product import Product
         from datetime import datetime, timedelta
+        from sqlalchemy import func
         
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        query = Transaction.query.filter(
+        # Aggregate by date in the database (served by ix_transactions_product_type_created)
+        day = func.date(Transaction.created_at)
+        query = self.db.query(day, func.sum(func.abs(Transaction.quantity))).filter(
             Transaction.transaction_type == 'OUT',
             Transaction.created_at >= start_date,
             Transaction.created_at <= end_date
@@ -37,13 +61,9 @@ class ForecastService:
         if product_id:
             query = query.filter(Transaction.product_id == product_id)
         
-        transactions = query.all()
-        
-        # Aggregate by date
         daily_demand = defaultdict(int)
-        for t in transactions:
-            date_key = t.created_at.strftime('%Y-%m-%d')
-            daily_demand[date_key] += abs(t.quantity)
+        for date_value, quantity in query.group_by(day):
+            daily_demand[str(date_value)] += int(quantity or 0)
         
         # Fill in missing dates with 0
         result = {}
@@ -55,6 +75,41 @@ class ForecastService:
         
         return result
     
+    def get_demand_by_product(self, product_ids, days=90):
+        """
+        Daily outbound demand for many products with one grouped query.
+        Returns dict of {product_id: {date: quantity}} with every date filled.
+        """
+        from models.transaction import Transaction
+        from datetime import datetime, timedelta
+        from sqlalchemy import func
+        
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+        
+        day = func.date(Transaction.created_at)
+        rows = self.db.query(
+            Transaction.product_id, day, func.sum(func.abs(Transaction.quantity))
+        ).filter(
+            Transaction.product_id.in_(product_ids),
+            Transaction.transaction_type == 'OUT',
+            Transaction.created_at >= start_date,
+            Transaction.created_at <= end_date
+        ).group_by(Transaction.product_id, day)
+        
+        empty = {}
+        current = start_date
+        while current <= end_date:
+            empty[current.strftime('%Y-%m-%d')] = 0
+            current += timedelta(days=1)
+        
+        result = {product_id: dict(empty) for product_id in product_ids}
+        for product_id, date_value, quantity in rows:
+            date_key = str(date_value)
+            if date_key in result[product_id]:
+                result[product_id][date_key] += int(quantity or 0)
+        return result
+    
     def simple_moving_average(self, data, window=7):
         """
         Calculate Simple Moving Average (SMA).
@@ -201,7 +256,27 @@ class ForecastService:
             return None
         
         historical_data = self.get_historical_demand(product_id, history_days)
-        
+        return self.build_product_forecast(product, historical_data, history_days, forecast_days, algorithm)
+    
+    def daily_forecast(self, historical_data, algorithm='exponential', forecast_days=30):
+        """Daily demand forecast from the chosen algorithm only (cheaper than a full product forecast)."""
+        if algorithm == 'sma':
+            return self.simple_moving_average(historical_data, window=7)
+        if algorithm == 'wma':
+            return self.weighted_moving_average(historical_data, window=7)
+        if algorithm == 'linear':
+            linear = self.linear_regression_forecast(historical_data, forecast_days)
+            return sum(linear) / len(linear) if linear else 0
+        if algorithm == 'holt':
+            holt = self.holt_winters(historical_data, forecast_days=forecast_days)
+            return sum(holt) / len(holt) if holt else 0
+        return self.exponential_smoothing(historical_data, alpha=0.3)
+    
+    def build_product_forecast(self, product, historical_data, history_days=90, forecast_days=30,
+                               algorithm='exponential'):
+        """
+        Complete forecast for a product whose demand history is already loaded.
+        """
         # Calculate forecasts using different methods
         sma = self.simple_moving_average(historical_data, window=7)
         wma = self.weighted_moving_average(historical_data, window=7)
@@ -209,26 +284,16 @@ class ForecastService:
         linear = self.linear_regression_forecast(historical_data, forecast_days)
         holt = self.holt_winters(historical_data, forecast_days=forecast_days)
         
-        # Select primary forecast based on algorithm choice
-        if algorithm == 'sma':
-            daily_forecast = sma
-        elif algorithm == 'wma':
-            daily_forecast = wma
-        elif algorithm == 'linear':
-            daily_forecast = sum(linear) / len(linear) if linear else 0
-        elif algorithm == 'holt':
-            daily_forecast = sum(holt) / len(holt) if holt else 0
-        else:  # exponential (default)
-            daily_forecast = ses
+        # Primary forecast from the chosen algorithm, as replenishment computes it
+        daily_forecast = self.daily_forecast(historical_data, algorithm, forecast_days)
         
         # Calculate totals
         total_forecast = daily_forecast * forecast_days
         safety_stock = self.calculate_safety_stock(historical_data)
         
         # Restock recommendation
-        projected_stock = product.quantity - total_forecast
-        restock_needed = max(0, product.min_stock + safety_stock - projected_stock)
-        optimal_restock = max(0, product.max_stock - projected_stock)
+        projected_stock, restock_needed, optimal_restock = restock_quantities(
+            product, daily_forecast, safety_stock, forecast_days=forecast_days)
         
         # Calculate historical stats
         values = list(historical_data.values())
@@ -286,18 +351,21 @@ class ForecastService:
         """
         from models.product import Product
         
-        products = Product.query.all()
+        products = Product.query.options(db.joinedload(Product.category)).order_by(Product.id).all()
         forecasts = []
         
-        for product in products:
-            forecast = self.get_product_forecast(
-                product.id, 
-                history_days=history_days,
-                forecast_days=forecast_days,
-                algorithm=algorithm
-            )
-            if forecast:
-                forecasts.append(forecast)
+        # Demand history is fetched per chunk of products, one grouped query each
+        for start in range(0, len(products), DEMAND_CHUNK_SIZE):
+            chunk = products[start:start + DEMAND_CHUNK_SIZE]
+            demand = self.get_demand_by_product([p.id for p in chunk], history_days)
+            for product in chunk:
+                forecasts.append(self.build_product_forecast(
+                    product,
+                    demand[product.id],
+                    history_days=history_days,
+                    forecast_days=forecast_days,
+                    algorithm=algorithm
+                ))
         
         # Sort by urgency (days until stockout)
         forecasts.sort(key=lambda x: x['days_until_stockout'])
@@ -309,14 +377,16 @@ class ForecastService:
         Aggregate forecasts by category.
         """
         from models.category import Category
-        from models.product import Product
         
         categories = Category.query.all()
+        by_category = defaultdict(list)
+        for forecast in self.get_all_products_forecast(history_days, forecast_days):
+            by_category[forecast['category']].append(forecast)
         result = []
         
         for cat in categories:
-            products = cat.products.all()
-            if not products:
+            forecasts = by_category.get(cat.name)
+            if not forecasts:
                 continue
             
             total_demand = 0
@@ -324,19 +394,17 @@ class ForecastService:
             total_current_stock = 0
             total_restock = 0
             
-            for product in products:
-                forecast = self.get_product_forecast(product.id, history_days, forecast_days)
-                if forecast:
-                    total_demand += forecast['total_historical_demand']
-                    total_forecast += forecast['total_forecast']
-                    total_current_stock += forecast['current_stock']
-                    total_restock += forecast['restock_needed']
+            for forecast in forecasts:
+                total_demand += forecast['total_historical_demand']
+                total_forecast += forecast['total_forecast']
+                total_current_stock += forecast['current_stock']
+                total_restock += forecast['restock_needed']
             
             result.append({
                 'category_id': cat.id,
                 'category_name': cat.name,
                 'color': cat.color,
-                'product_count': len(products),
+                'product_count': len(forecasts),
                 'total_historical_demand': total_demand,
                 'total_forecast': round(total_forecast, 2),
                 'total_current_stock': total_current_stock,
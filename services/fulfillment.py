@@ -0,0 +1,250 @@
+"""
+Fulfillment Module
+Bulk pick confirmation and shipment status transitions across many orders
+"""
+from collections import Counter, defaultdict
+from datetime import date
+
+from sqlalchemy import func, select, update
+
+from models.order import ShipmentOrder, ShipmentOrderItem
+from models.product import Product
+from services.allocation import AllocationService
+from services.event_bus import queue_event
+from services.stock_service import StockService
+
+
+# Orders whose picks can be confirmed (reserved through /pick or a wave first)
+PICKABLE_STATUSES = ('picking',)
+
+# Bulk transitions: target status -> (required current status, date column stamped today)
+TRANSITIONS = {
+    'shipped': ('packed', 'ship_date'),
+    'delivered': ('shipped', 'delivery_date'),
+}
+
+
+def _parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid {name} "{value}"')
+
+
+class FulfillmentService:
+    """
+    Order-level operations over many shipment orders per call.
+
+    Orders and their lines are loaded with one IN query each, stock goes
+    down through StockService.remove_stock_many and status changes are
+    single guarded UPDATEs, so the number of statements does not grow with
+    the number of orders. Every order gets its own entry in the results;
+    one bad order never blocks the others. The caller commits, or rolls
+    back when InsufficientStockError escapes (stock taken concurrently
+    between the availability check and the guarded UPDATE).
+    """
+
+    def __init__(self, db_session, created_by='System'):
+        self.db = db_session
+        self.created_by = created_by
+
+    def confirm_picks(self, requests):
+        """
+        requests: [{"order_id": 1, "items": [{"item_id": 10, "quantity": 2}]}, ...].
+        Without "items" everything outstanding on the order is picked. An
+        order with any invalid line (unknown item, non-positive quantity or
+        more than is outstanding) is rejected as a whole, as is an order
+        whose picks beyond its own reservation exceed the product's
+        unreserved stock. Fully picked orders become packed. Returns one
+        result per request entry.
+        """
+        results = []
+        parsed = []
+        seen = set()
+        for index, entry in enumerate(requests):
+            try:
+                if not isinstance(entry, dict):
+                    raise ValueError('Entry must be an object')
+                order_id = _parse_int(entry.get('order_id'), 'order_id')
+                if order_id in seen:
+                    raise ValueError(f'Order {order_id} is listed more than once')
+                seen.add(order_id)
+                items = entry.get('items')
+                if items is not None:
+                    if not isinstance(items, list):
+                        raise ValueError('items must be a list')
+                    items = [(_parse_int(i.get('item_id'), 'item_id'), _parse_int(i.get('quantity', 0), 'quantity'))
+                             if isinstance(i, dict) else (None, None) for i in items]
+            except ValueError as e:
+                results.append({'index': index, 'order_id': entry.get('order_id') if isinstance(entry, dict) else None,
+                                'ok': False, 'error': str(e)})
+                continue
+            result = {'index': index, 'order_id': order_id}
+            results.append(result)
+            parsed.append((result, order_id, items))
+
+        order_ids = [order_id for _, order_id, _ in parsed]
+        orders = {o.id: o for o in ShipmentOrder.query.filter(ShipmentOrder.id.in_(order_ids))} if order_ids else {}
+        lines = defaultdict(list)
+        if orders:
+            for item in (ShipmentOrderItem.query
+                         .filter(ShipmentOrderItem.order_id.in_(list(orders)))
+                         .order_by(ShipmentOrderItem.id)):
+                lines[item.order_id].append(item)
+
+        accepted = []
+        for result, order_id, items in parsed:
+            order = orders.get(order_id)
+            if order is None:
+                result.update(ok=False, error='Order not found')
+                continue
+            result['so_number'] = order.so_number
+            if order.status not in PICKABLE_STATUSES:
+                result.update(ok=False, error=f'Cannot pick an order that is {order.status}')
+                continue
+
+            by_id = {item.id: item for item in lines[order_id]}
+            if items is None:
+                order_picks = [(item, item.quantity - (item.picked_quantity or 0))
+                               for item in lines[order_id] if item.quantity > (item.picked_quantity or 0)]
+            else:
+                errors = []
+                order_picks = []
+                requested = defaultdict(int)
+                for item_id, quantity in items:
+                    item = by_id.get(item_id)
+                    if item is None:
+                        errors.append(f'Item {item_id} is not on this order')
+                    elif quantity <= 0:
+                        errors.append(f'Item {item_id}: quantity must be positive')
+                    else:
+                        requested[item_id] += quantity
+                        order_picks.append((item, quantity))
+                for item_id, quantity in requested.items():
+                    outstanding = by_id[item_id].quantity - (by_id[item_id].picked_quantity or 0)
+                    if quantity > outstanding:
+                        errors.append(f'Item {item_id}: picked {quantity} but only {outstanding} outstanding')
+                if errors:
+                    result.update(ok=False, error='; '.join(errors))
+                    continue
+            accepted.append((result, order, order_picks))
+
+        picks = []
+        free = self._unreserved_stock({item.product_id for _, _, order_picks in accepted for item, _ in order_picks})
+        for result, order, order_picks in accepted:
+            # Units beyond the order's own reservation must come from stock nobody else holds
+            unreserved = defaultdict(int)
+            reserved = defaultdict(int)
+            for item, quantity in order_picks:
+                used = min(quantity, max(0, (item.reserved_quantity or 0) - reserved[item.id]))
+                reserved[item.id] += used
+                unreserved[item.product_id] += quantity - used
+            short = {pid: units for pid, units in unreserved.items() if units and units > free.get(pid, 0)}
+            if short:
+                result.update(ok=False, error='; '.join(
+                    f'Product {pid}: {units} units beyond the reservation, {max(0, free.get(pid, 0))} unreserved'
+                    for pid, units in short.items()))
+                continue
+            for pid, units in unreserved.items():
+                if units:
+                    free[pid] -= units
+
+            for item, quantity in order_picks:
+                item.picked_quantity = (item.picked_quantity or 0) + quantity
+            picks.extend((order, item, quantity) for item, quantity in order_picks)
+
+            if sum(i.picked_quantity or 0 for i in lines[order.id]) >= sum(i.quantity for i in lines[order.id]):
+                order.status = 'packed'
+            result.update(ok=True, status=order.status, lines_picked=len(order_picks),
+                          units_picked=sum(q for _, q in order_picks))
+
+        # Own reservations first, so the guarded decrement only competes for unreserved stock
+        AllocationService(self.db).consume_many([(item, quantity) for _, item, quantity in picks])
+        StockService(self.db, created_by=self.created_by).remove_stock_many(
+            [(item.product_id, quantity, {'reference_id': order.id, 'notes': f'SO {order.so_number}'})
+             for order, item, quantity in picks],
+            transaction_type='OUT',
+            reference_type='shipment_order',
+            reason='Picked for shipment'
+        )
+        return results
+
+    def _unreserved_stock(self, product_ids):
+        """{product_id: quantity - reserved_quantity}, row-locked until commit where supported."""
+        if not product_ids:
+            return {}
+        table = Product.__table__
+        return dict(self.db.execute(
+            select(table.c.id, table.c.quantity - table.c.reserved_quantity)
+            .where(table.c.id.in_(list(product_ids)))
+            .with_for_update()
+        ).all())
+
+    def transition(self, order_ids, status):
+        """
+        Move many orders to `status` ('shipped' or 'delivered') with one
+        guarded UPDATE; orders not in the required state are reported, not
+        changed. Shipping releases any reservation still held. Returns one
+        result per requested id.
+        """
+        required, date_column = TRANSITIONS[status]
+        table = ShipmentOrder.__table__
+        ids = list(dict.fromkeys(order_ids))
+        current = {row.id: row for row in self.db.execute(
+            select(table.c.id, table.c.so_number, table.c.status).where(table.c.id.in_(ids))
+        )} if ids else {}
+
+        eligible = [oid for oid in ids if oid in current and current[oid].status == required]
+        changed = set()
+        if eligible:
+            stmt = (
+                update(table)
+                .where(table.c.id.in_(eligible), table.c.status == required)
+                .values({table.c.status: status, table.c[date_column]: date.today()})
+            )
+            if self.db.get_bind(ShipmentOrder).dialect.update_returning:
+                changed = {row[0] for row in self.db.execute(stmt.returning(table.c.id))}
+            elif self.db.execute(stmt).rowcount == len(eligible):
+                changed = set(eligible)
+            else:
+                changed = {row[0] for row in self.db.execute(
+                    select(table.c.id).where(table.c.id.in_(eligible), table.c.status == status))}
+
+        if status == 'shipped' and changed:
+            self.release_reservations(changed)
+
+        results = []
+        for oid in ids:
+            row = current.get(oid)
+            if row is None:
+                results.append({'order_id': oid, 'ok': False, 'error': 'Order not found'})
+            elif oid in changed:
+                results.append({'order_id': oid, 'so_number': row.so_number, 'ok': True, 'status': status})
+                queue_event(self.db, 'order_status', {
+                    'order_type': 'shipment_order', 'order_id': oid, 'order_number': row.so_number,
+                    'old_status': required, 'new_status': status
+                })
+            elif row.status != required:
+                results.append({'order_id': oid, 'so_number': row.so_number, 'ok': False,
+                                'error': f'Order is {row.status}, must be {required}'})
+            else:
+                results.append({'order_id': oid, 'so_number': row.so_number, 'ok': False,
+                                'error': 'Order changed concurrently'})
+        return results
+
+    def release_reservations(self, order_ids):
+        """Set-based release of whatever the given orders' lines still hold."""
+        item = ShipmentOrderItem.__table__
+        held = self.db.execute(
+            select(item.c.product_id, func.sum(item.c.reserved_quantity))
+            .where(item.c.order_id.in_(order_ids), item.c.reserved_quantity > 0)
+            .group_by(item.c.product_id)
+        ).all()
+        if not held:
+            return
+        AllocationService(self.db)._shift(Counter({pid: -int(qty) for pid, qty in held}))
+        self.db.execute(
+            update(item)
+            .where(item.c.order_id.in_(order_ids), item.c.reserved_quantity > 0)
+            .values(reserved_quantity=0)
+        )
@@ -0,0 +1,110 @@
+"""
+Idempotency Module
+Idempotency-Key handling so clients can safely retry bulk write requests
+"""
+from datetime import datetime, timedelta
+from functools import wraps
+import hashlib
+
+import click
+from flask import current_app, jsonify, make_response, request
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.idempotency_key import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+
+DEFAULT_TTL_HOURS = 24
+
+
+def _fingerprint():
+    digest = hashlib.sha256()
+    digest.update(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def _lookup(key):
+    record = db.session.get(IdempotencyKey, key)
+    ttl = timedelta(hours=current_app.config.get('IDEMPOTENCY_KEY_TTL_HOURS', DEFAULT_TTL_HOURS))
+    if record is not None and record.created_at and record.created_at < datetime.utcnow() - ttl:
+        db.session.delete(record)
+        db.session.commit()
+        return None
+    return record
+
+
+def _replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return jsonify({'error': f'{HEADER} was already used for a different request'}), 422
+    if record.status_code is None:
+        return jsonify({'error': f'A request with this {HEADER} is still being processed'}), 409
+    response = make_response(record.response_body, record.status_code)
+    response.mimetype = 'application/json'
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Decorator for write endpoints. When the request carries an
+    Idempotency-Key header, the key is inserted in the same transaction as
+    the view's changes, so of two concurrent attempts only one can commit.
+    The response is then stored, and a retry with the same key and body
+    gets the stored response back instead of running the view again.
+    Requests without the header run as usual.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 100:
+            return jsonify({'error': f'{HEADER} must be at most 100 characters'}), 400
+
+        fingerprint = _fingerprint()
+        stored = _lookup(key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        record = IdempotencyKey(key=key, fingerprint=fingerprint, created_at=datetime.utcnow())
+        db.session.add(record)
+        try:
+            response = make_response(view(*args, **kwargs))
+        except IntegrityError:
+            # A concurrent request with the same key committed first
+            db.session.rollback()
+            stored = _lookup(key)
+            if stored is None:
+                raise
+            return _replay(stored, fingerprint)
+
+        # Re-added when the view rolled back (validation errors are replayed too)
+        record.status_code = response.status_code
+        record.response_body = response.get_data(as_text=True)
+        db.session.add(record)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+        return response
+    return wrapper
+
+
+def purge_expired(session, ttl_hours=DEFAULT_TTL_HOURS):
+    """Delete keys older than ttl_hours; returns the number removed."""
+    cutoff = datetime.utcnow() - timedelta(hours=ttl_hours)
+    result = session.execute(IdempotencyKey.__table__.delete().where(IdempotencyKey.created_at < cutoff))
+    session.commit()
+    return result.rowcount
+
+
+def init_app(app):
+    """Register `flask purge-idempotency-keys`."""
+    @app.cli.command('purge-idempotency-keys')
+    def purge_command():
+        """Delete stored Idempotency-Key responses past their TTL."""
+        removed = purge_expired(db.session, app.config.get('IDEMPOTENCY_KEY_TTL_HOURS', DEFAULT_TTL_HOURS))
+        click.echo(f'{removed} keys removed')
@@ -0,0 +1,261 @@
+"""
+Product Import Service Module
+Streams CSV / JSON-lines product files into the catalog in validated batches
+"""
+from datetime import datetime
+import csv
+import io
+import json
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from models.product import Product
+from models.category import Category
+from models.location import Location
+from models.transaction import Transaction
+from services.event_bus import queue_event
+from services.search_service import queue_products
+from services.numbering import next_sku
+from services.counters import add_category_products
+from services.occupancy import add_location_products
+
+
+# Maximum number of per-row errors echoed back in the summary
+MAX_REPORTED_ERRORS = 1000
+
+NUMERIC_FIELDS = {
+    'quantity': int,
+    'min_stock': int,
+    'max_stock': int,
+    'unit_price': float,
+    'cost_price': float,
+    'weight': float,
+}
+
+
+def iter_csv(stream):
+    """Yield (line_number, row_dict) from a binary CSV stream without reading it all."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    for row in reader:
+        yield reader.line_num, {(k or '').strip().lower(): (v.strip() if isinstance(v, str) else v)
+                                for k, v in row.items()}
+
+
+def iter_json_lines(stream):
+    """Yield (line_number, row_dict) from a binary JSON-lines stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    for line_no, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, {'__error__': f'Invalid JSON: {e}'}
+            continue
+        yield line_no, row if isinstance(row, dict) else {'__error__': 'Line is not a JSON object'}
+
+
+class ProductImportService:
+    """
+    Bulk product creation. Each batch costs one SKU-collision query, one
+    multi-row INSERT for products and one for their initial-stock
+    transactions; rows that fail validation are reported, not raised.
+    """
+
+    def __init__(self, db_session, batch_size=1000, created_by='Import'):
+        self.db = db_session
+        self.batch_size = batch_size
+        self.created_by = created_by
+        self._categories = None
+        self._category_ids = None
+        self._locations = None
+        self._location_ids = None
+        self._seen_skus = set()
+
+    # ---- lookups (loaded once per import) ----
+
+    @staticmethod
+    def _known_id(row, field, known):
+        """The row's numeric `field`, which must be one of the known ids."""
+        raw = row[field]
+        try:
+            value = int(raw)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid {field} "{raw}"')
+        if value not in known:
+            raise ValueError(f'Unknown {field} {value}')
+        return value
+
+    def _category_id(self, row):
+        if self._categories is None:
+            self._categories = {n.lower(): i for i, n in self.db.query(Category.id, Category.name)}
+            self._category_ids = set(self._categories.values())
+        if row.get('category_id') not in (None, ''):
+            return self._known_id(row, 'category_id', self._category_ids)
+        name = str(row.get('category') or row.get('category_name') or '').strip()
+        if not name:
+            return None
+        if name.lower() not in self._categories:
+            raise ValueError(f'Unknown category "{name}"')
+        return self._categories[name.lower()]
+
+    def _location_id(self, row):
+        if self._locations is None:
+            self._locations = {
+                f'{z}-{a}-{r}-{s}-{b}'.upper(): i
+                for i, z, a, r, s, b in self.db.query(
+                    Location.id, Location.zone, Location.aisle, Location.rack, Location.shelf, Location.bin)
+            }
+            self._location_ids = set(self._locations.values())
+        if row.get('location_id') not in (None, ''):
+            return self._known_id(row, 'location_id', self._location_ids)
+        code = str(row.get('location') or row.get('location_code') or '').strip()
+        if not code:
+            return None
+        if code.upper() not in self._locations:
+            raise ValueError(f'Unknown location "{code}"')
+        return self._locations[code.upper()]
+
+    # ---- validation ----
+
+    def _validate(self, row):
+        """Turn an input row into a products-table mapping or raise ValueError."""
+        if '__error__' in row:
+            raise ValueError(row['__error__'])
+        name = str(row.get('name') or '').strip()
+        if not name:
+            raise ValueError('Name is required')
+
+        values = {
+            'sku': (str(row.get('sku') or '').strip() or next_sku()),
+            'name': name,
+            'description': row.get('description') or '',
+            'category_id': self._category_id(row),
+            'location_id': self._location_id(row),
+            'unit': row.get('unit') or 'pcs',
+            'quantity': 0, 'min_stock': 10, 'max_stock': 1000,
+            'unit_price': 0.0, 'cost_price': 0.0, 'weight': 0.0,
+        }
+        for field, cast in NUMERIC_FIELDS.items():
+            raw = row.get(field)
+            if raw in (None, ''):
+                continue
+            try:
+                values[field] = cast(raw)
+            except (TypeError, ValueError):
+                raise ValueError(f'Invalid {field} "{raw}"')
+        if values['quantity'] < 0:
+            raise ValueError('Quantity cannot be negative')
+        for field in ('sku', 'name'):
+            length = Product.__table__.c[field].type.length
+            if len(values[field]) > length:
+                raise ValueError(f'{field} is longer than {length} characters')
+        return values
+
+    # ---- batch processing ----
+
+    def _flush_batch(self, batch, summary):
+        skus = [values['sku'] for _, values in batch]
+        existing = {sku for (sku,) in self.db.query(Product.sku).filter(Product.sku.in_(skus))}
+
+        rows = []
+        for line_no, values in batch:
+            if values['sku'] in existing or values['sku'] in self._seen_skus:
+                self._error(summary, line_no, values['sku'], 'SKU already exists')
+                continue
+            self._seen_skus.add(values['sku'])
+            rows.append(values)
+        if not rows:
+            return
+
+        now = datetime.utcnow()
+        for values in rows:
+            values['created_at'] = values['updated_at'] = now
+
+        inserted = self.db.execute(
+            Product.__table__.insert().returning(Product.__table__.c.id, Product.__table__.c.sku),
+            rows
+        ).all()
+        ids = {sku: pid for pid, sku in inserted}
+
+        transactions = [{
+            'product_id': ids[values['sku']],
+            'transaction_type': 'IN',
+            'quantity': values['quantity'],
+            'quantity_before': 0,
+            'quantity_after': values['quantity'],
+            'reference_type': 'import',
+            'reason': 'Initial stock',
+            'created_by': self.created_by,
+            'created_at': now,
+        } for values in rows if values['quantity'] > 0]
+        if transactions:
+            self.db.execute(Transaction.__table__.insert(), transactions)
+
+        add_category_products(self.db, [v['category_id'] for v in rows])
+        add_location_products(self.db, rows)
+        queue_products(self.db, [(ids[v['sku']], v['sku'], v['name']) for v in rows])
+        queue_event(self.db, 'bulk_import', {'created': len(rows)})
+        summary['created'] += len(rows)
+        summary['initial_stock_transactions'] += len(transactions)
+
+    @staticmethod
+    def _error(summary, line_no, sku, message):
+        summary['failed'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'line': line_no, 'sku': sku, 'error': message})
+
+    def import_rows(self, rows, atomic=False):
+        """
+        Import (line_number, row_dict) pairs. Each batch is committed on its
+        own unless atomic=True. A batch the database rejects (a constraint
+        violated by a concurrent change, a value it cannot store) is rolled
+        back and its rows are reported as errors; the committed batches stand. With atomic=True
+        that rolls back the whole import instead, and the summary comes back
+        with rolled_back=True. Returns a summary with per-row errors.
+        """
+        summary = {'created': 0, 'failed': 0, 'initial_stock_transactions': 0, 'batches': 0, 'errors': []}
+        batch = []
+
+        def flush():
+            seen = set(self._seen_skus)
+            try:
+                self._flush_batch(batch, summary)
+            except (IntegrityError, DataError) as e:
+                self.db.rollback()
+                # Rows already reported as duplicate SKUs were never inserted
+                inserted, self._seen_skus = self._seen_skus - seen, seen
+                message = f'Rejected by the database: {str(e.orig).splitlines()[0]}'
+                for line_no, values in batch:
+                    if values['sku'] in inserted:
+                        self._error(summary, line_no, values['sku'], message)
+                batch.clear()
+                if atomic:
+                    summary.update(created=0, initial_stock_transactions=0, rolled_back=True)
+                    return False
+                return True
+            summary['batches'] += 1
+            if not atomic:
+                self.db.commit()
+            batch.clear()
+            return True
+
+        try:
+            for line_no, row in rows:
+                try:
+                    batch.append((line_no, self._validate(row)))
+                except (ValueError, TypeError) as e:
+                    self._error(summary, line_no, row.get('sku') if isinstance(row, dict) else None, str(e))
+                    continue
+                if len(batch) >= self.batch_size and not flush():
+                    return summary
+            if batch and not flush():
+                return summary
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        return summary
@@ -0,0 +1,79 @@
+"""
+JSON Provider Module
+orjson-backed Flask JSON provider with a stdlib fallback
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+import uuid
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None
+
+
+def _default(obj):
+    """Types neither serializer handles on its own (and the stdlib's dates)."""
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if type(obj).__module__ == 'numpy' and hasattr(obj, 'tolist'):
+        # NumPy scalars and arrays (stdlib path, or dtypes orjson does not cover)
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    jsonify(), request.get_json() and app.json go through orjson when it is
+    installed: datetimes, dates, dataclasses and NumPy arrays/scalars are
+    serialized natively and Decimal through _default. Dates come out as ISO
+    8601, like the models' to_dict(). Keys stay sorted and output compact
+    outside debug mode, as with Flask's provider. Without orjson it falls
+    back to the stdlib json module with the same type handling.
+    """
+
+    default = staticmethod(_default)
+
+    def _orjson_options(self):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        compact = self.compact if self.compact is not None else not self._app.debug
+        if not compact:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj):
+        """Serialize obj to UTF-8 JSON bytes without a str round trip."""
+        if orjson is None:
+            return self.dumps(obj).encode()
+        return orjson.dumps(obj, default=_default, option=self._orjson_options())
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+
+def init_app(app):
+    """Serve every JSON response and parse every JSON body with FastJSONProvider."""
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,102 @@
+"""
+Location Generator Module
+Set-based generation of zone / aisle / rack / shelf / bin location grids
+"""
+from datetime import datetime
+from itertools import product as cartesian
+
+from sqlalchemy import insert, select
+
+from models.location import Location
+from services.occupancy import mark_locations
+
+
+# Rows per executemany batch
+DEFAULT_BATCH_SIZE = 5000
+
+CONFLICT_MODES = ('skip', 'fail')
+
+# Conflicting codes echoed back when on_conflict='fail'
+CONFLICT_SAMPLE_SIZE = 20
+
+
+class LocationConflictError(Exception):
+    """Some generated codes already exist and on_conflict was 'fail'."""
+
+    def __init__(self, conflicts, sample):
+        self.conflicts = conflicts
+        self.sample = sample
+        super().__init__(f'{conflicts} locations already exist')
+
+
+def number_range(start, end, width=2):
+    """Zero-padded codes for start..end inclusive ('01'..'12'); raises ValueError on a bad range."""
+    start, end = int(start), int(end)
+    if start < 0 or end < start:
+        raise ValueError(f'Invalid range {start}-{end}')
+    return [f'{n:0{width}d}' for n in range(start, end + 1)]
+
+
+class LocationGenerator:
+    """
+    Creates every aisle x rack x shelf x bin combination of a zone.
+
+    Rows are built as plain mappings and inserted with one executemany per
+    batch_size rows instead of one ORM object each. Codes that already exist
+    in the zone are found with a single query up front and skipped (or the
+    whole request is refused with on_conflict='fail'); the unique index on
+    (zone, aisle, rack, shelf, bin) catches anything a concurrent request
+    inserts in between. The caller commits.
+    """
+
+    def __init__(self, db_session, batch_size=DEFAULT_BATCH_SIZE):
+        self.db = db_session
+        self.batch_size = batch_size
+
+    def existing_codes(self, zone):
+        table = Location.__table__
+        return set(self.db.execute(
+            select(table.c.aisle, table.c.rack, table.c.shelf, table.c.bin).where(table.c.zone == zone)
+        ).all())
+
+    def generate(self, zone, aisles, racks, shelves, bins=('01',), on_conflict='skip',
+                 max_capacity=100, zone_type='storage', is_active=True):
+        """
+        Insert the grid and return {'requested', 'created', 'skipped'}.
+        Raises LocationConflictError before writing anything when
+        on_conflict='fail' and any code already exists.
+        """
+        if on_conflict not in CONFLICT_MODES:
+            raise ValueError(f'on_conflict must be one of {", ".join(CONFLICT_MODES)}')
+        existing = self.existing_codes(zone)
+        codes = cartesian(aisles, racks, shelves, bins)
+        requested = len(aisles) * len(racks) * len(shelves) * len(bins)
+
+        if on_conflict == 'fail' and existing:
+            conflicts = [code for code in codes if code in existing]
+            if conflicts:
+                raise LocationConflictError(len(conflicts), ['-'.join((zone,) + code)
+                                                             for code in conflicts[:CONFLICT_SAMPLE_SIZE]])
+            codes = cartesian(aisles, racks, shelves, bins)
+
+        now = datetime.utcnow()
+        table = Location.__table__
+        created = 0
+        batch = []
+        for aisle, rack, shelf, bin_code in codes:
+            if (aisle, rack, shelf, bin_code) in existing:
+                continue
+            batch.append({'zone': zone, 'aisle': aisle, 'rack': rack, 'shelf': shelf, 'bin': bin_code,
+                          'max_capacity': max_capacity, 'current_capacity': 0, 'zone_type': zone_type,
+                          'is_active': is_active, 'created_at': now})
+            if len(batch) >= self.batch_size:
+                self.db.execute(insert(table), batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            self.db.execute(insert(table), batch)
+            created += len(batch)
+
+        if created:
+            mark_locations(self.db)
+        return {'requested': requested, 'created': created, 'skipped': requested - created}
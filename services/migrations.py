@@ -0,0 +1,272 @@
+"""
+Schema Migrations Module
+Ordered, run-once schema changes for databases created before a model changed
+"""
+from datetime import date, datetime
+
+import click
+from sqlalchemy import inspect, text
+
+from models import db
+from models.schema_migration import SchemaMigration
+
+
+# Arbitrary key for the Postgres advisory lock that keeps workers from migrating at once
+_LOCK_KEY = 7036
+
+_MIGRATIONS = []
+
+
+def migration(migration_id, enabled=None):
+    """
+    Register fn(engine, app) as a migration. Migrations run in registration
+    order and are recorded in schema_migrations once applied. `enabled(app)`
+    can hold a migration back; it is then retried on every start until it
+    is enabled.
+    """
+    def register(fn):
+        _MIGRATIONS.append((migration_id, fn, enabled))
+        return fn
+    return register
+
+
+def create_index(engine, name, table, columns, unique=False):
+    """CREATE [UNIQUE] INDEX IF NOT EXISTS, without blocking writes on Postgres."""
+    cols = ', '.join(columns)
+    index = 'UNIQUE INDEX' if unique else 'INDEX'
+    if engine.dialect.name == 'postgresql':
+        # CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            if _relkind(conn, table) == 'p':
+                # Partitioned tables do not support CONCURRENTLY; the index cascades to partitions
+                conn.execute(text(f'CREATE {index} IF NOT EXISTS {name} ON {table} ({cols})'))
+            else:
+                conn.execute(text(f'CREATE {index} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({cols})'))
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE {index} IF NOT EXISTS {name} ON {table} ({cols})'))
+
+
+def add_column(engine, table, name, ddl):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists."""
+    if name in {c['name'] for c in inspect(engine).get_columns(table)}:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+
+
+def _relkind(conn, table):
+    return conn.execute(text('SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)'), {'t': table}).scalar()
+
+
+# ============ MIGRATIONS ============
+
+@migration('0001_products_name_index')
+def _products_name_index(engine, app):
+    create_index(engine, 'ix_products_name_id', 'products', ['name', 'id'])
+
+
+@migration('0002_transaction_indexes')
+def _transaction_indexes(engine, app):
+    create_index(engine, 'ix_transactions_product_type_created', 'transactions',
+                 ['product_id', 'transaction_type', 'created_at'])
+    create_index(engine, 'ix_transactions_created_id', 'transactions', ['created_at', 'id'])
+
+
+def _partitioning_enabled(app):
+    return (app.config.get('LEDGER_PARTITIONING') == 'monthly'
+            and db.engine.dialect.name == 'postgresql')
+
+
+@migration('0003_partition_transactions_monthly', enabled=_partitioning_enabled)
+def _partition_transactions(engine, app):
+    """
+    Rebuild the ledger as a table range-partitioned by month on created_at.
+    Rows without a created_at are stamped with the migration time first.
+    Rows are copied inside one transaction that locks the ledger; run it in a
+    maintenance window on large databases.
+    """
+    with engine.begin() as conn:
+        if _relkind(conn, 'transactions') == 'p':
+            return
+        seq = conn.execute(text("SELECT pg_get_serial_sequence('transactions', 'id')")).scalar()
+        # The partition key is NOT NULL; legacy rows without a timestamp land in the current month
+        conn.execute(text('UPDATE transactions SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL'))
+        first = conn.execute(text('SELECT min(created_at) FROM transactions')).scalar() or datetime.utcnow()
+
+        conn.execute(text('ALTER TABLE transactions RENAME TO transactions_unpartitioned'))
+        conn.execute(text('ALTER TABLE transactions_unpartitioned RENAME CONSTRAINT transactions_pkey '
+                          'TO transactions_unpartitioned_pkey'))
+        for index in ('ix_transactions_product_type_created', 'ix_transactions_created_id'):
+            conn.execute(text(f'ALTER INDEX IF EXISTS {index} RENAME TO {index}_unpartitioned'))
+
+        conn.execute(text('CREATE TABLE transactions (LIKE transactions_unpartitioned INCLUDING DEFAULTS) '
+                          'PARTITION BY RANGE (created_at)'))
+        conn.execute(text('ALTER TABLE transactions ALTER COLUMN created_at SET NOT NULL'))
+        # The partition key has to be part of the primary key
+        conn.execute(text('ALTER TABLE transactions ADD PRIMARY KEY (id, created_at)'))
+        conn.execute(text('ALTER TABLE transactions ADD FOREIGN KEY (product_id) REFERENCES products (id)'))
+        conn.execute(text('CREATE TABLE transactions_default PARTITION OF transactions DEFAULT'))
+        _create_month_partitions(conn, date(first.year, first.month, 1),
+                                 app.config.get('LEDGER_PARTITION_MONTHS_AHEAD', 3))
+
+        conn.execute(text('INSERT INTO transactions SELECT * FROM transactions_unpartitioned'))
+        if seq:
+            conn.execute(text(f'ALTER SEQUENCE {seq} OWNED BY transactions.id'))
+        conn.execute(text('DROP TABLE transactions_unpartitioned'))
+        conn.execute(text('CREATE INDEX ix_transactions_product_type_created '
+                          'ON transactions (product_id, transaction_type, created_at)'))
+        conn.execute(text('CREATE INDEX ix_transactions_created_id ON transactions (created_at, id)'))
+        conn.execute(text('ANALYZE transactions'))
+
+
+@migration('0004_category_product_count')
+def _category_product_count(engine, app):
+    from services.counters import repair_category_counts
+    add_column(engine, 'categories', 'product_count', 'INTEGER NOT NULL DEFAULT 0')
+    repair_category_counts(db.session)
+
+
+@migration('0005_stock_reservations')
+def _stock_reservations(engine, app):
+    from services.allocation import RESERVING_STATUSES, repair_reservations
+    add_column(engine, 'products', 'reserved_quantity', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(engine, 'shipment_order_items', 'reserved_quantity', 'INTEGER NOT NULL DEFAULT 0')
+    # Orders already being picked hold their unpicked units
+    statuses = ', '.join(f"'{status}'" for status in RESERVING_STATUSES)
+    with engine.begin() as conn:
+        conn.execute(text(
+            'UPDATE shipment_order_items SET reserved_quantity = quantity - picked_quantity '
+            'WHERE quantity > picked_quantity AND order_id IN '
+            f'(SELECT id FROM shipment_orders WHERE status IN ({statuses}))'
+        ))
+    repair_reservations(db.session)
+
+
+@migration('0006_pick_waves')
+def _pick_waves(engine, app):
+    # pick_waves itself is created by db.create_all()
+    add_column(engine, 'shipment_orders', 'wave_id', 'INTEGER REFERENCES pick_waves (id)')
+    create_index(engine, 'ix_shipment_orders_wave_id', 'shipment_orders', ['wave_id'])
+    create_index(engine, 'ix_shipment_order_items_order_id', 'shipment_order_items', ['order_id'])
+    create_index(engine, 'ix_products_location_id', 'products', ['location_id'])
+
+
+_LOCATION_CODE = ('zone', 'aisle', 'rack', 'shelf', 'bin')
+
+
+def _location_codes_unique(app):
+    """Hold 0007 back (and say why) while duplicate location codes exist."""
+    cols = ', '.join(_LOCATION_CODE)
+    duplicates = db.session.execute(text(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM locations GROUP BY zone, aisle, rack, shelf, COALESCE(bin, '01') "
+        f"HAVING COUNT(*) > 1) d"
+    )).scalar()
+    db.session.rollback()
+    if duplicates:
+        app.logger.warning('Migration 0007_location_code_unique waits: %d location codes (%s) are duplicated; '
+                           'merge or delete the extra rows', duplicates, cols)
+    return not duplicates
+
+
+@migration('0007_location_code_unique', enabled=_location_codes_unique)
+def _location_code_unique(engine, app):
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE locations SET bin = '01' WHERE bin IS NULL"))
+    create_index(engine, 'uq_locations_code', 'locations', list(_LOCATION_CODE), unique=True)
+
+
+@migration('0008_location_occupancy')
+def _location_occupancy(engine, app):
+    from services.occupancy import repair_location_occupancy
+    add_column(engine, 'locations', 'product_count', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(engine, 'locations', 'current_weight', 'FLOAT NOT NULL DEFAULT 0')
+    repair_location_occupancy(db.session)
+
+
+# ============ PARTITION MAINTENANCE ============
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _create_month_partitions(conn, start, months_ahead):
+    """Create monthly partitions from `start` through the current month plus months_ahead."""
+    today = date.today()
+    last = _add_months(date(today.year, today.month, 1), months_ahead)
+    created = []
+    month = start
+    while month <= last:
+        name = f'transactions_y{month.year}m{month.month:02d}'
+        upper = _add_months(month, 1)
+        if not conn.execute(text('SELECT to_regclass(:t)'), {'t': name}).scalar():
+            conn.execute(text(f"CREATE TABLE {name} PARTITION OF transactions "
+                              f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"))
+            created.append(name)
+        month = upper
+    return created
+
+
+def ensure_ledger_partitions(months_ahead=3):
+    """
+    Make sure monthly ledger partitions exist ahead of time so new rows never
+    land in the default partition. No-op unless the ledger is partitioned.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return []
+    with db.engine.begin() as conn:
+        if _relkind(conn, 'transactions') != 'p':
+            return []
+        today = date.today()
+        return _create_month_partitions(conn, date(today.year, today.month, 1), months_ahead)
+
+
+# ============ RUNNER ============
+
+def run_migrations(app):
+    """Apply pending migrations in order; returns the ids that were applied."""
+    engine = db.engine
+    applied = []
+    with engine.connect() as lock_conn:
+        if engine.dialect.name == 'postgresql':
+            lock_conn.execute(text('SELECT pg_advisory_lock(:k)'), {'k': _LOCK_KEY})
+        try:
+            done = {row.id for row in db.session.query(SchemaMigration.id)}
+            db.session.rollback()
+            for migration_id, fn, enabled in _MIGRATIONS:
+                if migration_id in done or (enabled and not enabled(app)):
+                    continue
+                app.logger.info('Applying migration %s', migration_id)
+                fn(engine, app)
+                db.session.add(SchemaMigration(id=migration_id))
+                db.session.commit()
+                applied.append(migration_id)
+        finally:
+            if engine.dialect.name == 'postgresql':
+                lock_conn.execute(text('SELECT pg_advisory_unlock(:k)'), {'k': _LOCK_KEY})
+                lock_conn.commit()
+    return applied
+
+
+def init_app(app):
+    """Run pending migrations at startup and register the maintenance CLI commands."""
+    with app.app_context():
+        run_migrations(app)
+        if app.config.get('LEDGER_PARTITIONING') == 'monthly':
+            ensure_ledger_partitions(app.config.get('LEDGER_PARTITION_MONTHS_AHEAD', 3))
+
+    @app.cli.command('migrate')
+    def migrate_command():
+        """Apply pending schema migrations."""
+        applied = run_migrations(app)
+        click.echo('\n'.join(applied) if applied else 'Nothing to migrate')
+
+    @app.cli.command('ledger-partitions')
+    @click.option('--months-ahead', default=None, type=int, help='Months of partitions to create ahead')
+    def ledger_partitions_command(months_ahead):
+        """Create upcoming monthly transaction-ledger partitions (Postgres)."""
+        if months_ahead is None:
+            months_ahead = app.config.get('LEDGER_PARTITION_MONTHS_AHEAD', 3)
+        created = ensure_ledger_partitions(months_ahead)
+        click.echo('\n'.join(created) if created else 'No partitions created')
@@ -0,0 +1,126 @@
+"""
+Document Numbering Module
+Collision-free SKU, PO and SO numbers from database counters handed out in blocks
+"""
+from datetime import date, datetime
+import threading
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db
+from models.document_counter import DocumentCounter
+from models.product import Product
+from models.order import PurchaseOrder, ShipmentOrder
+from models.wave import PickWave
+
+
+DEFAULT_BLOCK_SIZE = 20
+
+
+def _max_suffix(conn, column, prefix):
+    """Highest numeric suffix already used under prefix; only read when a counter is first created."""
+    top = 0
+    for (value,) in conn.execute(select(column).where(column.like(f'{prefix}%'))):
+        suffix = value[len(prefix):]
+        if suffix.isdigit():
+            top = max(top, int(suffix))
+    return top
+
+
+def _insert_if_missing(conn, values):
+    table = DocumentCounter.__table__
+    dialect = conn.dialect.name
+    if dialect == 'postgresql':
+        stmt = postgresql.insert(table).values(**values).on_conflict_do_nothing()
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(table).values(**values).on_conflict_do_nothing()
+    else:
+        stmt = insert(table).values(**values)
+    conn.execute(stmt)
+
+
+class NumberAllocator:
+    """
+    Hands out increasing integers per counter name.
+
+    Each process reserves `block_size` numbers at a time with one
+    `UPDATE ... SET value = value + :n RETURNING value` in its own short
+    transaction, then serves them from memory, so allocation is O(1) and
+    never collides across threads or workers. Numbers left in a block when
+    a worker exits are skipped (gaps are expected); numbers from different
+    workers interleave rather than being strictly ordered.
+
+    SQLite serializes writers anyway and cannot open a second write
+    transaction while the request holds one, so there each number is taken
+    inside the caller's transaction and rolls back with it.
+    """
+
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE):
+        self.block_size = block_size
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _reserve(conn, name, count, seed):
+        """Advance counter `name` by count and return its new value, creating it from seed(conn) if needed."""
+        table = DocumentCounter.__table__
+        stmt = (
+            update(table)
+            .where(table.c.name == name)
+            .values(value=table.c.value + count, updated_at=datetime.utcnow())
+            .returning(table.c.value)
+        )
+        row = conn.execute(stmt).first()
+        if row is None:
+            start = seed(conn) if seed else 0
+            _insert_if_missing(conn, {'name': name, 'value': start, 'updated_at': datetime.utcnow()})
+            row = conn.execute(stmt).first()
+        return row[0]
+
+    def next_value(self, name, seed=None):
+        """Next number for counter `name`. seed(conn) returns the last number already in use."""
+        if db.engine.dialect.name == 'sqlite':
+            return self._reserve(db.session.connection(), name, 1, seed)
+
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[0] > block[1]:
+                with db.engine.begin() as conn:
+                    high = self._reserve(conn, name, self.block_size, seed)
+                block = self._blocks[name] = [high - self.block_size + 1, high]
+            value = block[0]
+            block[0] += 1
+            return value
+
+
+allocator = NumberAllocator()
+
+
+def next_sku():
+    value = allocator.next_value(
+        'sku', lambda conn: _max_suffix(conn, Product.__table__.c.sku, 'SKU-'))
+    return f'SKU-{value:06d}'
+
+
+def _dated_number(kind, column, today=None):
+    day = (today or date.today()).strftime('%Y%m%d')
+    prefix = f'{kind.upper()}-{day}-'
+    value = allocator.next_value(f'{kind}:{day}', lambda conn: _max_suffix(conn, column, prefix))
+    return f'{prefix}{value:03d}'
+
+
+def next_po_number(today=None):
+    return _dated_number('po', PurchaseOrder.__table__.c.po_number, today)
+
+
+def next_so_number(today=None):
+    return _dated_number('so', ShipmentOrder.__table__.c.so_number, today)
+
+
+def next_wave_number(today=None):
+    return _dated_number('wv', PickWave.__table__.c.wave_number, today)
+
+
+def init_app(app):
+    allocator.block_size = max(1, app.config.get('NUMBER_BLOCK_SIZE', DEFAULT_BLOCK_SIZE))
@@ -0,0 +1,188 @@
+"""
+Occupancy Module
+Maintained per-location units, product counts and weight, kept in step with product writes
+"""
+from collections import defaultdict
+
+from sqlalchemy import case, event, func, inspect, or_, select, update
+from sqlalchemy.orm.util import identity_key
+
+from models import db
+from models.location import Location
+from models.product import Product
+
+
+# Locations per CASE update (SQLite evaluates CASE branches one by one)
+CHUNK_SIZE = 500
+
+# Weight drift below this is rounding, not an error
+WEIGHT_TOLERANCE = 0.001
+
+_COLUMNS = ('current_capacity', 'product_count', 'current_weight')
+
+# session.info key: ids of locations changed in the transaction, or ALL_LOCATIONS
+CHANGED_KEY = 'occupancy_changed_locations'
+ALL_LOCATIONS = 'all'
+
+
+def mark_locations(session, ids=None):
+    """
+    Note locations whose occupancy or definition changed in this transaction,
+    for in-process indexes (putaway) to refresh after commit. ids=None means
+    any location may have changed (bulk inserts, repairs).
+    """
+    if ids is None:
+        session.info[CHANGED_KEY] = ALL_LOCATIONS
+        return
+    changed = session.info.setdefault(CHANGED_KEY, set())
+    if changed != ALL_LOCATIONS:
+        changed.update(ids)
+
+
+def _apply_location_deltas(session, deltas):
+    """
+    Add {location_id: [units, products, weight]} to the locations' counters
+    with one UPDATE per CHUNK_SIZE locations, inside the session's transaction.
+    """
+    deltas = {lid: d for lid, d in deltas.items() if lid is not None and any(d)}
+    if not deltas:
+        return
+    table = Location.__table__
+    ids = list(deltas)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        values = {}
+        for index, column in enumerate(_COLUMNS):
+            column_deltas = {lid: deltas[lid][index] for lid in chunk if deltas[lid][index]}
+            if column_deltas:
+                values[column] = table.c[column] + case(column_deltas, value=table.c.id, else_=0)
+        session.execute(update(table).where(table.c.id.in_(chunk)).values(values))
+    for lid in ids:
+        location = session.identity_map.get(identity_key(Location, lid))
+        if location is not None:
+            session.expire(location, list(_COLUMNS))
+    mark_locations(session, ids)
+
+
+def shift_units(session, deltas, placement=None):
+    """
+    Account for stock changes made outside the ORM. deltas is
+    {product_id: units}; placement is {product_id: (location_id, weight)}
+    when the caller already has it, otherwise it is read in one query.
+    """
+    deltas = {pid: n for pid, n in deltas.items() if n}
+    if not deltas:
+        return
+    if placement is None:
+        table = Product.__table__
+        placement = {row.id: (row.location_id, row.weight) for row in session.execute(
+            select(table.c.id, table.c.location_id, table.c.weight).where(table.c.id.in_(list(deltas)))
+        )}
+    location_deltas = defaultdict(lambda: [0, 0, 0.0])
+    for pid, units in deltas.items():
+        location_id, weight = placement.get(pid, (None, None))
+        if location_id is not None:
+            location_deltas[location_id][0] += units
+            location_deltas[location_id][2] += units * (weight or 0)
+    _apply_location_deltas(session, location_deltas)
+
+
+def add_location_products(session, rows):
+    """
+    Count products created outside the ORM (bulk inserts). rows holds the
+    inserted values (location_id, quantity, weight) of each product.
+    """
+    location_deltas = defaultdict(lambda: [0, 0, 0.0])
+    for values in rows:
+        if values.get('location_id') is not None:
+            quantity = values.get('quantity') or 0
+            entry = location_deltas[values['location_id']]
+            entry[0] += quantity
+            entry[1] += 1
+            entry[2] += quantity * (values.get('weight') or 0)
+    _apply_location_deltas(session, location_deltas)
+
+
+def _old_value(state, name):
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        # Set on a freshly loaded row with no prior value in the session
+        return None
+    return getattr(state.obj(), name)
+
+
+def _add(deltas, location_id, quantity, weight, sign):
+    if location_id is None:
+        return
+    entry = deltas[location_id]
+    entry[0] += sign * (quantity or 0)
+    entry[1] += sign
+    entry[2] += sign * (quantity or 0) * (weight or 0)
+
+
+def _after_flush(session, flush_context):
+    locations = [obj.id for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+                 if isinstance(obj, Location)]
+    if locations:
+        mark_locations(session, locations)
+
+    deltas = defaultdict(lambda: [0, 0, 0.0])
+    for obj in session.new:
+        if isinstance(obj, Product):
+            _add(deltas, obj.location_id, obj.quantity, obj.weight, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            state = inspect(obj)
+            _add(deltas, _old_value(state, 'location_id'), _old_value(state, 'quantity'),
+                 _old_value(state, 'weight'), -1)
+    for obj in session.dirty:
+        if isinstance(obj, Product) and obj not in session.deleted:
+            state = inspect(obj)
+            if not any(state.attrs[name].history.has_changes() for name in ('location_id', 'quantity', 'weight')):
+                continue
+            _add(deltas, _old_value(state, 'location_id'), _old_value(state, 'quantity'),
+                 _old_value(state, 'weight'), -1)
+            _add(deltas, obj.location_id, obj.quantity, obj.weight, 1)
+    _apply_location_deltas(session, deltas)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    # Registered with active_history so changing an expired Product still
+    # knows what to take off its old location.
+    return value
+
+
+def repair_location_occupancy(session):
+    """Recompute every location's units, product count and weight from products; returns the rows corrected."""
+    table = Location.__table__
+    product = Product.__table__
+    placed = select().select_from(product).where(product.c.location_id == table.c.id)
+    units = placed.add_columns(func.coalesce(func.sum(product.c.quantity), 0)).scalar_subquery()
+    count = placed.add_columns(func.count(product.c.id)).scalar_subquery()
+    weight = placed.add_columns(
+        func.coalesce(func.sum(product.c.quantity * func.coalesce(product.c.weight, 0)), 0)
+    ).scalar_subquery()
+    result = session.execute(
+        update(table)
+        .where(or_(func.coalesce(table.c.current_capacity, -1) != units,
+                   table.c.product_count != count,
+                   func.abs(table.c.current_weight - weight) > WEIGHT_TOLERANCE))
+        .values(current_capacity=units, product_count=count, current_weight=weight)
+    )
+    mark_locations(session)
+    session.commit()
+    return result.rowcount
+
+
+def _after_rollback(session):
+    session.info.pop(CHANGED_KEY, None)
+
+
+def init_app(app):
+    """Maintain location occupancy on every flush."""
+    event.listen(db.session, 'after_flush', _after_flush)
+    event.listen(db.session, 'after_rollback', _after_rollback)
+    for attribute in (Product.location_id, Product.quantity, Product.weight):
+        event.listen(attribute, 'set', _load_old_value, active_history=True, retval=True)
@@ -0,0 +1,112 @@
+"""
+Order Listing Module
+Purchase / shipment order lists with SQL-side totals, batched item loading and cursor pagination
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from models import db
+from services.pagination import keyset_page, encode_cursor, parse_limit
+
+
+# Sort value of orders without a created_at; they list after every dated order
+NULL_CREATED_AT = datetime(1970, 1, 1)
+
+
+def order_totals(item_model, progress_column):
+    """
+    One grouped subquery with (order_id, total_items, total_progress, total_value)
+    per order; progress is received_quantity or picked_quantity.
+    """
+    return (
+        db.select(
+            item_model.order_id.label('order_id'),
+            db.func.sum(item_model.quantity).label('total_items'),
+            db.func.sum(progress_column).label('total_progress'),
+            db.func.sum(item_model.quantity * item_model.unit_price).label('total_value'),
+        )
+        .group_by(item_model.order_id)
+        .subquery()
+    )
+
+
+def load_items(item_model, order_ids):
+    """All line items of the given orders plus their products in two IN queries, grouped by order id."""
+    grouped = defaultdict(list)
+    if not order_ids:
+        return grouped
+    items = (
+        item_model.query
+        .options(db.selectinload(item_model.product))
+        .filter(item_model.order_id.in_(order_ids))
+        .order_by(item_model.id)
+        .all()
+    )
+    for item in items:
+        grouped[item.order_id].append(item)
+    return grouped
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'Invalid {name}, expected YYYY-MM-DD')
+
+
+def list_orders(order_model, item_model, progress_column, args):
+    """
+    Build the order list response for request args.
+
+    Filters: status (comma-separated), created_from / created_to (YYYY-MM-DD,
+    inclusive). summary=true omits line items. Without limit or cursor the
+    full list is returned as before; otherwise a page of
+    {items, next_cursor, has_more} ordered newest first.
+    Raises ValueError on bad arguments.
+    """
+    totals = order_totals(item_model, progress_column)
+    query = (
+        db.session.query(
+            order_model,
+            db.func.coalesce(totals.c.total_items, 0),
+            db.func.coalesce(totals.c.total_progress, 0),
+            db.func.coalesce(totals.c.total_value, 0.0),
+        )
+        .outerjoin(totals, totals.c.order_id == order_model.id)
+    )
+
+    statuses = [s for s in args.get('status', '').split(',') if s]
+    if statuses:
+        query = query.filter(order_model.status.in_(statuses))
+    if args.get('created_from'):
+        query = query.filter(order_model.created_at >= _parse_date(args['created_from'], 'created_from'))
+    if args.get('created_to'):
+        end = _parse_date(args['created_to'], 'created_to') + timedelta(days=1)
+        query = query.filter(order_model.created_at < end)
+
+    # created_at is nullable; coalesce it so the (created_at, id) ordering is total
+    created = db.func.coalesce(order_model.created_at, NULL_CREATED_AT)
+    summary = args.get('summary', '').lower() == 'true'
+    paginate = 'limit' in args or 'cursor' in args
+    if paginate:
+        limit = parse_limit(args.get('limit'))
+        rows, has_more = keyset_page(query, created, order_model.id, descending=True,
+                                     cursor=args.get('cursor'), limit=limit)
+    else:
+        rows = query.order_by(created.desc(), order_model.id.desc()).all()
+
+    items = {} if summary else load_items(item_model, [order.id for order, *_ in rows])
+    orders = [
+        order.to_dict(items=items.get(order.id, []) if not summary else None,
+                      totals=(int(total_items), int(total_progress), float(total_value)),
+                      include_items=not summary)
+        for order, total_items, total_progress, total_value in rows
+    ]
+    if not paginate:
+        return orders
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.created_at or NULL_CREATED_AT, last.id)
+    return {'items': orders, 'next_cursor': next_cursor, 'has_more': has_more}
@@ -0,0 +1,106 @@
+"""
+Pagination Module
+Keyset (cursor) pagination and cheap row-count estimates for list endpoints
+"""
+from datetime import datetime, date
+import base64
+import json
+
+from models import db
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# Upper bound for the bounded count used where the database has no planner estimate
+ESTIMATE_CAP = 10000
+
+
+def encode_cursor(sort_value, row_id):
+    """Opaque, URL-safe cursor for the position after (sort_value, row_id)."""
+    if isinstance(sort_value, (datetime, date)):
+        sort_value = {'dt': sort_value.isoformat()}
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if isinstance(sort_value, dict) and 'dt' in sort_value:
+        sort_value = datetime.fromisoformat(sort_value['dt'])
+    return sort_value, int(row_id)
+
+
+def parse_limit(value, default=DEFAULT_LIMIT):
+    if value is None:
+        return default
+    return max(1, min(int(value), MAX_LIMIT))
+
+
+def keyset_page(query, sort_expr, id_col, descending=False, cursor=None, limit=DEFAULT_LIMIT):
+    """
+    Fetch one page of query ordered by (sort_expr, id_col).
+
+    Seeks past the cursor with a row-value comparison instead of OFFSET,
+    so every page costs the same regardless of how deep it is.
+    Returns (rows, has_more); the caller builds the next cursor from the
+    last row with encode_cursor.
+    """
+    key = db.tuple_(sort_expr, id_col)
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        bound = db.tuple_(db.literal(sort_value), db.literal(row_id))
+        query = query.filter(key < bound if descending else key > bound)
+
+    if descending:
+        query = query.order_by(sort_expr.desc(), id_col.desc())
+    else:
+        query = query.order_by(sort_expr.asc(), id_col.asc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, has_more
+
+
+def offset_page(query, cursor=None, limit=DEFAULT_LIMIT):
+    """
+    OFFSET-based page for orderings that have no stable seek key (relevance).
+    The cursor carries the offset; returns (rows, has_more, next_cursor).
+    """
+    offset = 0
+    if cursor:
+        marker, offset = decode_cursor(cursor)
+        if marker != 'offset':
+            raise ValueError('Invalid cursor')
+    rows = query.offset(offset).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    next_cursor = encode_cursor('offset', offset + limit) if has_more else None
+    return rows[:limit], has_more, next_cursor
+
+
+def count_rows(query, estimate=False):
+    """
+    Row count for a filtered query. With estimate=True, Postgres answers from
+    the planner's row estimate (no scan); other backends count at most
+    ESTIMATE_CAP rows. Returns (count, is_estimate).
+    """
+    count_query = query.order_by(None)
+    if not estimate:
+        return count_query.count(), False
+
+    if db.engine.dialect.name == 'postgresql':
+        stmt = count_query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+        plan = db.session.execute(db.text(f'EXPLAIN (FORMAT JSON) {stmt}')).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows']), True
+
+    capped = count_query.limit(ESTIMATE_CAP).subquery()
+    total = db.session.query(db.func.count()).select_from(capped).scalar()
+    return total, total >= ESTIMATE_CAP
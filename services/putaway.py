@@ -0,0 +1,301 @@
+"""
+Putaway Module
+Bin suggestions for received goods from an in-memory index of locations with free capacity
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+import threading
+
+from sqlalchemy import or_, select
+
+from models import db
+from models.location import Location
+from models.product import Product
+from services import data_version
+from services.occupancy import ALL_LOCATIONS, CHANGED_KEY
+from services.wave_planning import natural_key
+
+
+DEFAULT_ZONE_TYPE = 'storage'
+
+# Walking cost of crossing one aisle, in rack positions
+AISLE_DISTANCE = 10
+
+
+def _free(row):
+    if not row.is_active or not row.max_capacity:
+        return 0
+    return max(0, row.max_capacity - (row.current_capacity or 0))
+
+
+class _Zone:
+    """Free bins of one (zone_type, zone): aisle ranks -> sorted [(rack_rank, shelf, bin, id)]."""
+
+    def __init__(self, aisle_codes, rack_codes):
+        self.aisle_rank = {code: i for i, code in enumerate(sorted(aisle_codes, key=natural_key))}
+        self.rack_rank = {code: i for i, code in enumerate(sorted(rack_codes, key=natural_key))}
+        self.aisles = []                    # sorted aisle ranks that have free bins
+        self.bins = defaultdict(list)       # aisle rank -> sorted entries
+
+    def add(self, aisle, entry):
+        bins = self.bins[aisle]
+        if not bins:
+            insort(self.aisles, aisle)
+        insort(bins, entry)
+
+    def remove(self, aisle, entry):
+        bins = self.bins.get(aisle)
+        i = bisect_left(bins, entry) if bins else 0
+        if bins and i < len(bins) and bins[i] == entry:
+            del bins[i]
+            if not bins:
+                del self.bins[aisle]
+                del self.aisles[bisect_left(self.aisles, aisle)]
+
+    def nearest(self, aisle, rack):
+        """(distance, aisle, entry) of the free bin closest to (aisle, rack), or None."""
+        best = None
+        i = bisect_left(self.aisles, aisle)
+        lo, hi = i - 1, i
+        while lo >= 0 or hi < len(self.aisles):
+            if hi < len(self.aisles) and (lo < 0 or self.aisles[hi] - aisle <= aisle - self.aisles[lo]):
+                candidate, hi = self.aisles[hi], hi + 1
+            else:
+                candidate, lo = self.aisles[lo], lo - 1
+            aisle_cost = AISLE_DISTANCE * abs(candidate - aisle)
+            if best is not None and aisle_cost > best[0]:
+                break
+            bins = self.bins[candidate]
+            j = bisect_left(bins, (rack,))
+            for entry in bins[max(0, j - 1):j + 1]:
+                cost = aisle_cost + abs(entry[0] - rack)
+                if best is None or cost < best[0]:
+                    best = (cost, candidate, entry)
+        return best
+
+
+class PutawayIndex:
+    """
+    Per-process index of active locations with free capacity
+    (max_capacity - current_capacity), grouped by zone_type and zone and
+    sorted by aisle and rack so the nearest free bin is found with a few
+    bisections instead of a table scan.
+
+    Kept current from this process's commits through the occupancy change
+    feed (only the touched locations are re-read); commits by other workers
+    are detected through the locations data version and trigger a rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._locations = {}                # id -> (key, aisle, entry, free, code)
+        self._zones = {}                    # (zone_type, zone) -> _Zone
+        self._stale = set()
+        self._rebuild_needed = False
+        self._expected_version = None
+
+    def setup(self):
+        data_version.on_commit(self._on_commit)
+
+    # ---- index maintenance ----
+
+    def _place(self, row):
+        zone = self._zones.get((row.zone_type, row.zone))
+        if zone is None or row.aisle not in zone.aisle_rank or row.rack not in zone.rack_rank:
+            return False
+        aisle = zone.aisle_rank[row.aisle]
+        entry = (zone.rack_rank[row.rack], natural_key(row.shelf), natural_key(row.bin), row.id)
+        free = _free(row)
+        code = f'{row.zone}-{row.aisle}-{row.rack}-{row.shelf}-{row.bin}'
+        self._locations[row.id] = ((row.zone_type, row.zone), aisle, entry, free, code)
+        if free > 0:
+            zone.add(aisle, entry)
+        return True
+
+    def _unplace(self, location_id):
+        known = self._locations.pop(location_id, None)
+        if known is not None and known[3] > 0:
+            self._zones[known[0]].remove(known[1], known[2])
+
+    @staticmethod
+    def _rows(ids=None):
+        table = Location.__table__
+        query = select(table.c.id, table.c.zone, table.c.zone_type, table.c.aisle, table.c.rack, table.c.shelf,
+                       table.c.bin, table.c.max_capacity, table.c.current_capacity, table.c.is_active)
+        if ids is not None:
+            query = query.where(table.c.id.in_(ids))
+        return db.session.execute(query).all()
+
+    def rebuild(self):
+        with self._lock:
+            version = data_version.get_versions('locations').get('locations', (0, None))[0]
+            rows = self._rows()
+            codes = defaultdict(lambda: (set(), set()))
+            for row in rows:
+                codes[(row.zone_type, row.zone)][0].add(row.aisle)
+                codes[(row.zone_type, row.zone)][1].add(row.rack)
+            self._zones = {key: _Zone(aisles, racks) for key, (aisles, racks) in codes.items()}
+            self._locations = {}
+            for row in rows:
+                self._place(row)
+            self._stale.clear()
+            self._rebuild_needed = False
+            self._expected_version = version
+            self._built = True
+
+    def _refresh(self, ids):
+        for row_id in ids:
+            self._unplace(row_id)
+        for row in self._rows(list(ids)):
+            if not self._place(row):
+                # A new zone, aisle or rack changes the ranks; start over
+                self.rebuild()
+                return
+
+    def _ensure_current(self):
+        with self._lock:
+            current = data_version.get_versions('locations').get('locations', (0, None))[0]
+            if not self._built or self._rebuild_needed or current != self._expected_version:
+                self.rebuild()
+            elif self._stale:
+                stale, self._stale = self._stale, set()
+                self._refresh(stale)
+
+    # ---- session hooks ----
+
+    def _on_commit(self, session, domains):
+        changed = session.info.pop(CHANGED_KEY, None)
+        if not self._built or 'locations' not in domains:
+            return
+        with self._lock:
+            if changed == ALL_LOCATIONS or not changed:
+                self._rebuild_needed = True
+            else:
+                self._stale.update(changed)
+            if self._expected_version is not None:
+                self._expected_version += 1
+
+    # ---- suggestions ----
+
+    def _take(self, location_id, quantity, undo):
+        """Tentatively use up to quantity of a bin's free space; returns the amount taken."""
+        key, aisle, entry, free, code = self._locations[location_id]
+        take = min(free, quantity)
+        if take <= 0:
+            return 0
+        undo.append((location_id, free))
+        self._locations[location_id] = (key, aisle, entry, free - take, code)
+        if free - take <= 0:
+            self._zones[key].remove(aisle, entry)
+        return take
+
+    def _restore(self, undo):
+        for location_id, free in reversed(undo):
+            key, aisle, entry, now_free, code = self._locations[location_id]
+            if now_free <= 0 < free:
+                self._zones[key].add(aisle, entry)
+            self._locations[location_id] = (key, aisle, entry, free, code)
+
+    def suggest(self, lines, zone_type=DEFAULT_ZONE_TYPE):
+        """
+        lines: [{'product_id', 'sku', 'location_id', 'quantity'}]. Each line
+        goes to the product's current location while it has room, then to
+        the nearest free bins (from the current location, or from the start
+        of each zone) of zone_type. Space handed out to one line is not
+        offered again to the next, so a whole container can be put away as
+        suggested. Nothing is written; returns one result per line.
+        """
+        self._ensure_current()
+        zones = sorted((key for key in self._zones if key[0] == zone_type), key=lambda k: natural_key(k[1]))
+        results = []
+        with self._lock:
+            undo = []
+            try:
+                for line in lines:
+                    remaining = line['quantity']
+                    placements = []
+                    home = self._locations.get(line.get('location_id'))
+                    if home is not None:
+                        taken = self._take(line['location_id'], remaining, undo)
+                        if taken:
+                            placements.append({'location_id': line['location_id'], 'location': home[4],
+                                               'quantity': taken, 'reason': 'current_location'})
+                            remaining -= taken
+
+                    # The current location's zone first, searched outward from it
+                    ordered = zones
+                    if home is not None and home[0] in zones:
+                        ordered = [home[0]] + [key for key in zones if key != home[0]]
+                    for key in ordered:
+                        if not remaining:
+                            break
+                        origin = (home[1], home[2][0]) if home is not None and key == home[0] else (0, 0)
+                        while remaining:
+                            found = self._zones[key].nearest(*origin)
+                            if found is None:
+                                break
+                            location_id = found[2][3]
+                            taken = self._take(location_id, remaining, undo)
+                            placements.append({'location_id': location_id, 'location': self._locations[location_id][4],
+                                               'quantity': taken, 'reason': 'nearest_free'})
+                            remaining -= taken
+
+                    results.append(dict(line, placements=placements, unplaced=remaining))
+            finally:
+                self._restore(undo)
+        return results
+
+
+index = PutawayIndex()
+
+
+def suggest_putaway(session, lines, zone_type=DEFAULT_ZONE_TYPE):
+    """
+    Resolve lines ({product_id or sku, quantity}) to products with one query
+    and return (suggestions, errors) from the shared index.
+    """
+    errors = []
+    parsed = []
+    for i, line in enumerate(lines):
+        try:
+            if not isinstance(line, dict):
+                raise ValueError('Line must be an object')
+            quantity = int(line.get('quantity', 0))
+            if quantity <= 0:
+                raise ValueError('quantity must be positive')
+            if line.get('product_id') is not None:
+                key = ('id', int(line['product_id']))
+            elif line.get('sku'):
+                key = ('sku', str(line['sku']).strip())
+            else:
+                raise ValueError('product_id or sku is required')
+        except (TypeError, ValueError) as e:
+            errors.append({'index': i, 'error': str(e)})
+            continue
+        parsed.append((i, key, quantity))
+
+    table = Product.__table__
+    ids = {key[1] for _, key, _ in parsed if key[0] == 'id'}
+    skus = {key[1] for _, key, _ in parsed if key[0] == 'sku'}
+    rows = session.execute(
+        select(table.c.id, table.c.sku, table.c.name, table.c.location_id)
+        .where(or_(table.c.id.in_(ids), table.c.sku.in_(skus)))
+    ).all() if parsed else []
+    by_key = {('id', row.id): row for row in rows}
+    by_key.update({('sku', row.sku): row for row in rows})
+
+    lines = []
+    for i, key, quantity in parsed:
+        row = by_key.get(key)
+        if row is None:
+            errors.append({'index': i, 'error': f'Product {key[1]} not found'})
+            continue
+        lines.append({'index': i, 'product_id': row.id, 'sku': row.sku, 'product_name': row.name,
+                      'location_id': row.location_id, 'quantity': quantity})
+    return index.suggest(lines, zone_type), errors
+
+
+def init_app(app):
+    """Keep the putaway index in step with this process's commits."""
+    index.setup()
@@ -0,0 +1,153 @@
+"""
+Read Routing Module
+Sends read-only endpoints to the DATABASE_READ_URL replica, with read-your-writes overrides
+"""
+from contextvars import ContextVar
+from functools import wraps
+import sqlite3
+import time
+
+import click
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+
+
+# SQLALCHEMY_BINDS key of the replica engine
+REPLICA_BIND = 'read_replica'
+
+# Request header that forces the primary for one request ("primary")
+CONSISTENCY_HEADER = 'X-Read-Consistency'
+
+# Cookie set after a request that committed changes; reads stay on the primary until it expires
+STICKY_COOKIE = 'wms_read_primary_until'
+
+# Response header naming the database the request read from
+SOURCE_HEADER = 'X-Read-Source'
+
+_WROTE_KEY = 'read_routing_wrote'
+
+_MUTATING_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# Set while a replica-routed view runs (contextvar, so batch sub-requests route on their own)
+_replica_view = ContextVar('replica_view', default=False)
+
+
+def _primary_requested():
+    if request.headers.get(CONSISTENCY_HEADER, '').lower() == 'primary':
+        return True
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class RoutingSession(Session):
+    """
+    Session that answers reads from the replica inside replica-routed views.
+
+    Everything else uses the primary: DML, flushes, any statement after the
+    transaction has written, requests that ask for the primary and all work
+    outside a request (CLI, migrations, background threads).
+    """
+
+    def _use_replica(self, clause):
+        if not _replica_view.get() or not has_request_context():
+            return False
+        if REPLICA_BIND not in self._db.engines:
+            return False
+        if self._flushing or self.info.get(_WROTE_KEY) or self.new or self.dirty or self.deleted:
+            return False
+        if clause is not None and getattr(clause, 'is_dml', False):
+            self.info[_WROTE_KEY] = True
+            return False
+        return not _primary_requested()
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            g.read_source = 'replica'
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_reads(view):
+    """Route the reads of one view to the replica (when one is configured)."""
+    if getattr(view, '_replica_reads', False):
+        return view
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _replica_view.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _replica_view.reset(token)
+    wrapper._replica_reads = True
+    return wrapper
+
+
+def route_blueprints(app, names):
+    """Wrap every GET-only endpoint of the named blueprints with replica_reads; returns the endpoints."""
+    routed = []
+    for rule in app.url_map.iter_rules():
+        blueprint = rule.endpoint.rpartition('.')[0]
+        if blueprint in names and not (rule.methods or set()) & set(_MUTATING_METHODS):
+            app.view_functions[rule.endpoint] = replica_reads(app.view_functions[rule.endpoint])
+            routed.append(rule.endpoint)
+    return routed
+
+
+def _after_transaction_end(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_WROTE_KEY, None)
+
+
+def _on_commit(session, domains):
+    if has_request_context():
+        g.committed_writes = True
+
+
+def sync_sqlite_replica(primary_url, replica_url):
+    """Copy a SQLite primary into the replica file with the online backup API (local testing)."""
+    primary, replica = make_url(primary_url), make_url(replica_url)
+    if primary.get_backend_name() != 'sqlite' or replica.get_backend_name() != 'sqlite':
+        raise click.ClickException('replica-sync only copies SQLite databases; '
+                                   'use streaming replication or pg_basebackup for Postgres')
+    source = sqlite3.connect(primary.database)
+    target = sqlite3.connect(replica.database)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def init_app(app):
+    """Route the READ_REPLICA_BLUEPRINTS, keep writers on the primary and register `flask replica-sync`."""
+    from models import db
+    from services import data_version
+
+    event.listen(db.session, 'after_transaction_end', _after_transaction_end)
+    data_version.on_commit(_on_commit)
+    names = {name.strip() for name in app.config.get('READ_REPLICA_BLUEPRINTS', '').split(',') if name.strip()}
+    if app.config.get('DATABASE_READ_URL'):
+        route_blueprints(app, names)
+
+    @app.after_request
+    def _read_routing_headers(response):
+        if app.config.get('DATABASE_READ_URL'):
+            response.headers[SOURCE_HEADER] = g.pop('read_source', 'primary')
+        sticky = app.config.get('READ_REPLICA_STICKY_SECONDS', 0)
+        if app.config.get('DATABASE_READ_URL') and sticky and g.pop('committed_writes', False):
+            response.set_cookie(STICKY_COOKIE, f'{time.time() + sticky:.3f}', max_age=sticky,
+                                httponly=True, samesite='Lax')
+        return response
+
+    @app.cli.command('replica-sync')
+    def replica_sync_command():
+        """Copy the SQLite primary to the DATABASE_READ_URL file (local replica testing)."""
+        if REPLICA_BIND not in db.engines:
+            raise click.ClickException('DATABASE_READ_URL is not set')
+        sync_sqlite_replica(str(db.engines[None].url), str(db.engines[REPLICA_BIND].url))
+        click.echo(f'Copied {db.engines[None].url.database} to {db.engines[REPLICA_BIND].url.database}')
@@ -0,0 +1,236 @@
+"""
+Replenishment Service Module
+Turns the demand forecast into draft purchase orders grouped by supplier
+"""
+from collections import defaultdict
+from datetime import datetime
+import time
+
+from sqlalchemy import func, select
+
+from models import db
+from models.product import Product
+from models.order import PurchaseOrder, PurchaseOrderItem
+from services.forecast_service import ForecastService, restock_quantities
+from services.numbering import next_po_number
+
+
+# Products forecast per chunk (one product query and one demand query each)
+DEFAULT_CHUNK_SIZE = 2000
+
+# Purchase orders whose outstanding quantities count as already on the way
+OPEN_PO_STATUSES = ('draft', 'pending', 'partial')
+
+AUTO_NOTES = 'Auto-replenishment'
+
+
+class ReplenishmentService:
+    """
+    Forecast every product, subtract what open purchase orders will still
+    deliver and draft one purchase order per supplier for the remainder.
+
+    A product's supplier is the supplier of the most recent purchase order
+    it appeared on; products never ordered before are reported as
+    unassigned instead of being guessed.
+    """
+
+    def __init__(self, db_session, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.db = db_session
+        self.chunk_size = chunk_size
+        self.forecaster = ForecastService(db_session)
+
+    def pipeline_quantities(self):
+        """{product_id: quantity ordered but not yet received} over open purchase orders."""
+        item = PurchaseOrderItem.__table__
+        order = PurchaseOrder.__table__
+        rows = self.db.execute(
+            select(item.c.product_id,
+                   func.sum(item.c.quantity - func.coalesce(item.c.received_quantity, 0)))
+            .join(order, order.c.id == item.c.order_id)
+            .where(order.c.status.in_(OPEN_PO_STATUSES))
+            .group_by(item.c.product_id)
+        )
+        return {product_id: max(0, int(outstanding or 0)) for product_id, outstanding in rows}
+
+    def product_suppliers(self):
+        """{product_id: supplier} from each product's latest non-cancelled purchase order."""
+        item = PurchaseOrderItem.__table__
+        order = PurchaseOrder.__table__
+        latest = (
+            select(item.c.product_id, func.max(order.c.id).label('order_id'))
+            .join(order, order.c.id == item.c.order_id)
+            .where(order.c.status != 'cancelled',
+                   order.c.supplier.isnot(None),
+                   order.c.supplier != '')
+            .group_by(item.c.product_id)
+            .subquery()
+        )
+        rows = self.db.execute(
+            select(latest.c.product_id, order.c.supplier)
+            .join(order, order.c.id == latest.c.order_id)
+        )
+        return dict(rows.all())
+
+    def _product_chunks(self, after_id):
+        """Yield lists of product rows in id order, one keyset query per chunk."""
+        product = Product.__table__
+        columns = (product.c.id, product.c.sku, product.c.name, product.c.quantity,
+                   product.c.min_stock, product.c.max_stock, product.c.cost_price)
+        while True:
+            rows = self.db.execute(
+                select(*columns)
+                .where(product.c.id > after_id)
+                .order_by(product.c.id)
+                .limit(self.chunk_size)
+            ).all()
+            if not rows:
+                return
+            yield rows
+            after_id = rows[-1].id
+
+    def plan(self, history_days=90, forecast_days=30, algorithm='exponential',
+             time_budget=None, after_id=0):
+        """
+        Compute replenishment lines without writing anything.
+
+        Stops between chunks once `time_budget` seconds have passed; the
+        result then has completed=False and resume_after set to the last
+        product id planned, to pass back as after_id on the next run.
+        """
+        started = time.monotonic()
+        pipeline = self.pipeline_quantities()
+        suppliers = self.product_suppliers()
+
+        lines = []
+        unassigned = []
+        products_scanned = 0
+        last_id = after_id
+        completed = True
+
+        for chunk in self._product_chunks(after_id):
+            demand = self.forecaster.get_demand_by_product([row.id for row in chunk], history_days)
+            for row in chunk:
+                history = demand[row.id]
+                daily = self.forecaster.daily_forecast(history, algorithm, forecast_days)
+                safety_stock = self.forecaster.calculate_safety_stock(history)
+                on_order = pipeline.get(row.id, 0)
+
+                _, restock_needed, optimal_restock = restock_quantities(
+                    row, daily, safety_stock, on_order=on_order, forecast_days=forecast_days)
+                if restock_needed <= 0:
+                    continue
+                quantity = round(max(restock_needed, optimal_restock))
+                if quantity <= 0:
+                    continue
+
+                line = {
+                    'product_id': row.id,
+                    'product_sku': row.sku,
+                    'product_name': row.name,
+                    'current_stock': row.quantity,
+                    'on_order': on_order,
+                    'daily_forecast': round(daily, 2),
+                    'safety_stock': safety_stock,
+                    'quantity': quantity,
+                    'unit_price': row.cost_price or 0,
+                    'supplier': suppliers.get(row.id),
+                }
+                (lines if line['supplier'] else unassigned).append(line)
+
+            products_scanned += len(chunk)
+            last_id = chunk[-1].id
+            if time_budget and time.monotonic() - started >= time_budget:
+                completed = False
+                break
+
+        by_supplier = defaultdict(list)
+        for line in lines:
+            by_supplier[line['supplier']].append(line)
+
+        return {
+            'products_scanned': products_scanned,
+            'completed': completed,
+            'resume_after': None if completed else last_id,
+            'suppliers': [
+                {
+                    'supplier': supplier,
+                    'line_count': len(supplier_lines),
+                    'total_quantity': sum(l['quantity'] for l in supplier_lines),
+                    'total_value': round(sum(l['quantity'] * l['unit_price'] for l in supplier_lines), 2),
+                    'lines': supplier_lines,
+                }
+                for supplier, supplier_lines in sorted(by_supplier.items())
+            ],
+            'unassigned': unassigned,
+            'elapsed_seconds': round(time.monotonic() - started, 3),
+        }
+
+    def run(self, dry_run=True, **options):
+        """
+        Plan replenishment and, unless dry_run, create one draft purchase
+        order per supplier with all its lines in a single transaction.
+        Returns the plan with the created po_number on each supplier entry.
+        """
+        result = self.plan(**options)
+        result['dry_run'] = dry_run
+        if dry_run or not result['suppliers']:
+            return result
+
+        now = datetime.utcnow()
+        item_rows = []
+        try:
+            for entry in result['suppliers']:
+                order = PurchaseOrder(
+                    po_number=next_po_number(),
+                    supplier=entry['supplier'],
+                    status='draft',
+                    notes=AUTO_NOTES,
+                    created_at=now
+                )
+                self.db.add(order)
+                self.db.flush()
+                entry['order_id'] = order.id
+                entry['po_number'] = order.po_number
+                item_rows.extend({
+                    'order_id': order.id,
+                    'product_id': line['product_id'],
+                    'quantity': line['quantity'],
+                    'received_quantity': 0,
+                    'unit_price': line['unit_price'],
+                } for line in entry['lines'])
+            self.db.execute(PurchaseOrderItem.__table__.insert(), item_rows)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return result
+
+
+def init_app(app):
+    """Register `flask replenish` for the nightly run."""
+    import click
+
+    @app.cli.command('replenish')
+    @click.option('--dry-run', is_flag=True, help='Report what would be ordered without creating orders')
+    @click.option('--history-days', default=90, type=int)
+    @click.option('--forecast-days', default=30, type=int)
+    @click.option('--algorithm', default='exponential')
+    @click.option('--after-id', default=0, type=int, help='Resume after this product id')
+    def replenish_command(dry_run, history_days, forecast_days, algorithm, after_id):
+        """Create draft purchase orders from the demand forecast."""
+        service = ReplenishmentService(db.session, app.config.get('REPLENISHMENT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+        result = service.run(
+            dry_run=dry_run,
+            history_days=history_days,
+            forecast_days=forecast_days,
+            algorithm=algorithm,
+            time_budget=app.config.get('REPLENISHMENT_TIME_BUDGET') or None,
+            after_id=after_id
+        )
+        for entry in result['suppliers']:
+            click.echo(f"{entry.get('po_number', '(dry run)')}  {entry['supplier']}: "
+                       f"{entry['line_count']} lines, {entry['total_quantity']} units")
+        click.echo(f"{result['products_scanned']} products in {result['elapsed_seconds']}s, "
+                   f"{len(result['unassigned'])} without a known supplier")
+        if not result['completed']:
+            click.echo(f"Time budget reached; resume with --after-id {result['resume_after']}")
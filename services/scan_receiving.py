@@ -0,0 +1,276 @@
+"""
+Scan Receiving Module
+Buffers handheld barcode scans and group-commits them into purchase order receipts
+"""
+from collections import defaultdict, deque
+from datetime import date, datetime
+import threading
+import time
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import db
+from models.product import Product
+from models.order import PurchaseOrder, PurchaseOrderItem
+from services.stock_service import StockService
+
+
+# Orders whose lines can be received by scanning
+RECEIVABLE_STATUSES = ('pending', 'partial')
+
+# Rejected scans kept for the status endpoint
+MAX_RECENT_REJECTS = 200
+
+
+def parse_scan(scan):
+    """Normalise one scan event to {sku, quantity, po_number, device, scanned_at} or raise ValueError."""
+    if not isinstance(scan, dict):
+        raise ValueError('Scan must be an object')
+    sku = str(scan.get('sku') or '').strip()
+    if not sku:
+        raise ValueError('sku is required')
+    try:
+        quantity = int(scan.get('quantity', 1))
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid quantity "{scan.get("quantity")}"')
+    if quantity <= 0:
+        raise ValueError('quantity must be positive')
+    return {
+        'sku': sku,
+        'quantity': quantity,
+        'po_number': str(scan.get('po_number') or '').strip() or None,
+        'device': scan.get('device'),
+        'scanned_at': scan.get('scanned_at'),
+    }
+
+
+def apply_scans(session, scans, created_by='Scanner'):
+    """
+    Receive a batch of parsed scans in one transaction.
+
+    Each scan is matched to an open line of its purchase order (or, without
+    po_number, to the oldest open order still expecting that SKU). Quantities
+    beyond what is still outstanding are rejected. Received quantities go up
+    in one UPDATE, stock through StockService.add_stock_many with one IN
+    transaction per order line, and the touched orders' statuses are derived
+    from one grouped totals query. The caller commits.
+    Returns (summary, rejected) where rejected is [(scan, error)].
+    """
+    rejected = []
+    skus = {scan['sku'] for scan in scans}
+    products = dict(session.execute(
+        select(Product.__table__.c.sku, Product.__table__.c.id).where(Product.__table__.c.sku.in_(skus))
+    ).all())
+
+    # Every open line for the scanned products, oldest order first
+    open_items = (
+        session.query(PurchaseOrderItem, PurchaseOrder)
+        .join(PurchaseOrder, PurchaseOrder.id == PurchaseOrderItem.order_id)
+        .filter(PurchaseOrderItem.product_id.in_(list(products.values())),
+                PurchaseOrder.status.in_(RECEIVABLE_STATUSES))
+        .order_by(PurchaseOrder.created_at, PurchaseOrder.id, PurchaseOrderItem.id)
+        .all()
+    )
+    candidates = defaultdict(list)
+    remaining = {}
+    orders = {}
+    for item, order in open_items:
+        candidates[item.product_id].append((item, order))
+        remaining[item.id] = item.quantity - (item.received_quantity or 0)
+        orders[order.id] = order
+
+    received = defaultdict(int)
+    for scan in scans:
+        product_id = products.get(scan['sku'])
+        if product_id is None:
+            rejected.append((scan, f'Unknown SKU "{scan["sku"]}"'))
+            continue
+        lines = [(item, order) for item, order in candidates[product_id]
+                 if scan['po_number'] is None or order.po_number == scan['po_number']]
+        if not lines:
+            where = f'purchase order {scan["po_number"]}' if scan['po_number'] else 'any open purchase order'
+            rejected.append((scan, f'{scan["sku"]} is not expected on {where}'))
+            continue
+
+        left = scan['quantity']
+        for item, order in lines:
+            take = min(left, remaining[item.id])
+            if take > 0:
+                remaining[item.id] -= take
+                received[item.id] += take
+                left -= take
+            if not left:
+                break
+        if left:
+            rejected.append((dict(scan, quantity=left), 'Exceeds the quantity still outstanding'))
+
+    if not received:
+        return {'scans': len(scans), 'units_received': 0, 'lines': 0, 'orders': []}, rejected
+
+    items = {item.id: (item, order) for item, order in open_items}
+    table = PurchaseOrderItem.__table__
+    session.execute(
+        update(table)
+        .where(table.c.id.in_(received))
+        .values(received_quantity=func.coalesce(table.c.received_quantity, 0)
+                + case(dict(received), value=table.c.id, else_=0))
+    )
+    for item_id, qty in received.items():
+        item = items[item_id][0]
+        set_committed_value(item, 'received_quantity', (item.received_quantity or 0) + qty)
+
+    StockService(session, created_by=created_by).add_stock_many(
+        [(items[item_id][0].product_id, qty, {'reference_id': items[item_id][1].id,
+                                              'notes': f'PO {items[item_id][1].po_number} (scan)'})
+         for item_id, qty in received.items()],
+        transaction_type='IN',
+        reference_type='purchase_order',
+        reason='Goods received'
+    )
+
+    touched = {items[item_id][1].id for item_id in received}
+    totals = session.execute(
+        select(table.c.order_id, func.sum(table.c.quantity), func.sum(table.c.received_quantity))
+        .where(table.c.order_id.in_(touched))
+        .group_by(table.c.order_id)
+    ).all()
+    order_results = []
+    for order_id, total_items, total_received in totals:
+        order = orders[order_id]
+        if total_received >= total_items:
+            order.status = 'received'
+            order.received_date = date.today()
+        else:
+            order.status = 'partial'
+        order_results.append({'order_id': order.id, 'po_number': order.po_number, 'status': order.status,
+                              'total_items': int(total_items), 'total_received': int(total_received)})
+
+    return {
+        'scans': len(scans),
+        'units_received': sum(received.values()),
+        'lines': len(received),
+        'orders': order_results,
+    }, rejected
+
+
+class ScanBuffer:
+    """
+    Server-side buffer of scan events.
+
+    Scans are acknowledged as soon as they are buffered and applied by a
+    background thread in group commits: whenever `batch_size` scans are
+    waiting or `interval` seconds have passed, everything pending is
+    received in a single transaction. During peak unloading this costs one
+    commit per batch instead of one per scan. Scans still buffered when the
+    process dies are lost, so the window is bounded by `interval`; clients
+    that need a durable answer flush synchronously. The flusher thread is
+    started by the first `add`, so CLI commands never run one.
+    """
+
+    def __init__(self, batch_size=500, interval=2.0):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.app = None
+        self.last_flush = None
+        self.recent_rejects = deque(maxlen=MAX_RECENT_REJECTS)
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def add(self, scans):
+        """Buffer parsed scans and wake the flusher if a full batch is waiting; returns the pending count."""
+        if self._thread is None and self.app is not None:
+            self.start(self.app)
+        with self._cond:
+            self._pending.extend(scans)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+            return len(self._pending)
+
+    def flush(self, app):
+        """
+        Receive everything pending in one transaction; returns the summary or
+        None if nothing was pending. If the group commit fails the scans are
+        retried one transaction each, so one bad scan cannot hold the rest
+        back; scans that fail on their own are rejected, not kept.
+        """
+        with self._flush_lock:
+            with self._cond:
+                scans, self._pending = self._pending, []
+            if not scans:
+                return None
+            with app.app_context():
+                try:
+                    summary, rejected = apply_scans(db.session, scans)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Scan receiving group commit failed; retrying %d scans one by one',
+                                         len(scans))
+                    summary, rejected = self._apply_each(app, scans)
+
+            summary['rejected'] = [dict(scan, error=error) for scan, error in rejected]
+            summary['flushed_at'] = datetime.utcnow().isoformat()
+            self.recent_rejects.extend(summary['rejected'])
+            self.last_flush = {k: v for k, v in summary.items() if k != 'rejected'}
+            self.last_flush['rejected'] = len(rejected)
+            return summary
+
+    @staticmethod
+    def _apply_each(app, scans):
+        """Receive scans one transaction each; returns the combined (summary, rejected)."""
+        summary = {'scans': len(scans), 'units_received': 0, 'lines': 0}
+        orders = {}
+        rejected = []
+        for scan in scans:
+            try:
+                result, scan_rejected = apply_scans(db.session, [scan])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.exception('Scan of %s could not be received', scan['sku'])
+                rejected.append((scan, f'Receiving failed: {str(getattr(e, "orig", e)).splitlines()[0]}'))
+                continue
+            rejected.extend(scan_rejected)
+            summary['units_received'] += result['units_received']
+            summary['lines'] += result['lines']
+            orders.update((order['order_id'], order) for order in result['orders'])
+        summary['orders'] = list(orders.values())
+        return summary, rejected
+
+    def _run(self, app):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._pending) >= self.batch_size, self.interval)
+            try:
+                self.flush(app)
+            except Exception:
+                app.logger.exception('Scan receiving flusher failed')
+                time.sleep(self.interval)
+
+    def start(self, app):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(app,), name='scan-receiving', daemon=True)
+            self._thread.start()
+
+
+buffer = ScanBuffer()
+
+
+def init_app(app):
+    """
+    Configure the buffer from SCAN_FLUSH_* settings. The background flusher
+    starts with the first buffered scan, not here, so CLI commands and
+    scripts that import the app do not spawn it.
+    """
+    buffer.batch_size = max(1, app.config.get('SCAN_FLUSH_BATCH_SIZE', 500))
+    buffer.interval = max(0.1, app.config.get('SCAN_FLUSH_INTERVAL', 2.0))
+    buffer.app = app
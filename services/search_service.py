@@ -0,0 +1,486 @@
+"""
+Product Search Module
+Pluggable indexed product search: SQLite FTS5, Postgres pg_trgm, or an
+in-memory trigram index when neither is available
+"""
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import islice
+import re
+import threading
+
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db
+from models.product import Product
+from services import data_version
+
+
+# Matches the memory backend ranks individually in SQL; further listing matches tie after them
+MEMORY_MAX_CANDIDATES = 1000
+
+# Matches ranked per type-ahead request, keeping latency flat for common terms
+TYPEAHEAD_CANDIDATES = 200
+
+_PENDING_KEY = 'search_pending'
+
+
+def sku_prefix_clause(term):
+    """
+    Index-friendly SKU prefix test: a range scan on the unique SKU index
+    instead of LIKE, which neither SQLite nor Postgres can always index.
+    """
+    prefix = term.strip().upper()
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return db.and_(Product.sku >= prefix, Product.sku < upper)
+
+
+def looks_like_sku(term):
+    return bool(term) and ' ' not in term.strip() and any(ch.isdigit() or ch == '-' for ch in term)
+
+
+def escape_like(term):
+    """Escape LIKE wildcards so term matches literally (use with escape='\\')."""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class SearchBackend(ABC):
+    """
+    Interface for search backends.
+    apply() narrows a Product query to matches of term and returns
+    (query, rank_expr); ordering by rank_expr ascending gives best matches first.
+    candidate_limit, when given, bounds how many matches are ranked (type-ahead
+    trades exhaustive ranking for a fixed cost on very common terms).
+    """
+    name = 'base'
+
+    def setup(self):
+        pass
+
+    @abstractmethod
+    def apply(self, query, term, candidate_limit=None):
+        """Return (query narrowed to matches of term, rank_expr)."""
+
+    def rebuild(self):
+        pass
+
+
+class LikeBackend(SearchBackend):
+    """Unindexed ILIKE scan; the original behaviour, kept as a last resort."""
+    name = 'like'
+
+    def apply(self, query, term, candidate_limit=None):
+        literal = escape_like(term)
+        query = query.filter(db.or_(
+            Product.name.ilike(f'%{literal}%', escape='\\'),
+            Product.sku.ilike(f'%{literal}%', escape='\\')
+        ))
+        rank = db.case((Product.sku.ilike(f'{literal}%', escape='\\'), 0),
+                       (Product.name.ilike(f'{literal}%', escape='\\'), 1), else_=2)
+        return query, rank
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    FTS5 external-content table over products(sku, name), kept in sync by
+    triggers so every write path (ORM, bulk insert, raw SQL) is covered.
+    The trigram tokenizer keeps the LIKE backend's substring semantics
+    ("board" finds "Keyboard"); each word of the term must occur in the SKU
+    or name, and matches are ranked by bm25. Trigrams cannot index words
+    shorter than three characters, so those are matched with LIKE.
+    """
+    name = 'fts5'
+
+    TABLE_DDL = (
+        "CREATE VIRTUAL TABLE product_search USING fts5("
+        "sku, name, content='products', content_rowid='id', tokenize='trigram')"
+    )
+
+    DDL = [
+        "CREATE TRIGGER IF NOT EXISTS products_search_ai AFTER INSERT ON products BEGIN "
+        "INSERT INTO product_search(rowid, sku, name) VALUES (new.id, new.sku, new.name); END",
+        "CREATE TRIGGER IF NOT EXISTS products_search_ad AFTER DELETE ON products BEGIN "
+        "INSERT INTO product_search(product_search, rowid, sku, name) VALUES ('delete', old.id, old.sku, old.name); END",
+        "CREATE TRIGGER IF NOT EXISTS products_search_au AFTER UPDATE OF sku, name ON products BEGIN "
+        "INSERT INTO product_search(product_search, rowid, sku, name) VALUES ('delete', old.id, old.sku, old.name); "
+        "INSERT INTO product_search(rowid, sku, name) VALUES (new.id, new.sku, new.name); END",
+    ]
+
+    def setup(self):
+        with db.engine.begin() as conn:
+            existing = conn.execute(db.text(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'product_search'"
+            )).scalar()
+            if existing and 'trigram' not in existing:
+                # Index from before the trigram tokenizer: token-prefix matching only
+                conn.execute(db.text("DROP TABLE product_search"))
+                existing = None
+            if not existing:
+                conn.execute(db.text(self.TABLE_DDL))
+            for stmt in self.DDL:
+                conn.execute(db.text(stmt))
+            if not existing:
+                conn.execute(db.text("INSERT INTO product_search(product_search) VALUES ('rebuild')"))
+
+    def rebuild(self):
+        with db.engine.begin() as conn:
+            conn.execute(db.text("INSERT INTO product_search(product_search) VALUES ('rebuild')"))
+
+    @staticmethod
+    def match_expression(term):
+        # Each word of three or more characters becomes a quoted phrase, which
+        # the trigram tokenizer matches anywhere in the SKU or name, so
+        # "usb hub" matches "USB-C Hub" and "board" matches "Cardboard Box".
+        words = [w.replace('"', '""') for w in term.split() if len(w) >= 3]
+        return ' '.join(f'"{w}"' for w in words)
+
+    def apply(self, query, term, candidate_limit=None):
+        expr = self.match_expression(term)
+        if not expr:
+            return LikeBackend().apply(query, term, candidate_limit)
+        for word in term.split():
+            if len(word) < 3:
+                literal = escape_like(word)
+                query = query.filter(db.or_(Product.name.ilike(f'%{literal}%', escape='\\'),
+                                            Product.sku.ilike(f'%{literal}%', escape='\\')))
+        fts = db.table('product_search', db.column('rowid'), db.column('rank'))
+        matches = db.select(fts.c.rowid.label('product_id'), fts.c.rank.label('rank')).where(
+            db.text('product_search MATCH :match_expr').bindparams(match_expr=expr)
+        )
+        if candidate_limit:
+            # Keep the best-ranked candidates, not the first ones the index yields
+            matches = matches.order_by(fts.c.rank).limit(candidate_limit)
+        matches = matches.subquery()
+        query = query.join(matches, matches.c.product_id == Product.id)
+        return query, matches.c.rank
+
+
+class PostgresTrigramBackend(SearchBackend):
+    """
+    pg_trgm GIN indexes on name and sku accelerate the substring ILIKE,
+    ranked by trigram similarity. Postgres maintains the indexes itself.
+    """
+    name = 'pg_trgm'
+
+    DDL = [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_products_sku_trgm ON products USING gin (sku gin_trgm_ops)",
+    ]
+
+    def setup(self):
+        with db.engine.begin() as conn:
+            for stmt in self.DDL:
+                conn.execute(db.text(stmt))
+
+    def apply(self, query, term, candidate_limit=None):
+        literal = escape_like(term)
+        query = query.filter(db.or_(
+            Product.name.ilike(f'%{literal}%', escape='\\'),
+            Product.sku.ilike(f'%{literal}%', escape='\\')
+        ))
+        similarity = db.func.greatest(
+            db.func.similarity(Product.name, term),
+            db.func.similarity(Product.sku, term)
+        )
+        prefix_boost = db.case((Product.sku.ilike(f'{literal}%', escape='\\'), 1.0), else_=0.0)
+        return query, -(similarity + prefix_boost)
+
+
+class MemoryTrigramBackend(SearchBackend):
+    """
+    Pure-Python trigram index of (sku, name) held per process, plus a sorted
+    word list for short prefixes. Kept current from this process's commits;
+    changes made by other workers are detected through the products data
+    version and pulled incrementally.
+    """
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._docs = {}                     # id -> (sku_lower, name_lower)
+        self._grams = defaultdict(set)      # trigram -> {id}
+        self._words = []                    # sorted [(word, id)] from sku and name
+        self._expected_version = None
+        self._synced_at = None
+
+    @staticmethod
+    def trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    @staticmethod
+    def words(sku, name):
+        return {w for w in re.split(r'[^0-9a-z]+', f'{sku} {name}') if w} | {sku}
+
+    def setup(self):
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+        data_version.on_commit(self._on_commit)
+
+    # ---- index maintenance ----
+
+    def _index(self, pid, sku, name, sort=True):
+        sku, name = (sku or '').lower(), (name or '').lower()
+        self._docs[pid] = (sku, name)
+        for gram in self.trigrams(sku) | self.trigrams(name):
+            self._grams[gram].add(pid)
+        for word in self.words(sku, name):
+            if sort:
+                insort(self._words, (word, pid))
+            else:
+                self._words.append((word, pid))
+
+    def _add(self, pid, sku, name):
+        self._remove(pid)
+        self._index(pid, sku, name)
+
+    def _remove(self, pid):
+        doc = self._docs.pop(pid, None)
+        if doc is None:
+            return
+        sku, name = doc
+        for gram in self.trigrams(sku) | self.trigrams(name):
+            ids = self._grams.get(gram)
+            if ids:
+                ids.discard(pid)
+                if not ids:
+                    del self._grams[gram]
+        for word in self.words(sku, name):
+            i = bisect_left(self._words, (word, pid))
+            if i < len(self._words) and self._words[i] == (word, pid):
+                del self._words[i]
+
+    def rebuild(self):
+        with self._lock:
+            version = data_version.get_versions('products').get('products', (0, None))[0]
+            started = datetime.utcnow()
+            rows = db.session.query(Product.id, Product.sku, Product.name).all()
+            self._docs.clear()
+            self._grams.clear()
+            self._words = []
+            for pid, sku, name in rows:
+                self._index(pid, sku, name, sort=False)
+            self._words.sort()
+            self._expected_version = version
+            self._synced_at = started
+            self._built = True
+
+    def _sync(self):
+        """Pull rows changed by other processes since the last sync."""
+        version = data_version.get_versions('products').get('products', (0, None))[0]
+        started = datetime.utcnow()
+        rows = db.session.query(Product.id, Product.sku, Product.name).filter(
+            Product.updated_at >= self._synced_at - timedelta(seconds=5)
+        ).all()
+        total = db.session.query(db.func.count(Product.id)).scalar()
+        with self._lock:
+            for pid, sku, name in rows:
+                self._add(pid, sku, name)
+            if total != len(self._docs):
+                # Deletions cannot be seen incrementally
+                self.rebuild()
+                return
+            self._expected_version = version
+            self._synced_at = started
+
+    def _ensure_current(self):
+        if not self._built:
+            self.rebuild()
+            return
+        current = data_version.get_versions('products').get('products', (0, None))[0]
+        if current != self._expected_version:
+            self._sync()
+
+    # ---- session hooks ----
+
+    def _after_flush(self, session, flush_context):
+        pending = session.info.setdefault(_PENDING_KEY, {})
+        for obj in session.new:
+            if isinstance(obj, Product):
+                pending[obj.id] = (obj.sku, obj.name)
+        for obj in session.dirty:
+            if isinstance(obj, Product):
+                attrs = inspect(obj).attrs
+                if attrs.sku.history.has_changes() or attrs.name.history.has_changes():
+                    pending[obj.id] = (obj.sku, obj.name)
+        for obj in session.deleted:
+            if isinstance(obj, Product):
+                pending[obj.id] = None
+
+    def _after_rollback(self, session):
+        session.info.pop(_PENDING_KEY, None)
+
+    def _on_commit(self, session, domains):
+        pending = session.info.pop(_PENDING_KEY, None)
+        if not self._built or 'products' not in domains:
+            return
+        with self._lock:
+            for pid, doc in (pending or {}).items():
+                if doc is None:
+                    self._remove(pid)
+                else:
+                    self._add(pid, *doc)
+            if self._expected_version is not None:
+                self._expected_version += 1
+
+    def queue(self, session, rows):
+        """Announce products written without ORM objects: rows of (id, sku, name)."""
+        pending = session.info.setdefault(_PENDING_KEY, {})
+        for pid, sku, name in rows:
+            pending[pid] = (sku, name)
+
+    # ---- querying ----
+
+    def _word_prefix(self, prefix, cap):
+        ids = set()
+        i = bisect_left(self._words, (prefix,))
+        while i < len(self._words) and self._words[i][0].startswith(prefix):
+            ids.add(self._words[i][1])
+            if cap and len(ids) >= cap:
+                break
+            i += 1
+        return ids
+
+    def _postings(self, word, cap):
+        if len(word) < 3:
+            return [self._word_prefix(word, cap)]
+        return [self._grams.get(g, set()) for g in self.trigrams(word)]
+
+    def search(self, term, candidate_limit=None):
+        """
+        Ranked product ids whose SKU or name contains every word of term
+        (words shorter than three characters must start a word). Without
+        candidate_limit every match is returned; with it (type-ahead) at most
+        that many, from bounded posting lists.
+        """
+        self._ensure_current()
+        q = term.strip().lower()
+        words = q.split()
+        if not words:
+            return []
+        with self._lock:
+            cap = candidate_limit * 10 if candidate_limit else None
+            postings = sorted((p for word in words for p in self._postings(word, cap)), key=len)
+            smallest, rest = postings[0], postings[1:]
+            if candidate_limit:
+                # Walk the rarest posting list and stop once enough matches are found
+                candidates = []
+                for pid in smallest:
+                    if all(pid in other for other in rest):
+                        candidates.append(pid)
+                        if len(candidates) >= candidate_limit:
+                            break
+            else:
+                candidates = smallest.intersection(*rest)
+
+            scored = []
+            for pid in candidates:
+                sku, name = self._docs[pid]
+                text = f'{sku} {name}'
+                if not all(w in text for w in words):
+                    continue
+                if sku.startswith(q):
+                    score = 0
+                elif name.startswith(q):
+                    score = 1
+                elif re.search(r'\b' + re.escape(words[0]), name):
+                    score = 2
+                else:
+                    score = 3
+                scored.append((score, len(name), pid))
+        scored.sort()
+        return [pid for _, _, pid in scored]
+
+    def apply(self, query, term, candidate_limit=None):
+        ids = self.search(term, candidate_limit=candidate_limit)
+        if not ids:
+            return query.filter(db.false()), Product.id
+        ranked = ids[:MEMORY_MAX_CANDIDATES]
+        rank = db.case({pid: i for i, pid in enumerate(ranked)}, value=Product.id, else_=len(ranked))
+        if len(ids) <= MEMORY_MAX_CANDIDATES:
+            return query.filter(Product.id.in_(ids)), rank
+        # A listing of a common term: inline the ids rather than bind one
+        # parameter each, which would exceed SQLite's and Postgres's limits
+        return query.filter(Product.id.in_(db.bindparam('search_ids', ids, expanding=True, literal_execute=True))), rank
+
+
+_backend = None
+
+
+def get_backend():
+    return _backend or LikeBackend()
+
+
+def queue_products(session, rows):
+    """Tell in-process indexes about products inserted/updated outside the ORM."""
+    if isinstance(_backend, MemoryTrigramBackend):
+        _backend.queue(session, rows)
+
+
+def apply_search(query, term, candidate_limit=None):
+    """Filter a Product query to matches of term; returns (query, rank_expr)."""
+    return get_backend().apply(query, term.strip(), candidate_limit=candidate_limit)
+
+
+def typeahead(term, limit=10):
+    """
+    Fast suggestions: exact SKU-prefix hits via the unique SKU index first,
+    then ranked matches from the active backend. Returns [{id, sku, name, quantity}].
+    """
+    term = term.strip()
+    if not term:
+        return []
+    columns = (Product.id, Product.sku, Product.name, Product.quantity)
+    results, seen = [], set()
+    if looks_like_sku(term):
+        rows = db.session.query(*columns).filter(
+            sku_prefix_clause(term)
+        ).order_by(Product.sku).limit(limit).all()
+        for row in rows:
+            seen.add(row.id)
+            results.append(dict(row._mapping))
+
+    if len(results) < limit:
+        query, rank = apply_search(db.session.query(*columns), term, candidate_limit=TYPEAHEAD_CANDIDATES)
+        if seen:
+            query = query.filter(Product.id.notin_(seen))
+        for row in query.order_by(rank, Product.id).limit(limit - len(results)).all():
+            results.append(dict(row._mapping))
+    return results
+
+
+def init_app(app):
+    """Pick and initialise the search backend (SEARCH_BACKEND: auto, fts5, pg_trgm, memory, like)."""
+    global _backend
+    choice = app.config.get('SEARCH_BACKEND', 'auto')
+
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        if choice == 'auto':
+            candidates = {'sqlite': ['fts5', 'memory'], 'postgresql': ['pg_trgm', 'memory']}.get(dialect, ['memory'])
+        else:
+            candidates = [choice]
+
+        classes = {
+            'fts5': SQLiteFTSBackend,
+            'pg_trgm': PostgresTrigramBackend,
+            'memory': MemoryTrigramBackend,
+            'like': LikeBackend,
+        }
+        for name in candidates:
+            backend = classes.get(name, LikeBackend)()
+            try:
+                backend.setup()
+            except SQLAlchemyError:
+                app.logger.warning('Search backend %s unavailable, trying next', name)
+                continue
+            _backend = backend
+            break
+        else:
+            _backend = LikeBackend()
+
+        app.logger.info('Product search backend: %s', _backend.name)
@@ -0,0 +1,387 @@
+"""
+Stock Service Module
+Atomic stock mutations and bulk adjustments, each recorded as Transaction rows
+"""
+from datetime import datetime
+
+from flask import jsonify
+from sqlalchemy import case, or_, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from models import db
+from models.product import Product
+from models.transaction import Transaction
+from services.event_bus import queue_event, stock_events
+from services.occupancy import shift_units
+
+
+# Compare-and-set attempts before a stock update gives up under contention
+MAX_RETRIES = 5
+
+# Products per set-based UPDATE; databases evaluate a CASE's branches one by one
+CASE_CHUNK_SIZE = 500
+
+
+def chunked(mapping, size=CASE_CHUNK_SIZE):
+    """Split {key: value} into dicts of at most `size` entries for UPDATE ... CASE statements."""
+    items = list(mapping.items())
+    for start in range(0, len(items), size):
+        yield dict(items[start:start + size])
+
+
+class InsufficientStockError(Exception):
+    """A delta would take on-hand (or unreserved) stock below its floor and clamping was not allowed."""
+
+    def __init__(self, message, product_ids=()):
+        self.product_ids = list(product_ids)
+        super().__init__(message)
+
+
+class StockConflictError(Exception):
+    """A compare-and-set stock update kept losing to concurrent writers."""
+
+
+class StockService:
+    """
+    Stock-level changes that are recorded as Transaction rows.
+
+    Quantities are never read into Python, changed and written back. Deltas
+    are applied by a single `UPDATE ... SET quantity = quantity + :delta`
+    guarded by the floor and returning the new value, so concurrent pickers
+    on the same SKU cannot lose each other's updates. The row lock taken by
+    that UPDATE lasts until the caller commits, so callers keep these
+    transactions short: the guarded UPDATE comes last, after any reads and
+    validation, and is followed only by the ledger insert and the commit.
+    Absolute sets (cycle counts, edits) and clamped deltas use
+    compare-and-set on the current quantity with bounded retry.
+    """
+
+    def __init__(self, db_session, created_by='System'):
+        self.db = db_session
+        self.created_by = created_by
+
+    # ---- atomic primitives ----
+
+    def _update_quantity(self, product_id, value, *conditions):
+        """Run a guarded quantity UPDATE; returns the new quantity or None if no row matched."""
+        table = Product.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == product_id, *conditions)
+            .values(quantity=value, updated_at=datetime.utcnow())
+        )
+        if self.db.get_bind(Product).dialect.update_returning:
+            row = self.db.execute(stmt.returning(table.c.quantity)).first()
+            return row[0] if row else None
+        if not self.db.execute(stmt).rowcount:
+            return None
+        # The UPDATE holds the row lock until commit, so this read sees our write
+        return self.db.execute(select(table.c.quantity).where(table.c.id == product_id)).scalar()
+
+    def _current_quantity(self, product_id, free=False):
+        table = Product.__table__
+        column = table.c.quantity - table.c.reserved_quantity if free else table.c.quantity
+        return self.db.execute(select(column).where(table.c.id == product_id)).scalar()
+
+    def _record(self, product_id, before, after, transaction_type, reference_type=None, reference_id=None,
+                reason=None, notes=None):
+        # Keep an already-loaded Product in step with the row we just wrote
+        product = self.db.identity_map.get(identity_key(Product, product_id))
+        if product is not None:
+            set_committed_value(product, 'quantity', after)
+        shift_units(self.db, {product_id: after - before})
+
+        trans = Transaction(
+            product_id=product_id,
+            transaction_type=transaction_type or ('IN' if after > before else 'OUT'),
+            quantity=after - before,
+            quantity_before=before,
+            quantity_after=after,
+            reference_type=reference_type,
+            reference_id=reference_id,
+            reason=reason,
+            notes=notes,
+            created_by=self.created_by
+        )
+        self.db.add(trans)
+        return trans
+
+    def apply_delta(self, product_id, delta, transaction_type=None, floor=0, clamp=True, free=False, **fields):
+        """
+        Atomically add delta to a product's quantity and record the Transaction.
+
+        If the result would fall below floor, the quantity is clamped to floor
+        (clamp=True, the historical behaviour of adjustments) or
+        InsufficientStockError is raised. With free=True the floor applies to
+        the unreserved stock (quantity - reserved_quantity) and nothing is
+        clamped, so a pick can never take units other orders hold. Returns the
+        Transaction, or None when nothing changed or the product does not exist.
+        """
+        if not delta:
+            return None
+        table = Product.__table__
+        available = table.c.quantity - table.c.reserved_quantity if free else table.c.quantity
+        # Only decreases are guarded; receipts always apply in full
+        guard = [available + delta >= floor] if delta < 0 else []
+
+        for _ in range(MAX_RETRIES):
+            after = self._update_quantity(product_id, table.c.quantity + delta, *guard)
+            if after is not None:
+                return self._record(product_id, after - delta, after, transaction_type, **fields)
+
+            current = self._current_quantity(product_id, free)
+            if current is None:
+                return None
+            if current + delta >= floor:
+                # Stock arrived after the guarded update missed; retry it
+                continue
+            if not clamp or free:
+                raise InsufficientStockError(f'Insufficient stock for product {product_id}', [product_id])
+            target = min(current, floor)
+            if target == current:
+                return None
+            if self._update_quantity(product_id, target, table.c.quantity == current) is not None:
+                return self._record(product_id, current, target, transaction_type, **fields)
+        raise StockConflictError(f'Stock for product {product_id} changed concurrently')
+
+    def set_quantity(self, product_id, quantity, expected=None, transaction_type='ADJUST', **fields):
+        """
+        Set an absolute quantity (cycle count, manual edit) with compare-and-set.
+        `expected` is the caller's last-read quantity and saves a read on the
+        first attempt. Returns the Transaction, or None when nothing changed.
+        """
+        current = expected
+        for _ in range(MAX_RETRIES):
+            if current is None:
+                current = self._current_quantity(product_id)
+                if current is None:
+                    return None
+            if current == quantity:
+                return None
+            if self._update_quantity(product_id, quantity, Product.__table__.c.quantity == current) is not None:
+                return self._record(product_id, current, quantity, transaction_type, **fields)
+            current = None
+        raise StockConflictError(f'Stock for product {product_id} changed concurrently')
+
+    def add_stock_many(self, lines, transaction_type='IN', **fields):
+        """
+        Apply many stock increases with one set-based UPDATE and bulk-insert
+        their Transaction rows.
+
+        lines is a list of (product_id, quantity, line_fields) with quantity > 0;
+        line_fields are merged over fields for that line's Transaction. All
+        products are updated by a single `UPDATE ... SET quantity = quantity +
+        CASE id ... END ... RETURNING`, and each line's before/after is derived
+        from the returned quantity, so several lines for one product chain in
+        order. Lines for products that no longer exist are skipped. Returns the
+        inserted Transaction mappings.
+        """
+        return self._apply_many(lines, 1, transaction_type, fields)
+
+    def remove_stock_many(self, lines, transaction_type='OUT', **fields):
+        """
+        The decreasing counterpart of add_stock_many (bulk picks). The UPDATE
+        is guarded by each product's unreserved stock (quantity -
+        reserved_quantity), so callers consume their own orders' reservations
+        first (AllocationService.consume_many) and only units nobody else
+        holds can leave. Nothing is clamped: if any product is short,
+        InsufficientStockError is raised with its product_ids and the caller
+        must roll back. Returns the recorded Transaction mappings / objects.
+        """
+        return self._apply_many(lines, -1, transaction_type, fields)
+
+    def _apply_many(self, lines, sign, transaction_type, fields):
+        totals = {}
+        for product_id, quantity, _ in lines:
+            if quantity <= 0:
+                raise ValueError('Bulk stock lines take positive quantities')
+            totals[product_id] = totals.get(product_id, 0) + quantity
+        if not totals:
+            return []
+
+        table = Product.__table__
+        returned = (table.c.id, table.c.quantity, table.c.sku, table.c.name, table.c.min_stock,
+                    table.c.location_id, table.c.weight)
+        returning = self.db.get_bind(Product).dialect.update_returning
+        rows = []
+        for chunk in chunked(totals):
+            amount = case(chunk, value=table.c.id, else_=0)
+            stmt = (
+                update(table)
+                .where(table.c.id.in_(chunk))
+                .values(quantity=table.c.quantity + amount if sign > 0 else table.c.quantity - amount,
+                        updated_at=datetime.utcnow())
+            )
+            if sign < 0:
+                stmt = stmt.where(table.c.quantity - table.c.reserved_quantity >= amount)
+            if returning:
+                rows.extend(self.db.execute(stmt.returning(*returned)))
+            elif sign > 0:
+                self.db.execute(stmt)
+                rows.extend(self.db.execute(select(*returned).where(table.c.id.in_(chunk))))
+            # Without RETURNING guarded decrements cannot be told apart; they go one by one below
+
+        products = {row.id: row for row in rows}
+        if sign < 0 and returning:
+            missed = [pid for pid in totals if pid not in products]
+            short = self.db.execute(select(table.c.id).where(table.c.id.in_(missed))).scalars().all() \
+                if missed else []
+            if short:
+                raise InsufficientStockError(
+                    f'Insufficient unreserved stock for product {", ".join(map(str, sorted(short)))}', short)
+        running = {pid: row.quantity - sign * totals[pid] for pid, row in products.items()}
+        for pid, row in products.items():
+            product = self.db.identity_map.get(identity_key(Product, pid))
+            if product is not None:
+                set_committed_value(product, 'quantity', row.quantity)
+        shift_units(self.db, {pid: sign * totals[pid] for pid in products},
+                    {pid: (row.location_id, row.weight) for pid, row in products.items()})
+
+        now = datetime.utcnow()
+        transactions = []
+        for product_id, quantity, line_fields in lines:
+            trans = dict(fields, **(line_fields or {}))
+            if product_id not in products:
+                if sign < 0 and not returning:
+                    recorded = self.apply_delta(product_id, -quantity, transaction_type, free=True, **trans)
+                    if recorded is not None:
+                        transactions.append(recorded)
+                continue
+            before = running[product_id]
+            after = running[product_id] = before + sign * quantity
+            trans.update(product_id=product_id, transaction_type=transaction_type, quantity=sign * quantity,
+                         quantity_before=before, quantity_after=after,
+                         created_by=self.created_by, created_at=now)
+            transactions.append(trans)
+
+            row = products[product_id]
+            for event_type, data in stock_events(product_id, row.sku, row.name, row.min_stock, transaction_type,
+                                                 sign * quantity, before, after,
+                                                 trans.get('reference_type'), trans.get('reference_id')):
+                queue_event(self.db, event_type, data)
+
+        mappings = [t for t in transactions if isinstance(t, dict)]
+        if mappings:
+            self.db.execute(Transaction.__table__.insert(), mappings)
+        return transactions
+
+    # ---- bulk adjustments ----
+
+    @staticmethod
+    def _parse_item(item):
+        """Normalise one adjustment entry; returns (key, mode, amount, reason, notes) or raises ValueError."""
+        if not isinstance(item, dict):
+            raise ValueError('Entry must be an object')
+
+        if item.get('product_id') is not None:
+            try:
+                key = ('id', int(item['product_id']))
+            except (TypeError, ValueError):
+                raise ValueError(f'Invalid product_id "{item["product_id"]}"')
+        elif item.get('sku'):
+            key = ('sku', str(item['sku']).strip())
+        else:
+            raise ValueError('product_id or sku is required')
+
+        has_delta = item.get('delta') is not None
+        has_counted = item.get('counted') is not None
+        if has_delta == has_counted:
+            raise ValueError('Exactly one of delta or counted is required')
+
+        mode = 'delta' if has_delta else 'counted'
+        raw = item[mode]
+        if isinstance(raw, bool) or not isinstance(raw, (int, str)):
+            raise ValueError(f'Invalid {mode} "{raw}"')
+        try:
+            amount = int(raw)
+        except ValueError:
+            raise ValueError(f'Invalid {mode} "{raw}"')
+        if mode == 'counted' and amount < 0:
+            raise ValueError('counted cannot be negative')
+
+        return (key, mode, amount, item.get('reason'), item.get('notes'))
+
+    def bulk_adjust(self, items, reason='Bulk adjustment', notes=''):
+        """
+        Apply a list of adjustments as one unit of work.
+
+        Each entry names a product by product_id or sku and gives either a
+        signed `delta` or the `counted` on-hand quantity from a cycle count.
+        All targets are resolved in one query, entries for the same product are
+        applied in order through the atomic primitives above, and every
+        resulting Transaction row is committed together. If any entry is invalid nothing is written and
+        (None, errors) is returned; otherwise (summary, None).
+        """
+        parsed, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                parsed.append((index,) + self._parse_item(item))
+            except ValueError as e:
+                errors.append({'index': index, 'error': str(e)})
+        if errors:
+            return None, errors
+
+        ids = {entry[1][1] for entry in parsed if entry[1][0] == 'id'}
+        skus = {entry[1][1] for entry in parsed if entry[1][0] == 'sku'}
+        clauses = []
+        if ids:
+            clauses.append(Product.id.in_(ids))
+        if skus:
+            clauses.append(Product.sku.in_(skus))
+        products = self.db.query(Product).filter(or_(*clauses)).all() if clauses else []
+        by_id = {p.id: p for p in products}
+        by_sku = {p.sku: p for p in products}
+
+        def target(key):
+            return by_id.get(key[1]) if key[0] == 'id' else by_sku.get(key[1])
+
+        for index, key, *_ in parsed:
+            if target(key) is None:
+                errors.append({'index': index, 'error': f'Product {key[1]} not found'})
+        if errors:
+            return None, errors
+
+        summary = {'entries': len(parsed), 'adjusted': 0, 'unchanged': 0, 'transactions': 0,
+                   'net_change': 0, 'results': []}
+        try:
+            # Transactions are inserted together at commit, not one by one before each UPDATE
+            with self.db.no_autoflush:
+                for index, key, mode, amount, item_reason, item_notes in parsed:
+                    product = target(key)
+                    fields = {'reason': item_reason or reason, 'notes': item_notes or notes}
+                    if mode == 'counted':
+                        trans = self.set_quantity(product.id, amount, expected=product.quantity,
+                                                  reference_type='cycle_count', **fields)
+                    else:
+                        trans = self.apply_delta(product.id, amount, reference_type='adjustment', **fields)
+
+                    change = trans.quantity if trans else 0
+                    summary['results'].append({'index': index, 'product_id': product.id, 'sku': product.sku,
+                                               'quantity_before': product.quantity - change,
+                                               'quantity_after': product.quantity, 'change': change})
+                    if trans:
+                        summary['adjusted'] += 1
+                        summary['transactions'] += 1
+                        summary['net_change'] += change
+                    else:
+                        summary['unchanged'] += 1
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        return summary, None
+
+
+def init_app(app):
+    """Answer requests that lost a stock race (compare-and-set or a guarded pick) with 409 Conflict."""
+    @app.errorhandler(StockConflictError)
+    def _stock_conflict(error):
+        db.session.rollback()
+        return jsonify({'error': str(error)}), 409
+
+    @app.errorhandler(InsufficientStockError)
+    def _insufficient_stock(error):
+        db.session.rollback()
+        return jsonify({'error': str(error), 'product_ids': error.product_ids}), 409
@@ -0,0 +1,306 @@
+"""
+Wave Planning Module
+Batches open shipment orders into pick waves with location-ordered serpentine pick paths
+"""
+from collections import defaultdict
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import select
+
+from models.product import Product
+from models.location import Location
+from models.order import ShipmentOrder, ShipmentOrderItem
+from models.wave import PickWave
+from services.allocation import AllocationService, AllocationError
+from services.numbering import next_wave_number
+from services.stock_service import StockService
+
+
+# Shipment orders that can be pulled into a wave
+WAVEABLE_STATUSES = ('draft', 'picking')
+
+DEFAULT_MAX_ORDERS = 200
+
+UNASSIGNED_ZONE = 'UNASSIGNED'
+
+
+def natural_key(value):
+    """Sort location codes numerically when they are numbers ('2' before '10'), textually otherwise."""
+    value = (value or '').strip()
+    return (0, int(value), '') if value.isdigit() else (1, 0, value)
+
+
+def _location_key(stop):
+    return (natural_key(stop['aisle']), natural_key(stop['rack']),
+            natural_key(stop['shelf']), natural_key(stop['bin']))
+
+
+def serpentine(stops):
+    """
+    Order pick stops into a walking path per zone.
+
+    Stops are sorted once by (aisle, rack, shelf, bin); aisles are then
+    walked in order and every second aisle is traversed with its racks in
+    reverse, so the picker snakes up one aisle and down the next instead of
+    returning to the front each time. Stops without a location go last
+    under UNASSIGNED. Returns [{'zone', 'stops'}] with a running sequence.
+    """
+    located = sorted((s for s in stops if s['zone']), key=lambda s: (natural_key(s['zone']), _location_key(s)))
+    zones = []
+    sequence = 0
+    for zone, zone_stops in groupby(located, key=lambda s: s['zone']):
+        path = []
+        for index, (_, aisle_stops) in enumerate(groupby(zone_stops, key=lambda s: natural_key(s['aisle']))):
+            racks = [list(rack_stops) for _, rack_stops in groupby(aisle_stops, key=lambda s: natural_key(s['rack']))]
+            if index % 2:
+                racks.reverse()
+            for rack_stops in racks:
+                path.extend(rack_stops)
+        for stop in path:
+            sequence += 1
+            stop['sequence'] = sequence
+        zones.append({'zone': zone, 'stops': path})
+
+    unassigned = sorted((s for s in stops if not s['zone']), key=lambda s: s['product_sku'] or '')
+    if unassigned:
+        for stop in unassigned:
+            sequence += 1
+            stop['sequence'] = sequence
+        zones.append({'zone': UNASSIGNED_ZONE, 'stops': unassigned})
+    return zones
+
+
+class WavePlanner:
+    """
+    Creates pick waves from open shipment orders and turns them into one
+    aggregated, location-ordered pick list.
+
+    A wave's lines are read with a single joined query (order lines,
+    products and locations), aggregated per product in memory and ordered
+    with one sort, so planning cost grows with the number of lines rather
+    than with round trips.
+    """
+
+    def __init__(self, db_session):
+        self.db = db_session
+
+    # ---- creation ----
+
+    def create_wave(self, order_ids=None, max_orders=DEFAULT_MAX_ORDERS, notes=None):
+        """
+        Pull up to max_orders open orders (oldest first, or the given ids)
+        that are not in a wave yet, reserve their stock and move them to
+        picking. Orders that cannot be reserved in full are skipped.
+        Returns (wave, skipped); wave is None when no order qualified.
+        The caller commits.
+        """
+        query = (
+            ShipmentOrder.query
+            .filter(ShipmentOrder.status.in_(WAVEABLE_STATUSES), ShipmentOrder.wave_id.is_(None))
+            .order_by(ShipmentOrder.created_at, ShipmentOrder.id)
+        )
+        if order_ids:
+            query = query.filter(ShipmentOrder.id.in_(order_ids))
+        orders = query.limit(max_orders).all()
+        if not orders:
+            return None, []
+
+        items_by_order = defaultdict(list)
+        for item in ShipmentOrderItem.query.filter(ShipmentOrderItem.order_id.in_([o.id for o in orders])):
+            items_by_order[item.order_id].append(item)
+
+        allocation = AllocationService(self.db)
+        waved = []
+        skipped = []
+        for order in orders:
+            items = items_by_order.get(order.id, [])
+            if not items:
+                skipped.append({'order_id': order.id, 'so_number': order.so_number, 'error': 'Order has no lines'})
+                continue
+            # A short order's partial reservation (non-RETURNING databases) is undone with its savepoint
+            savepoint = self.db.begin_nested()
+            try:
+                allocation.reserve_order(order, items)
+            except AllocationError as e:
+                savepoint.rollback()
+                skipped.append({'order_id': order.id, 'so_number': order.so_number,
+                                'error': str(e), 'shortages': e.shortages})
+                continue
+            savepoint.commit()
+            waved.append(order)
+
+        if not waved:
+            return None, skipped
+
+        wave = PickWave(wave_number=next_wave_number(), status='open', notes=notes)
+        self.db.add(wave)
+        self.db.flush()
+        for order in waved:
+            order.status = 'picking'
+            order.wave_id = wave.id
+        return wave, skipped
+
+    # ---- planning ----
+
+    def _wave_lines(self, wave_id):
+        item = ShipmentOrderItem.__table__
+        order = ShipmentOrder.__table__
+        product = Product.__table__
+        location = Location.__table__
+        return self.db.execute(
+            select(item.c.id, item.c.order_id, item.c.product_id, item.c.quantity, item.c.picked_quantity,
+                   order.c.so_number, product.c.sku, product.c.name, product.c.unit,
+                   location.c.id.label('location_id'), location.c.zone, location.c.aisle, location.c.rack,
+                   location.c.shelf, location.c.bin)
+            .join(order, order.c.id == item.c.order_id)
+            .join(product, product.c.id == item.c.product_id)
+            .outerjoin(location, location.c.id == product.c.location_id)
+            .where(order.c.wave_id == wave_id, order.c.status == 'picking')
+            .order_by(order.c.created_at, order.c.id, item.c.id)
+        ).all()
+
+    def pick_list(self, wave):
+        """
+        The wave's outstanding quantities, one stop per product in serpentine
+        order, each with the order lines it fills (for sorting to orders).
+        """
+        stops = {}
+        total_lines = 0
+        for row in self._wave_lines(wave.id):
+            outstanding = row.quantity - (row.picked_quantity or 0)
+            if outstanding <= 0:
+                continue
+            total_lines += 1
+            stop = stops.get(row.product_id)
+            if stop is None:
+                stop = stops[row.product_id] = {
+                    'product_id': row.product_id,
+                    'product_sku': row.sku,
+                    'product_name': row.name,
+                    'unit': row.unit,
+                    'location_id': row.location_id,
+                    'location': (f'{row.zone}-{row.aisle}-{row.rack}-{row.shelf}-{row.bin}'
+                                 if row.location_id else None),
+                    'zone': row.zone,
+                    'aisle': row.aisle,
+                    'rack': row.rack,
+                    'shelf': row.shelf,
+                    'bin': row.bin,
+                    'quantity': 0,
+                    'orders': [],
+                }
+            stop['quantity'] += outstanding
+            stop['orders'].append({'order_id': row.order_id, 'so_number': row.so_number,
+                                   'item_id': row.id, 'quantity': outstanding})
+
+        zones = serpentine(list(stops.values()))
+        return {
+            'wave': wave.to_dict(),
+            'total_lines': total_lines,
+            'total_units': sum(stop['quantity'] for stop in stops.values()),
+            'stop_count': len(stops),
+            'zones': zones,
+        }
+
+    # ---- confirmation ----
+
+    def confirm(self, wave, picks=None, created_by='System'):
+        """
+        Confirm picked quantities per product ({product_id, quantity}); with
+        no picks, everything outstanding is confirmed. Orders of the wave
+        that were cancelled or shipped meanwhile are left alone. Quantities are spread
+        over the wave's order lines oldest order first, reservations are
+        consumed and stock is decremented set-based with one OUT transaction
+        per order line. Fully picked orders become packed, and the wave
+        completes when all of them are.
+
+        All or nothing: returns (summary, errors) and writes nothing when
+        errors is non-empty. The caller commits.
+        """
+        orders = {order.id: order for order in wave.orders}
+        lines = defaultdict(list)
+        all_items = (
+            ShipmentOrderItem.query
+            .join(ShipmentOrder, ShipmentOrder.id == ShipmentOrderItem.order_id)
+            .filter(ShipmentOrder.wave_id == wave.id, ShipmentOrder.status == 'picking')
+            .order_by(ShipmentOrder.created_at, ShipmentOrder.id, ShipmentOrderItem.id)
+            .all()
+        )
+        for item in all_items:
+            lines[item.product_id].append(item)
+
+        if picks is None:
+            requested = {pid: sum(i.quantity - (i.picked_quantity or 0) for i in items)
+                         for pid, items in lines.items()}
+        else:
+            requested = defaultdict(int)
+            errors = []
+            for index, pick in enumerate(picks):
+                try:
+                    product_id = int(pick['product_id'])
+                    quantity = int(pick.get('quantity', 0))
+                except (KeyError, TypeError, ValueError):
+                    errors.append({'index': index, 'error': 'product_id and quantity must be integers'})
+                    continue
+                if product_id not in lines:
+                    errors.append({'index': index, 'error': f'Product {product_id} is not in this wave'})
+                elif quantity <= 0:
+                    errors.append({'index': index, 'error': 'quantity must be positive'})
+                else:
+                    requested[product_id] += quantity
+            for product_id, quantity in requested.items():
+                outstanding = sum(i.quantity - (i.picked_quantity or 0) for i in lines[product_id])
+                if quantity > outstanding:
+                    errors.append({'product_id': product_id,
+                                   'error': f'Picked {quantity} but only {outstanding} outstanding'})
+            if errors:
+                return None, errors
+
+        item_picks = []
+        for product_id, quantity in requested.items():
+            for item in lines[product_id]:
+                if not quantity:
+                    break
+                take = min(quantity, item.quantity - (item.picked_quantity or 0))
+                if take > 0:
+                    item.picked_quantity = (item.picked_quantity or 0) + take
+                    item_picks.append((item, take))
+                    quantity -= take
+
+        AllocationService(self.db).consume_many(item_picks)
+        StockService(self.db, created_by=created_by).remove_stock_many(
+            [(item.product_id, take, {'reference_id': item.order_id,
+                                      'notes': f'SO {orders[item.order_id].so_number} (wave {wave.wave_number})'})
+             for item, take in item_picks],
+            transaction_type='OUT',
+            reference_type='shipment_order',
+            reason='Picked for shipment'
+        )
+
+        items_by_order = defaultdict(list)
+        for item in all_items:
+            items_by_order[item.order_id].append(item)
+        packed = []
+        for order_id, items in items_by_order.items():
+            order = orders[order_id]
+            if order.status == 'picking' and all((i.picked_quantity or 0) >= i.quantity for i in items):
+                order.status = 'packed'
+                packed.append(order.so_number)
+
+        if all(order.status != 'picking' for order in orders.values()):
+            wave.status = 'completed'
+            wave.completed_at = datetime.utcnow()
+
+        return {
+            'wave': wave.to_dict(order_count=len(orders)),
+            'lines_picked': len(item_picks),
+            'units_picked': sum(take for _, take in item_picks),
+            'orders_packed': packed,
+        }, []
+
+    def cancel(self, wave):
+        """Dissolve an open wave; its orders stay in picking with their reservations."""
+        for order in wave.orders:
+            order.wave_id = None
+        wave.status = 'cancelled'
@@ -189,6 +189,82 @@ async function apiDelete(url) {
     }
 }
 
+// Fetch several GET endpoints in one round trip; resolves to {id: body}
+async function apiBatch(requests, parallel = false) {
+    const payload = Object.entries(requests).map(([id, path]) => ({ id, path }));
+    try {
+        const response = await fetch('/api/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ requests: payload, parallel })
+        });
+        if (!response.ok) throw new Error('Batch request failed');
+        const data = await response.json();
+        const result = {};
+        data.responses.forEach(r => {
+            if (r.status >= 400) console.error('Batch sub-request failed:', r.path, r.body);
+            result[r.id] = r.status < 400 ? r.body : null;
+        });
+        return result;
+    } catch (error) {
+        console.error('API Error:', error);
+        showToast('Failed to load data', 'error');
+        throw error;
+    }
+}
+
+// ========== Product Picker ==========
+// Type-ahead product field backed by /inventory/api/products/search, so order
+// forms never download the whole catalog. The chosen product id is kept in
+// the input's data-product-id; `selected` is an order item or product to show.
+let productPickerCount = 0;
+
+function productPicker(className, selected = null, label = p => `${p.sku} - ${p.name}`) {
+    const listId = `productPickerList${++productPickerCount}`;
+    const wrapper = document.createElement('span');
+    wrapper.className = className;
+    wrapper.innerHTML = `<input type="text" class="product-picker-input" list="${listId}" placeholder="Search SKU or name" autocomplete="off"><datalist id="${listId}"></datalist>`;
+    const input = wrapper.querySelector('input');
+    const list = wrapper.querySelector('datalist');
+    const byLabel = new Map();
+
+    if (selected) {
+        input.value = `${selected.product_sku ?? selected.sku} - ${selected.product_name ?? selected.name}`;
+        input.dataset.productId = selected.product_id ?? selected.id;
+    }
+
+    const suggest = debounce(async term => {
+        const response = await fetch(`/inventory/api/products/search?q=${encodeURIComponent(term)}&limit=15`);
+        if (!response.ok) return;
+        const products = await response.json();
+        byLabel.clear();
+        list.innerHTML = '';
+        products.forEach(p => {
+            const option = document.createElement('option');
+            option.value = label(p);
+            byLabel.set(option.value, p);
+            list.appendChild(option);
+        });
+    }, 200);
+
+    input.addEventListener('input', () => {
+        const match = byLabel.get(input.value);
+        if (match) {
+            input.dataset.productId = match.id;
+            return;
+        }
+        delete input.dataset.productId;
+        const term = input.value.trim();
+        if (term) suggest(term);
+    });
+    return wrapper;
+}
+
+function pickedProductId(row) {
+    const id = row.querySelector('.product-picker-input').dataset.productId;
+    return id ? parseInt(id) : null;
+}
+
 // ========== Global Search ==========
 document.addEventListener('DOMContentLoaded', function () {
     const globalSearch = document.getElementById('globalSearch');
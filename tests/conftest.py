@@ -0,0 +1,22 @@
+"""
+Test Configuration
+Every test session runs against a scratch SQLite file, never instance/warehouse.db
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.py reads the environment at import time, so this must run before `app` is imported
+_DB_DIR = tempfile.mkdtemp(prefix='wms-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_DB_DIR, 'test.db')
+os.environ.pop('DATABASE_READ_URL', None)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    return app
@@ -0,0 +1,134 @@
+"""
+Allocation Tests
+Orders are reserved all or nothing and products.reserved_quantity stays in step with their lines
+"""
+import pytest
+
+from models import db
+from models.order import PurchaseOrder, PurchaseOrderItem, ShipmentOrder, ShipmentOrderItem
+from models.product import Product
+from services.allocation import AllocationError, AllocationService, repair_reservations
+
+
+def _product(sku, quantity, reserved=0):
+    product = Product(sku=sku, name=sku, quantity=quantity, reserved_quantity=reserved)
+    db.session.add(product)
+    db.session.flush()
+    return product
+
+
+def _order(so_number, lines, status='draft'):
+    """A shipment order with (product, quantity) lines."""
+    order = ShipmentOrder(so_number=so_number, status=status)
+    db.session.add(order)
+    db.session.flush()
+    for product, quantity in lines:
+        db.session.add(ShipmentOrderItem(order_id=order.id, product_id=product.id, quantity=quantity))
+    db.session.flush()
+    return order
+
+
+def _reserved(*products):
+    return [db.session.get(Product, p.id).reserved_quantity for p in products]
+
+
+def test_short_order_reserves_nothing(app):
+    with app.app_context():
+        plenty = _product('ALLOC-PLENTY', 50)
+        scarce = _product('ALLOC-SCARCE', 5, reserved=3)
+        order = _order('SO-ALLOC-SHORT', [(plenty, 10), (scarce, 4)])
+        db.session.commit()
+
+        with pytest.raises(AllocationError) as excinfo:
+            AllocationService(db.session).reserve_order(order)
+
+        assert excinfo.value.product_ids == [scarce.id]
+        assert excinfo.value.shortages == [{
+            'product_id': scarce.id, 'product_sku': 'ALLOC-SCARCE', 'product_name': 'ALLOC-SCARCE',
+            'requested': 4, 'available': 2,
+        }]
+        db.session.rollback()
+        assert _reserved(plenty, scarce) == [0, 3]
+        assert all(item.reserved_quantity == 0 for item in order.items)
+        db.session.remove()
+
+
+def test_competing_orders_cannot_share_the_last_units(app):
+    with app.app_context():
+        product = _product('ALLOC-LAST', 6)
+        first = _order('SO-ALLOC-FIRST', [(product, 4)])
+        second = _order('SO-ALLOC-SECOND', [(product, 4)])
+        db.session.commit()
+
+        service = AllocationService(db.session)
+        assert service.reserve_order(first) == {product.id: 4}
+        db.session.commit()
+        with pytest.raises(AllocationError):
+            service.reserve_order(second)
+        db.session.rollback()
+
+        assert _reserved(product) == [4]
+        db.session.remove()
+
+
+def test_release_order_returns_what_is_left(app):
+    with app.app_context():
+        product = _product('ALLOC-RELEASE', 20)
+        order = _order('SO-ALLOC-RELEASE', [(product, 5), (product, 3)])
+        service = AllocationService(db.session)
+        service.reserve_order(order)
+        db.session.commit()
+        assert _reserved(product) == [8]
+
+        picked = order.items.first()
+        assert service.consume(picked, 2) == 2
+        assert service.release_order(order) == {product.id: 6}
+        db.session.commit()
+
+        assert _reserved(product) == [0]
+        assert all(item.reserved_quantity == 0 for item in order.items)
+        db.session.remove()
+
+
+def test_available_to_promise(app):
+    with app.app_context():
+        product = _product('ALLOC-ATP', 10, reserved=4)
+        oversold = _product('ALLOC-ATP-OVER', 2, reserved=5)
+        po = PurchaseOrder(po_number='PO-ALLOC-ATP', status='partial')
+        db.session.add(po)
+        db.session.flush()
+        db.session.add(PurchaseOrderItem(order_id=po.id, product_id=product.id, quantity=12, received_quantity=5))
+        db.session.commit()
+
+        service = AllocationService(db.session)
+        by_id = service.available_to_promise([product.id], include_incoming=True)
+        assert by_id == {product.id: {'product_id': product.id, 'sku': 'ALLOC-ATP', 'name': 'ALLOC-ATP',
+                                      'on_hand': 10, 'reserved': 4, 'available': 6, 'incoming': 7}}
+        by_sku = service.available_to_promise(skus=['ALLOC-ATP-OVER', 'ALLOC-MISSING'])
+        assert list(by_sku) == [oversold.id]
+        assert by_sku[oversold.id]['available'] == 0
+        db.session.remove()
+
+
+def test_repair_reservations_recomputes_from_order_lines(app):
+    with app.app_context():
+        product = _product('ALLOC-REPAIR', 30)
+        picking = _order('SO-ALLOC-REPAIR-1', [(product, 4)])
+        shipped = _order('SO-ALLOC-REPAIR-2', [(product, 6)])
+        service = AllocationService(db.session)
+        service.reserve_order(picking)
+        service.reserve_order(shipped)
+        picking.status = 'picking'
+        # Shipped without a release, and the product counter drifted as well
+        shipped.status = 'shipped'
+        db.session.commit()
+        db.session.execute(
+            Product.__table__.update().where(Product.__table__.c.id == product.id).values(reserved_quantity=25))
+        db.session.commit()
+
+        assert repair_reservations(db.session) >= 1
+        db.session.expire_all()
+        assert _reserved(product) == [4]
+        assert [item.reserved_quantity for item in shipped.items] == [0]
+        assert repair_reservations(db.session) == 0
+        db.session.remove()
@@ -0,0 +1,75 @@
+"""
+Idempotency Tests
+A retried bulk request with the same Idempotency-Key is answered from the stored response
+"""
+import json
+
+from models import db
+from models.idempotency_key import IdempotencyKey
+from models.order import ShipmentOrder
+
+
+def _packed_orders(app, *so_numbers):
+    with app.app_context():
+        orders = [ShipmentOrder(so_number=n, status='packed') for n in so_numbers]
+        db.session.add_all(orders)
+        db.session.commit()
+        ids = [o.id for o in orders]
+        db.session.remove()
+    return ids
+
+
+def _statuses(app, ids):
+    with app.app_context():
+        statuses = [db.session.get(ShipmentOrder, oid).status for oid in ids]
+        db.session.remove()
+    return statuses
+
+
+def _post(client, body, key):
+    return client.post('/shipping/api/orders/bulk-status', data=json.dumps(body),
+                       content_type='application/json', headers={'Idempotency-Key': key})
+
+
+def test_replayed_request_returns_stored_response(app):
+    ids = _packed_orders(app, 'SO-IDEM-1', 'SO-IDEM-2')
+    client = app.test_client()
+    body = {'order_ids': ids, 'status': 'shipped'}
+
+    first = _post(client, body, 'idem-replay')
+    assert first.status_code == 200
+    assert first.get_json()['succeeded'] == 2
+    assert 'Idempotent-Replayed' not in first.headers
+
+    # Running the view again would report both orders as no longer packed
+    retry = _post(client, body, 'idem-replay')
+    assert retry.status_code == 200
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+    assert _statuses(app, ids) == ['shipped', 'shipped']
+
+    fresh = _post(client, body, 'idem-replay-2')
+    assert fresh.get_json()['failed'] == 2
+
+
+def test_key_reused_for_a_different_request_is_rejected(app):
+    ids = _packed_orders(app, 'SO-IDEM-3')
+    client = app.test_client()
+
+    assert _post(client, {'order_ids': ids, 'status': 'shipped'}, 'idem-mismatch').status_code == 200
+    response = _post(client, {'order_ids': ids, 'status': 'delivered'}, 'idem-mismatch')
+    assert response.status_code == 422
+    assert _statuses(app, ids) == ['shipped']
+
+
+def test_validation_errors_are_stored_too(app):
+    client = app.test_client()
+    body = {'order_ids': [], 'status': 'shipped'}
+
+    assert _post(client, body, 'idem-invalid').status_code == 400
+    retry = _post(client, body, 'idem-invalid')
+    assert retry.status_code == 400
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    with app.app_context():
+        assert db.session.get(IdempotencyKey, 'idem-invalid').status_code == 400
+        db.session.remove()
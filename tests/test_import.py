@@ -0,0 +1,96 @@
+"""
+Product Import Tests
+Bad rows are reported line by line; an atomic import the database rejects leaves nothing behind
+"""
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.product import Product
+from models.transaction import Transaction
+import services.import_service as import_service
+
+
+def _import(app, text, **params):
+    query = '&'.join(f'{k}={v}' for k, v in {'format': 'csv', **params}.items())
+    return app.test_client().post(f'/inventory/api/products/import?{query}', data=text.encode(),
+                                  content_type='text/csv')
+
+
+def _count(app, model, column, prefix):
+    with app.app_context():
+        count = db.session.execute(select(func.count()).select_from(model).where(column.like(f'{prefix}%'))).scalar()
+        db.session.remove()
+    return count
+
+
+def test_invalid_rows_are_reported_per_line(app):
+    csv = '\n'.join([
+        'sku,name,quantity,category',
+        'IMP-ROW-1,Good,5,',
+        'IMP-ROW-2,,5,',
+        'IMP-ROW-3,Bad quantity,lots,',
+        'IMP-ROW-1,Duplicate,1,',
+        'IMP-ROW-4,Unknown category,1,No Such Category',
+        'IMP-ROW-5,Also good,0,',
+    ])
+    response = _import(app, csv)
+
+    assert response.status_code == 201
+    summary = response.get_json()
+    assert summary['created'] == 2
+    assert summary['initial_stock_transactions'] == 1
+    assert summary['failed'] == 4
+    # Duplicates are found when the batch is flushed, after the rows that failed validation
+    assert sorted((e['line'], e['error']) for e in summary['errors']) == [
+        (3, 'Name is required'),
+        (4, 'Invalid quantity "lots"'),
+        (5, 'SKU already exists'),
+        (6, 'Unknown category "No Such Category"'),
+    ]
+    assert _count(app, Product, Product.sku, 'IMP-ROW-') == 2
+
+
+def _reject_second_batch(monkeypatch):
+    """Make the database reject the second batch after its rows were inserted."""
+    calls = []
+    queue_event = import_service.queue_event
+
+    def flaky(session, *args, **kwargs):
+        calls.append(args)
+        if len(calls) == 2:
+            raise IntegrityError('INSERT INTO products', {}, Exception('UNIQUE constraint failed: products.sku'))
+        return queue_event(session, *args, **kwargs)
+
+    monkeypatch.setattr(import_service, 'queue_event', flaky)
+
+
+def test_atomic_import_rolls_back_everything(app, monkeypatch):
+    _reject_second_batch(monkeypatch)
+    monkeypatch.setitem(app.config, 'IMPORT_BATCH_SIZE', 2)
+    stock_moves = _count(app, Transaction, Transaction.reference_type, 'import')
+    csv = 'sku,name,quantity\n' + '\n'.join(f'IMP-ATOMIC-{n},Item {n},3' for n in range(5))
+    response = _import(app, csv, atomic='true')
+
+    assert response.status_code == 409
+    summary = response.get_json()
+    assert summary['rolled_back'] is True
+    assert summary['created'] == 0
+    assert [e['line'] for e in summary['errors']] == [4, 5]
+    assert all(e['error'].startswith('Rejected by the database: UNIQUE') for e in summary['errors'])
+    assert _count(app, Product, Product.sku, 'IMP-ATOMIC-') == 0
+    assert _count(app, Transaction, Transaction.reference_type, 'import') == stock_moves
+
+
+def test_rejected_batch_keeps_committed_batches(app, monkeypatch):
+    _reject_second_batch(monkeypatch)
+    monkeypatch.setitem(app.config, 'IMPORT_BATCH_SIZE', 2)
+    csv = 'sku,name\n' + '\n'.join(f'IMP-BATCH-{n},Item {n}' for n in range(5))
+    response = _import(app, csv)
+
+    summary = response.get_json()
+    assert response.status_code == 201
+    assert 'rolled_back' not in summary
+    assert summary['created'] == 3
+    assert [e['sku'] for e in summary['errors']] == ['IMP-BATCH-2', 'IMP-BATCH-3']
+    assert _count(app, Product, Product.sku, 'IMP-BATCH-') == 3
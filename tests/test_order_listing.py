@@ -0,0 +1,33 @@
+"""
+Order Listing Tests
+Cursor pages cover every order, including legacy ones without a created_at
+"""
+from datetime import datetime
+
+from models import db
+from models.order import PurchaseOrder
+
+
+def test_pages_include_orders_without_created_at(app):
+    with app.app_context():
+        table = PurchaseOrder.__table__
+        db.session.execute(table.insert(), [
+            {'po_number': f'PO-LIST-{n}', 'status': 'draft', 'created_at': datetime(2024, 1, n + 1) if n % 2 else None}
+            for n in range(7)
+        ])
+        db.session.commit()
+        db.session.remove()
+
+    client = app.test_client()
+    listed = [o['po_number'] for o in client.get('/receiving/api/orders?summary=true').get_json()]
+    paged, cursor = [], None
+    while True:
+        url = '/receiving/api/orders?summary=true&limit=2' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url).get_json()
+        paged.extend(o['po_number'] for o in page['items'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    assert paged == listed
+    assert sorted(n for n in paged if n.startswith('PO-LIST-')) == [f'PO-LIST-{n}' for n in range(7)]